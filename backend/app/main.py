@@ -1,3 +1,5 @@
+import os
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import warnings
@@ -6,7 +8,19 @@ import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-from app.routers import dashboard, analysis, chat
+from app.routers import dashboard, analysis, chat, history, metrics
+from app.services.virustotal_service import vt_service
+from app.services.storage_service import storage_service
+from app.services.ai_service import ai_service
+from app.services.pcap_service import pcap_service, load_scapy
+from app.services.blocklist_service import blocklist_service
+from app.services.metrics_service import MetricsMiddleware, HTTP_METRICS_ENABLED
+from app.services.upload_service import upload_service, UploadLimitMiddleware, UPLOAD_BATCH_MAX_BYTES, MULTIPART_OVERHEAD
+
+# Heavy SDKs (Gemini, Supabase, Scapy) and the blocklist index load on first
+# use. WARMUP=1 loads them in the background right after startup instead, so
+# the first real request doesn't pay for it while "/" is served immediately.
+WARMUP = os.getenv("WARMUP", "0") == "1"
 
 app = FastAPI(title="CyberSpy API", description="Modular Threat Detection Backend")
 
@@ -17,11 +31,37 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if HTTP_METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# Oversized uploads are refused before the multipart body is spooled to disk
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/api/analyze/file": upload_service.max_bytes + MULTIPART_OVERHEAD,
+    "/api/analyze/batch/files": UPLOAD_BATCH_MAX_BYTES,
+})
 
 app.include_router(dashboard.router, prefix="/api/dashboard", tags=["Dashboard"])
 app.include_router(dashboard.router, prefix="/api", tags=["Legacy/Stream"]) # Map /ws/stream and /network to root api namespace if needed or keep structure
 app.include_router(analysis.router, prefix="/api/analyze", tags=["Analysis"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
+app.include_router(history.router, prefix="/api/history", tags=["History"])
+app.include_router(metrics.router, tags=["Metrics"])
+
+@app.on_event("startup")
+async def warm_up():
+    # The storage writer replays records spooled while the backend was down
+    storage_service.start()
+    if WARMUP:
+        loop = asyncio.get_running_loop()
+        for load in (ai_service.warm_up, storage_service.warm_up, load_scapy, blocklist_service.warm_up):
+            loop.run_in_executor(None, load)
+
+@app.on_event("shutdown")
+async def close_clients():
+    # Drain queued analysis records before the process exits
+    await storage_service.close()
+    await vt_service.close()
+    # Worker processes would otherwise outlive the server or hold up its exit
+    await asyncio.to_thread(pcap_service.close)
 
 @app.get("/")
 def health_check():
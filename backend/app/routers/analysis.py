@@ -1,27 +1,75 @@
-from fastapi import APIRouter, UploadFile, File
+import os
+import json
+import asyncio
+from typing import List
+from fastapi import APIRouter, UploadFile, File, Request, HTTPException
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from app.services.ai_service import ai_service
 from app.services.pcap_service import pcap_service
 
 from app.services.virustotal_service import vt_service
 from app.services.storage_service import storage_service
+from app.services.cache_service import verdict_cache
+from app.services.upload_service import upload_service
+from app.services.signature_service import signature_service
+from app.services.blocklist_service import blocklist_service
+from app.services.qr_service import qr_service
+from app.services.window_service import window_service
+from app.services.triage_service import triage_service
+from app.services.metrics_service import span, cache_events
 
 router = APIRouter()
 
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+
+class UploadStreamingResponse(StreamingResponse):
+    # StreamingResponse normally listens for a client disconnect by calling
+    # receive(), which would steal the request body chunks that the generator
+    # is still consuming. request.stream() raises ClientDisconnect itself.
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
 @router.post("/file")
 async def analyze_file(file: UploadFile = File(...)):
-    content = await file.read()
-    filename = file.filename
-    
-    # 1. Try VirusTotal (Run in threadpool to allow polling)
-    vt_result = await run_in_threadpool(vt_service.scan_file, content, filename)
+    with span("upload_ingest"):
+        upload = await upload_service.ingest(file)
+    return await _analyze_file_content(upload)
+
+async def _analyze_file_content(upload):
+    # 0. Same bytes seen before: answer from the verdict cache
+    with span("verdict_cache"):
+        cached = await run_in_threadpool(verdict_cache.get, upload.sha256)
+    cache_events.inc(cache="verdict", result=cached[1] if cached else "miss")
+    if cached:
+        verdict, tier = cached
+        return {
+            **verdict,
+            "filename": upload.filename,
+            "name": upload.filename,
+            "cached": True,
+            "cache_tier": tier
+        }
+
+    result_data = await _scan_file(upload)
+    return {**result_data, "cached": False}
+
+async def _scan_file(upload):
+    filename = upload.filename
+    file_hash = upload.sha256
+
+    # 1. Try VirusTotal (async client, polling doesn't hold a thread)
+    with span("virustotal"):
+        vt_result = await vt_service.scan_file(upload.open(), filename, file_hash)
     
     if vt_result:
         vt_data = {
             "filename": filename,
             "name": filename,
-            "size": f"{len(content)/1024:.2f} KB",
-            "type": file.content_type,
+            "size": f"{upload.size/1024:.2f} KB",
+            "type": upload.content_type,
+            "sha256": file_hash,
             "score": vt_result["risk_score"],
             "risk_score": vt_result["risk_score"],
             "summary": vt_result["summary"],
@@ -30,66 +78,300 @@ async def analyze_file(file: UploadFile = File(...)):
             "source": "VirusTotal"
         }
         # Save to DB
-        storage_service.save_analysis(vt_data)
+        await storage_service.save_analysis(vt_data)
+        # Timeouts are worth retrying, so they aren't cached
+        if vt_result["threats"] != ["Timeout/Error"]:
+            await run_in_threadpool(verdict_cache.set, file_hash, vt_data)
         return vt_data
 
-    # 2. Fallback to Gemini
-    try:
-        text_content = content.decode('utf-8')
-        ai_result = await ai_service.analyze_text(text_content, filename)
+    # 2. Local signatures over the whole file; Gemini only when inconclusive
+    with span("signatures"):
+        local = await run_in_threadpool(signature_service.scan, upload.open())
+    if local and local["conclusive"]:
+        result_data = {
+            "filename": filename,
+            "name": filename,
+            "size": f"{upload.size/1024:.2f} KB",
+            "type": upload.content_type if upload.is_text else "Binary",
+            "sha256": file_hash,
+            "score": local["risk_score"],
+            "risk_score": local["risk_score"],
+            "summary": local["summary"],
+            "threats": local["threats"],
+            "technical_details": local["technical_details"],
+            "source": "CyberSpy Signatures"
+        }
+        await storage_service.save_analysis(result_data)
+        await run_in_threadpool(verdict_cache.set, file_hash, result_data)
+        return result_data
+
+    # 3. Fallback to Gemini on the most suspicious windows of the whole file
+    if upload.is_text:
+        hints = [m["offset"] for m in local["technical_details"]["matches"]] if local else []
+        with span("window_select"):
+            windows, total_windows = await run_in_threadpool(window_service.prepare, upload.open(), hints)
+        if not windows:
+            # Nothing for Gemini to read; without this the empty answer would
+            # come back as the fallback verdict and be cached as Gemini's
+            result_data = {
+                "filename": filename,
+                "name": filename,
+                "size": f"{upload.size/1024:.2f} KB",
+                "type": upload.content_type,
+                "sha256": file_hash,
+                "score": 0,
+                "risk_score": 0,
+                "summary": "Nothing to analyze: the file is empty or contains only whitespace.",
+                "threats": [],
+                "technical_details": {"vulnerabilities": [], "recommendation": "No action needed."},
+                "source": "CyberSpy Heuristics"
+            }
+            await storage_service.save_analysis(result_data)
+            return result_data
+        with span("gemini"):
+            ai_result = await ai_service.analyze_windows(windows, total_windows, filename)
         
         result_data = {
             "filename": filename,
             "name": filename,
-            "size": f"{len(content)/1024:.2f} KB",
-            "type": file.content_type,
+            "size": f"{upload.size/1024:.2f} KB",
+            "type": upload.content_type,
+            "sha256": file_hash,
             "score": ai_result.get("risk_score", 0),
             **ai_result,
             "source": "Gemini AI"
         }
+        if local and local["threats"]:
+            # Weak signature hits still count alongside the model's verdict
+            result_data["risk_score"] = result_data["score"] = max(result_data["score"], local["risk_score"])
+            result_data["threats"] = list(ai_result.get("threats", [])) + [t for t in local["threats"] if t not in ai_result.get("threats", [])]
         
         # Save to DB
-        storage_service.save_analysis(result_data)
+        await storage_service.save_analysis(result_data)
+        if not ai_service.is_fallback(ai_result):
+            await run_in_threadpool(verdict_cache.set, file_hash, result_data)
         return result_data
-    except UnicodeDecodeError:
+
+    # 4. Binaries: local structural triage (format, entropy, sections, imports)
+    with span("triage"):
+        triage = await run_in_threadpool(triage_service.analyze, upload.open(), upload.size)
+    threats = triage["threats"] + [t for t in (local["threats"] if local else []) if t not in triage["threats"]]
+    risk_score = max(triage["risk_score"], local["risk_score"] if local and local["threats"] else 0)
+    result_data = {
+        "filename": filename,
+        "name": filename,
+        "size": f"{upload.size/1024:.2f} KB",
+        "type": triage["technical_details"]["format"],
+        "sha256": file_hash,
+        "score": risk_score,
+        "risk_score": risk_score,
+        "summary": triage["summary"] + (f" {local['summary']}" if local and local["threats"] else ""),
+        "threats": threats,
+        "technical_details": {
+            **triage["technical_details"],
+            "signatures": local["technical_details"]["matches"] if local else []
+        },
+        "source": "CyberSpy Triage"
+    }
+    await storage_service.save_analysis(result_data)
+    await run_in_threadpool(verdict_cache.set, file_hash, result_data)
+    return result_data
+
+@router.get("/virustotal/status")
+async def virustotal_status():
+    # Quota scheduler queue depth and in-flight/coalesced scan counts
+    return vt_service.status()
+
+async def _analyze_hash(file_hash):
+    file_hash = file_hash.strip().lower()
+    cached = await run_in_threadpool(verdict_cache.get, file_hash)
+    cache_events.inc(cache="verdict", result=cached[1] if cached else "miss")
+    if cached:
+        verdict, tier = cached
+        return {**verdict, "cached": True, "cache_tier": tier}
+
+    with span("virustotal"):
+        vt_result = await vt_service.lookup_hash(file_hash)
+    if not vt_result:
         return {
-            "filename": filename,
-            "name": filename,
-            "size": f"{len(content)/1024:.2f} KB",
-            "type": "Binary",
+            "filename": file_hash,
+            "name": file_hash,
+            "size": "N/A",
+            "type": "Hash",
+            "sha256": file_hash,
             "score": 0,
             "risk_score": 0,
-            "summary": "Clean binary file (No VirusTotal matches).",
+            "summary": "Hash not found in VirusTotal or the local verdict cache.",
             "threats": [],
             "technical_details": {},
-            "source": "VirusTotal (Clean)"
+            "source": "VirusTotal (Unknown)",
+            "cached": False
         }
+    return {
+        "filename": file_hash,
+        "name": file_hash,
+        "size": "N/A",
+        "type": "Hash",
+        "sha256": file_hash,
+        "score": vt_result["risk_score"],
+        "risk_score": vt_result["risk_score"],
+        "summary": vt_result["summary"],
+        "threats": vt_result["threats"],
+        "technical_details": vt_result["details"],
+        "source": "VirusTotal",
+        "cached": False
+    }
+
+async def _saved(analysis):
+    # URL and hash verdicts go to history like file scans; cache hits were
+    # stored when they were first produced
+    result = await analysis
+    if not result.get("cached"):
+        await storage_service.save_analysis(result)
+    return result
+
+async def _run_batch(jobs, stream_format):
+    """
+    Runs (kind, item, coroutine factory) jobs with bounded concurrency and
+    yields each result as soon as it finishes, as NDJSON lines or SSE events.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(index, kind, item, factory):
+        async with semaphore:
+            try:
+                return {"index": index, "kind": kind, "item": item, "result": await factory()}
+            except Exception as e:
+                return {"index": index, "kind": kind, "item": item, "error": str(e)}
+
+    def encode(event, payload):
+        if stream_format == "sse":
+            return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        return json.dumps({"event": event, **payload}) + "\n"
+
+    tasks = [asyncio.ensure_future(run(i, *job)) for i, job in enumerate(jobs)]
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            failed += "error" in line
+            yield encode("result", line)
+        yield encode("done", {"count": len(tasks), "failed": failed})
+    finally:
+        # Client went away: stop work nobody will read
+        for task in tasks:
+            task.cancel()
+
+def _batch_response(jobs, stream_format):
+    if not jobs:
+        raise HTTPException(status_code=400, detail="No items provided")
+    if len(jobs) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch limited to {BATCH_MAX_ITEMS} items")
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(_run_batch(jobs, stream_format), media_type=media_type)
+
+@router.post("/batch")
+async def analyze_batch(data: dict, format: str = "ndjson"):
+    """Body: {"urls": [...], "hashes": [...]}. Streams one event per item."""
+    jobs = [("url", url, lambda url=url: _saved(_analyze_url(url))) for url in data.get("urls") or []]
+    jobs += [("hash", h, lambda h=h: _saved(_analyze_hash(h))) for h in data.get("hashes") or []]
+    return _batch_response(jobs, format)
+
+@router.post("/batch/files")
+async def analyze_batch_files(files: List[UploadFile] = File(...), format: str = "ndjson"):
+    async def analyze(file):
+        return await _analyze_file_content(await upload_service.ingest(file))
+
+    jobs = [("file", file.filename, lambda file=file: analyze(file)) for file in files]
+    return _batch_response(jobs, format)
+
+@router.get("/blocklist/status")
+async def blocklist_status():
+    return blocklist_service.status()
 
 @router.post("/pcap")
 async def analyze_pcap(file: UploadFile = File(...)):
-    return pcap_service.analyze(file.file, file.filename)
+    with span("pcap"):
+        return await pcap_service.analyze_upload(file)
+
+@router.post("/pcap/stream")
+async def analyze_pcap_stream(request: Request, filename: str = "capture.pcap"):
+    # Raw capture body (not multipart) so records are parsed as they arrive
+    return UploadStreamingResponse(
+        pcap_service.analyze_stream(request.stream(), filename),
+        media_type="application/x-ndjson"
+    )
 
 @router.post("/qr")
 async def analyze_qr(file: UploadFile = File(...)):
     content = await file.read()
     # Detect mime type or default to png
     mime_type = file.content_type if file.content_type else "image/png"
-    
-    
-    result = await ai_service.analyze_image(content, mime_type)
+
+    # 1. Decode on the CPU; a readable code goes down the text/URL path
+    with span("qr_decode"):
+        image = await run_in_threadpool(qr_service.process, content, mime_type)
+    if image.payloads:
+        result = await _analyze_qr_payloads(image.payloads)
+        result["decoder"] = image.decoder
+        await storage_service.save_analysis({**result, "filename": file.filename})
+        return result
+
+    # 2. A picture Vision has already seen (or a near-identical copy of one)
+    if image.digest is not None:
+        cached = qr_service.cached_verdict(image)
+        cache_events.inc(cache="qr_image", result="miss" if cached is None else
+                         "near_duplicate" if cached.get("near_duplicate") else "hit")
+        if cached:
+            return cached
+
+    # 3. Gemini Vision, on the cropped/downscaled image
+    with span("gemini_image"):
+        result = await ai_service.analyze_image(image.vision_bytes, image.vision_mime)
+    if not ai_service.is_fallback(result) and result.get("summary") != "AI Processing Error":
+        qr_service.remember(image, result)
     # Save Image Analysis
-    storage_service.save_analysis({**result, "filename": file.filename, "source": "Gemini Vision"})
+    await storage_service.save_analysis({**result, "filename": file.filename, "source": "Gemini Vision"})
+    return result
+
+async def _analyze_qr_payloads(payloads):
+    # Several codes in one picture: report the riskiest, list them all
+    results = await asyncio.gather(*(_analyze_qr_payload(p) for p in payloads))
+    result = dict(max(results, key=lambda r: r.get("risk_score", 0)))
+    if len(results) > 1:
+        result["codes"] = [{"decoded_content": r["decoded_content"], "risk_score": r.get("risk_score", 0)} for r in results]
     return result
 
+async def _analyze_qr_payload(payload):
+    if payload.strip().lower().startswith(("http://", "https://")):
+        url_result = await _analyze_url(payload.strip())
+        return {
+            "decoded_content": payload,
+            "risk_score": url_result["risk_score"],
+            "summary": url_result["summary"],
+            "threats": url_result["threats"],
+            "technical_details": url_result["technical_details"],
+            "is_qr": True,
+            "source": url_result["source"]
+        }
+    with span("gemini_qr"):
+        result = await ai_service.analyze_qr_content(payload)
+    return {**result, "decoded_content": payload, "is_qr": True, "source": "Gemini QR"}
+
+@router.get("/qr/status")
+async def qr_status():
+    return qr_service.status()
+
 @router.post("/qr-text")
 async def analyze_qr_text(data: dict):
     content = data.get("content")
     if not content:
         return {"error": "No content provided"}
         
-    result = await ai_service.analyze_qr_content(content)
+    with span("gemini_qr"):
+        result = await ai_service.analyze_qr_content(content)
     # Save QR Text Analysis
-    storage_service.save_analysis({**result, "filename": "QR_CONTENT", "source": "Gemini QR"})
+    await storage_service.save_analysis({**result, "filename": "QR_CONTENT", "source": "Gemini QR"})
     return result
 
 @router.post("/url")
@@ -97,15 +379,33 @@ async def analyze_url(data: dict):
     url = data.get("url")
     if not url:
         return {"error": "No URL provided"}
+    return await _saved(_analyze_url(url))
+
+async def _analyze_url(url):
+    # 1. Local blocklist (microseconds, no quota)
+    with span("blocklist"):
+        listed = blocklist_service.check_url(url)
+    if listed:
+        return {
+            "filename": url,
+            "name": url,
+            "size": "N/A",
+            "type": "URL",
+            "score": 95,
+            "risk_score": 95,
+            "summary": f"Blocklisted {listed['kind']} {listed['match']} (feed: {listed['feed']}).",
+            "threats": [f"Blocklisted {listed['kind']}: {listed['match']}"],
+            "technical_details": listed,
+            "source": "CyberSpy Blocklist"
+        }
 
-    # Run in threadpool
-    # vt_result = await run_in_threadpool(vt_service.scan_url, url)
-    # Use mock by default for demo robustness or if API fails
+    # 2. VirusTotal; heuristics below if the API is unavailable
     vt_result = None
     try:
-        vt_result = await run_in_threadpool(vt_service.scan_url, url)
-    except:
-        pass
+        with span("virustotal_url"):
+            vt_result = await vt_service.scan_url(url)
+    except Exception as e:
+        print(f"VT URL Error: {e}")
 
     if vt_result:
         return {
@@ -121,7 +421,21 @@ async def analyze_url(data: dict):
             "source": "VirusTotal"
         }
     
-    # Smart Mock for URL
+    if blocklist_service.loaded:
+        return {
+            "filename": url,
+            "name": url,
+            "size": "N/A",
+            "type": "URL",
+            "score": 0,
+            "risk_score": 0,
+            "summary": "Not on any loaded blocklist.",
+            "threats": [],
+            "technical_details": {"feeds": blocklist_service.index.feeds},
+            "source": "CyberSpy Blocklist"
+        }
+
+    # Smart Mock for URL (no blocklist feeds configured)
     is_dangerous = any(x in url.lower() for x in ['evil', 'risk', 'phish', 'malware', 'attack', 'login-verify'])
     
     if is_dangerous:
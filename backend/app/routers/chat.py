@@ -1,16 +1,36 @@
+import json
+from typing import Optional
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services.ai_service import ai_service
+from app.services.chat_service import chat_service
 from app.services.system_service import get_system_metrics
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
+
+def _context():
+    sys = get_system_metrics()
+    return f"CPU: {sys['cpu']}%, RAM: {sys['memory']}%, NET: {sys['recv']}MB"
 
 @router.post("/")
 async def chat(request: ChatRequest):
-    sys = get_system_metrics()
-    context = f"CPU: {sys['cpu']}%, RAM: {sys['memory']}%, NET: {sys['recv']}MB"
-    response = ai_service.chat(request.message, context)
-    return {"response": response}
+    session_id, response = await chat_service.reply(request.message, _context(), request.session_id)
+    return {"response": response, "session_id": session_id}
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    # SSE: "token" events as the reply is generated, then "done" (or "error").
+    # Starlette cancels the generator when the client disconnects.
+    async def events():
+        async for event, data in chat_service.stream(request.message, _context(), request.session_id):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/stats")
+async def chat_stats():
+    return chat_service.stats()
@@ -1,123 +1,84 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.services.system_service import get_system_metrics, get_network_interfaces
-import asyncio
+from app.services.system_service import get_system_metrics, metrics_sampler
+from app.services.network_service import network_discovery
+from app.services.stream_hub import stream_hub
+from app.services.capture_service import capture_engine
 import time
 import random
 
 router = APIRouter()
 
 @router.get("/stats")
-def dashboard_stats():
+async def dashboard_stats():
     sys = get_system_metrics()
+    network = await network_discovery.snapshot()
     return {
         "global_threats": 842000 + int(time.time() % 10000), 
         "active_attacks": int(sys['recv'] * 5) + random.randint(0, 10),
         "threats_blocked": 762000 + int(time.time() % 500),
-        "networks_secured": len(get_network_interfaces()),
+        "networks_secured": len(network.interfaces),
         "system_load": sys
     }
 
-import subprocess
-import re
+@router.get("/metrics/history")
+def metrics_history(window: float = 3600, points: int = 300):
+    # Served from the sampler's ring buffer, never from psutil directly
+    return metrics_sampler.history(window, points)
 
 @router.get("/network/scan")
-def network_scan():
-    try:
-        # Run netsh to get networks
-        output = subprocess.check_output(["netsh", "wlan", "show", "networks", "mode=bssid"], shell=True).decode("utf-8", errors="ignore")
-        
-        networks = []
-        current_net = {}
-        
-        for line in output.split('\n'):
-            line = line.strip()
-            if line.startswith("SSID"):
-                if current_net:
-                    if 'ssid' in current_net and current_net['ssid']:
-                         if 'signal' not in current_net: current_net['signal'] = random.randint(40, 100)
-                         networks.append(current_net)
-                current_net = {}
-                parts = line.split(":", 1)
-                if len(parts) > 1:
-                    current_net['ssid'] = parts[1].strip()
-            elif line.startswith("Authentication"):
-                parts = line.split(":", 1)
-                if len(parts) > 1:
-                    current_net['security'] = parts[1].strip()
-        
-        # Add last one
-        if current_net and 'ssid' in current_net:
-             current_net['signal'] = random.randint(40, 100)
-             networks.append(current_net)
+async def network_scan():
+    # Reads the latest background scan; never runs a scan in the request path
+    network = await network_discovery.snapshot()
+    results = network.networks[:10] # Limit to 10
+
+    # Enhanced Fallback Mock Data
+    if not results:
+         return [
+            {"ssid": "CyberSpy_Secure_HQ", "security": "WPA3-ENT", "signal": 98, "status": "Trusted"},
+            {"ssid": "Guest_Access_Open", "security": "OPEN", "signal": 75, "status": "Danger"},
+            {"ssid": "IoT_Smart_Fridge", "security": "WEP", "signal": 35, "status": "Danger"},
+            {"ssid": "Office_Printer_Direct", "security": "WPA2-PSK", "signal": 60, "status": "Warning"},
+            {"ssid": "Hidden_Network_X", "security": "WPA2-ENT", "signal": 82, "status": "Trusted"},
+            {"ssid": "Free_Public_WiFi", "security": "OPEN", "signal": 45, "status": "Danger"}
+         ]
+    return results
+
+@router.get("/network/status")
+async def network_status():
+    await network_discovery.snapshot()
+    return network_discovery.status()
+
+@router.get("/ws/status")
+def stream_status():
+    return stream_hub.status()
 
-        # Post-process for frontend
-        results = []
-        for n in networks:
-            if not n.get('ssid'): continue
-            
-            # Determine status based on security
-            sec = n.get('security', 'Unknown').upper()
-            status = 'Warning'
-            if 'OPEN' in sec:
-                status = 'Danger'
-            elif 'WPA2' in sec or 'WPA3' in sec:
-                status = 'Trusted'
-                
-            results.append({
-                "ssid": n['ssid'],
-                "security": sec,
-                "signal": n.get('signal', random.randint(60, 99)),
-                "status": status
-            })
-            
-        # Enhanced Fallback Mock Data
-        if not results:
-             return [
-                {"ssid": "CyberSpy_Secure_HQ", "security": "WPA3-ENT", "signal": 98, "status": "Trusted"},
-                {"ssid": "Guest_Access_Open", "security": "OPEN", "signal": 75, "status": "Danger"},
-                {"ssid": "IoT_Smart_Fridge", "security": "WEP", "signal": 35, "status": "Danger"},
-                {"ssid": "Office_Printer_Direct", "security": "WPA2-PSK", "signal": 60, "status": "Warning"},
-                {"ssid": "Hidden_Network_X", "security": "WPA2-ENT", "signal": 82, "status": "Trusted"},
-                {"ssid": "Free_Public_WiFi", "security": "OPEN", "signal": 45, "status": "Danger"}
-             ]
-             
-        return results[:10] # Limit to 10
-    except Exception as e:
-        print(f"Wifi scan error: {e}")
-        # Rich Fallback Mock on Error
-        return [
-            {"ssid": "Simulation_Net_Alpha", "security": "WPA3", "signal": 90, "status": "Trusted"},
-            {"ssid": "Malicious_Honeypot", "security": "OPEN", "signal": 85, "status": "Danger"},
-            {"ssid": "Legacy_Device_Link", "security": "WEP", "signal": 25, "status": "Warning"},
-            {"ssid": "Coffee_Shop_Free", "security": "OPEN", "signal": 55, "status": "Warning"}
-        ]
+@router.get("/capture/status")
+def capture_status():
+    return capture_engine.status()
 
 @router.websocket("/ws/stream")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, batch: bool = False, encoding: str = "json"):
+    """
+    Live feed from the shared stream hub. By default every event is its own
+    {"system", "packet"} text frame; ?batch=1 sends one {"events": [...]}
+    frame per tick and ?encoding=binary sends that frame deflated.
+    """
     await websocket.accept()
+    binary = encoding == "binary"
+    sub = stream_hub.subscribe()
     try:
-        geo_locations = ["US", "CN", "RU", "DE", "BR", "IN", "JP", "FR"]
-        protocols = ["TCP", "UDP", "HTTP", "DNS", "SSH", "FTP", "SMTP", "RDP"]
-        flags = ["SYN", "ACK", "FIN", "PSH", "RST", "URG", "ECE"]
-        
         while True:
-            data = {
-                "system": get_system_metrics(),
-                "packet": {
-                    "id": int(time.time() * 1000),
-                    "type": random.choice(protocols),
-                    "size": random.randint(64, 4096),
-                    "source": f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}",
-                    "flag": random.choice(flags) if random.random() > 0.3 else None,
-                    "geo": random.choice(geo_locations)
-                }
-            }
-            # Occasionally send a "burst" of packets
-            burst = random.randint(1, 3) if random.random() > 0.8 else 1
-            for _ in range(burst):
-                 await websocket.send_json(data)
-                 if burst > 1: await asyncio.sleep(0.1)
-                 
-            await asyncio.sleep(0.5 + random.random() * 0.5)
-    except WebSocketDisconnect:
+            events = await sub.next_batch()
+            if batch or binary:
+                frame = stream_hub.batch_frame(events, binary)
+                if binary:
+                    await websocket.send_bytes(frame)
+                else:
+                    await websocket.send_text(frame)
+            else:
+                for event in events:
+                    await websocket.send_text(event.text)
+    except (WebSocketDisconnect, RuntimeError):
         pass
+    finally:
+        stream_hub.unsubscribe(sub)
@@ -0,0 +1,31 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from app.services.storage_service import storage_service
+
+router = APIRouter()
+
+@router.get("/")
+async def list_history(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    source: Optional[str] = None,
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+    filename: Optional[str] = None,
+    sha256: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Stored verdicts, newest first. Follow next_cursor for older pages."""
+    filters = {
+        "since": since,
+        "until": until,
+        "source": source,
+        "min_score": min_score,
+        "filename": filename,
+        "content_hash": sha256.lower() if sha256 else None
+    }
+    try:
+        return await run_in_threadpool(storage_service.query_analyses, filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
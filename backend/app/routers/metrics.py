@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.services.metrics_service import registry, profiles
+from app.services.stream_hub import stream_hub
+from app.services.virustotal_service import vt_service
+from app.services.storage_service import storage_service
+from app.services.chat_service import chat_service
+from app.services.capture_service import capture_engine
+
+router = APIRouter()
+
+# Service state that already lives in status()/stats(), read at scrape time
+registry.gauge("cyberspy_ws_subscribers", "Connected /ws/stream clients.", lambda: len(stream_hub.subscribers))
+registry.counter_callback("cyberspy_ws_events_published_total", "Events published by the stream hub.", lambda: stream_hub.published)
+registry.counter_callback("cyberspy_ws_events_dropped_total", "Events dropped for slow /ws/stream clients.", stream_hub.dropped_total)
+registry.gauge("cyberspy_virustotal_queued", "Calls waiting for VirusTotal quota.", lambda: vt_service.scheduler.depth(), "priority")
+registry.gauge("cyberspy_virustotal_in_flight", "VirusTotal scans in progress.", lambda: len(vt_service._inflight))
+registry.counter_callback("cyberspy_virustotal_coalesced_total", "Duplicate VirusTotal scans joined to one in flight.", lambda: vt_service.coalesced)
+registry.gauge("cyberspy_storage_pending", "Analysis records waiting to be written.", lambda: storage_service.status()["pending"])
+registry.counter_callback("cyberspy_storage_records_total", "Analysis records by write-behind outcome.", lambda: storage_service.counters, "event")
+registry.counter_callback("cyberspy_chat_streams_total", "SIMBA chat streams by outcome.", lambda: chat_service.streams, "outcome")
+registry.counter_callback("cyberspy_capture_packets_total", "Capture engine packet counters.",
+                          lambda: {k: v for k, v in capture_engine.counters.items() if k != "summaries"}, "counter")
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/profiles/{profile_id}", response_class=PlainTextResponse)
+def profile(profile_id: str):
+    # Collapsed stacks for flamegraph.pl / speedscope
+    profiler = profiles.get(profile_id)
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired profile")
+    header = f"# {profiler.samples} samples over {profiler.duration * 1000:.1f} ms\n"
+    return PlainTextResponse(header + profiler.collapsed())
@@ -1,28 +1,123 @@
 import os
 import json
-import google.generativeai as genai
+import hashlib
+import asyncio
+import threading
 from dotenv import load_dotenv
+from app.services.cache_service import TTLCache
+from app.services.metrics_service import span, cache_events, gemini_calls
 
 load_dotenv()
 
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+# A streamed chat reply gets GEMINI_TIMEOUT per chunk and this overall
+GEMINI_STREAM_TIMEOUT = float(os.getenv("GEMINI_STREAM_TIMEOUT", "120"))
+GEMINI_CACHE_TTL = float(os.getenv("GEMINI_CACHE_TTL", "3600"))
+GEMINI_CACHE_ENTRIES = int(os.getenv("GEMINI_CACHE_ENTRIES", "512"))
+
+CHAT_OFFLINE_REPLY = "SIMBA (Offline): AI Core is not connected. Check API Key."
+CHAT_ERROR_PREFIX = "Error: "
+
 class AIService:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
-        self.model = None
-        if self.api_key:
+        # Caps in-flight model calls; extra callers wait instead of piling on.
+        # Bound to the running loop, so it's made there on first use
+        self._semaphore = None
+        self._semaphore_loop = None
+        # Parsed verdicts keyed by prompt template + content hash
+        self.cache = TTLCache(GEMINI_CACHE_ENTRIES)
+        self._inflight = {}
+        self._model_loaded = False
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # google.generativeai takes most of a second to import: the client
+        # is built on first use (or by warm_up()), not at app import
+        if not self._model_loaded:
+            with self._model_lock:
+                if not self._model_loaded:
+                    self._model = self._load_model()
+                    self._model_loaded = True
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+        self._model_loaded = True
+
+    def _load_model(self):
+        if not self.api_key:
+            return None
+        try:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            return genai.GenerativeModel('gemini-2.5-flash')
+        except Exception as e:
+            print(f"AI Service Error: {e}")
+            return None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # One limiter per event loop (tests and workers may run several)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _ready(self):
+        # First use imports the SDK in a worker thread, not on the event loop
+        if self._model_loaded:
+            return self._model
+        return await asyncio.to_thread(lambda: self.model)
+
+    def warm_up(self):
+        return self.model is not None
+
+    async def _generate(self, contents, timeout: float = GEMINI_TIMEOUT):
+        """Non-blocking model call under the concurrency limit and a deadline."""
+        async with self._get_semaphore():
             try:
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-2.5-flash')
-            except Exception as e:
-                print(f"AI Service Error: {e}")
+                with span("gemini_call"):
+                    response = await asyncio.wait_for(self.model.generate_content_async(contents), timeout)
+            except asyncio.TimeoutError:
+                gemini_calls.inc(outcome="timeout")
+                raise
+            except Exception:
+                gemini_calls.inc(outcome="error")
+                raise
+        gemini_calls.inc(outcome="ok")
+        return response.text
+
+    async def _generate_json(self, template: str, key_parts, contents):
+        key = template + ":" + hashlib.sha256(b"\0".join(key_parts)).hexdigest()
+        cached = self.cache.get(key)
+        cache_events.inc(cache="gemini", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return dict(cached)
+
+        # Identical requests already waiting on the model share its answer
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(contents))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        text = await asyncio.shield(task)
 
-    async def analyze_text(self, text: str, filename: str):
-        if not self.model:
+        clean_text = text.replace('```json', '').replace('```', '').strip()
+        result = json.loads(clean_text)
+        self.cache.set(key, result, GEMINI_CACHE_TTL)
+        return dict(result)
+
+    async def analyze_text(self, text: str, filename: str, location: str = ""):
+        if not await self._ready():
             return self._mock_response()
 
         prompt = f"""
         Analyze the following file content for security threats.
-        Filename: {filename}
+        Filename: {filename}{location}
         Content Snippet:
         {text[:8000]}
         
@@ -38,15 +133,51 @@ class AIService:
         }}
         """
         try:
-            response = self.model.generate_content(prompt)
-            clean_text = response.text.replace('```json', '').replace('```', '').strip()
-            return json.loads(clean_text)
+            # Snippet only: the same content under another name is the same verdict
+            return await self._generate_json("file", [text[:8000].encode()], prompt)
         except Exception as e:
-            print(f"Gemini Analysis Failed: {e}")
+            print(f"Gemini Analysis Failed: {e!r}")
+            return self._mock_response()
+
+    async def analyze_windows(self, windows, total_windows: int, filename: str):
+        """
+        One call per window picked by the window service, in parallel under
+        the concurrency limit, merged into a single verdict: the riskiest
+        window sets the score, threats and vulnerabilities are combined.
+        """
+        if not await self._ready():
             return self._mock_response()
+        verdicts = await asyncio.gather(*(
+            self.analyze_text(
+                w.text, filename,
+                f"\n        Excerpt: bytes {w.offset}-{w.offset + w.length} (window {w.index + 1} of {total_windows}); "
+                "other parts of the file are not shown" if total_windows > 1 else ""
+            )
+            for w in windows
+        ))
+        if total_windows == 1:
+            return verdicts[0]
+
+        answered = [(w, v) for w, v in zip(windows, verdicts) if not self.is_fallback(v)]
+        if not answered:
+            return self._fallback_verdict()
+        top_window, top = max(answered, key=lambda pair: pair[1].get("risk_score", 0))
+        details = [v.get("technical_details") or {} for _, v in answered]
+        return {
+            "risk_score": top.get("risk_score", 0),
+            "summary": f"{top.get('summary', '')} (AI reviewed {len(windows)} of {total_windows} windows; "
+                       f"highest risk at byte {top_window.offset}.)",
+            "threats": list(dict.fromkeys(t for _, v in answered for t in v.get("threats", []))),
+            "technical_details": {
+                "vulnerabilities": list(dict.fromkeys(x for d in details for x in d.get("vulnerabilities", []))),
+                "recommendation": (top.get("technical_details") or {}).get("recommendation", ""),
+                "windows": [{**w.describe(), "risk_score": v.get("risk_score")} for w, v in zip(windows, verdicts)],
+                "windows_total": total_windows
+            }
+        }
 
     async def analyze_qr_content(self, content: str):
-        if not self.model:
+        if not await self._ready():
             return self._mock_response()
 
         prompt = f"""
@@ -65,11 +196,9 @@ class AIService:
         }}
         """
         try:
-            response = self.model.generate_content(prompt)
-            clean_text = response.text.replace('```json', '').replace('```', '').strip()
-            return json.loads(clean_text)
+            return await self._generate_json("qr-text", [content.encode()], prompt)
         except Exception as e:
-            print(f"Gemini QR Text Analysis Failed: {e}")
+            print(f"Gemini QR Text Analysis Failed: {e!r}")
             return {
                 "decoded_content": content,
                 "risk_score": 0,
@@ -79,7 +208,7 @@ class AIService:
             }
 
     async def analyze_image(self, image_bytes: bytes, mime_type: str):
-        if not self.model:
+        if not await self._ready():
             return self._mock_response()
 
         prompt = """
@@ -101,11 +230,9 @@ class AIService:
             # but usually passing the dict with 'mime_type' and 'data' works for latest genai.
             image_part = {"mime_type": mime_type, "data": image_bytes}
             
-            response = self.model.generate_content([prompt, image_part])
-            clean_text = response.text.replace('```json', '').replace('```', '').strip()
-            return json.loads(clean_text)
+            return await self._generate_json("image", [mime_type.encode(), image_bytes], [prompt, image_part])
         except Exception as e:
-            print(f"Gemini Image Analysis Failed: {e}")
+            print(f"Gemini Image Analysis Failed: {e!r}")
             return {
                 "decoded_content": "Error Analyzing Image",
                 "risk_score": 0,
@@ -114,23 +241,90 @@ class AIService:
                 "is_qr": False
             }
 
-    def chat(self, message: str, context: str = ""):
-        if not self.model:
-            return "SIMBA (Offline): AI Core is not connected. Check API Key."
-        
-        try:
-            prompt = f"""
+    def _chat_contents(self, message: str, context: str, history):
+        prompt = f"""
             System Context: {context}
             User: {message}
             
             Act as SIMBA, a cybersecurity expert AI. Be concise, technical, and helpful.
             """
-            res = self.model.generate_content(prompt)
-            return res.text
+        if not history:
+            return prompt
+        return list(history) + [{"role": "user", "parts": [prompt]}]
+
+    async def chat(self, message: str, context: str = "", history=None):
+        if not await self._ready():
+            return CHAT_OFFLINE_REPLY
+        
+        try:
+            return await self._generate(self._chat_contents(message, context, history))
+        except asyncio.TimeoutError:
+            return f"{CHAT_ERROR_PREFIX}AI Core did not answer in time."
+        except Exception as e:
+            return f"{CHAT_ERROR_PREFIX}{str(e)}"
+
+    @staticmethod
+    def is_chat_error(reply: str) -> bool:
+        """True for the offline/error text chat() returns instead of a model reply."""
+        return reply == CHAT_OFFLINE_REPLY or reply.startswith(CHAT_ERROR_PREFIX)
+
+    async def chat_stream(self, message: str, context: str = "", history=None):
+        """
+        Yields the reply text chunk by chunk as the model produces it.
+        Each chunk must arrive within GEMINI_TIMEOUT and the whole reply within
+        GEMINI_STREAM_TIMEOUT, so a stalled stream can't hold a concurrency
+        slot. Closing the generator (client gone) cancels the upstream call.
+        """
+        if not await self._ready():
+            yield CHAT_OFFLINE_REPLY
+            return
+
+        loop = asyncio.get_running_loop()
+        async with self._get_semaphore():
+            deadline = loop.time() + GEMINI_STREAM_TIMEOUT
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(self._chat_contents(message, context, history), stream=True),
+                GEMINI_TIMEOUT
+            )
+            # A task of its own reads the response; cancelling it while it
+            # waits on the next chunk cancels the RPC, which merely closing
+            # the response iterator doesn't
+            chunks = asyncio.Queue()
+            reader = asyncio.ensure_future(self._read_stream(response, chunks))
+            try:
+                while True:
+                    timeout = min(GEMINI_TIMEOUT, deadline - loop.time())
+                    chunk = await asyncio.wait_for(chunks.get(), max(timeout, 0))
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    if chunk.text:
+                        yield chunk.text
+            finally:
+                reader.cancel()
+                await asyncio.gather(reader, return_exceptions=True)
+
+    @staticmethod
+    async def _read_stream(response, chunks: asyncio.Queue):
+        """Puts each chunk on the queue, then None (or the error) at the end."""
+        try:
+            async for chunk in response:
+                chunks.put_nowait(chunk)
+            chunks.put_nowait(None)
         except Exception as e:
-            return f"Error: {str(e)}"
+            chunks.put_nowait(e)
+
+    def is_fallback(self, result: dict) -> bool:
+        """True for the placeholder verdict returned when Gemini is unavailable."""
+        return result == self._fallback_verdict()
 
     def _mock_response(self):
+        gemini_calls.inc(outcome="fallback")
+        return self._fallback_verdict()
+
+    @staticmethod
+    def _fallback_verdict():
         return {
             "risk_score": 65,
             "summary": "AI Analysis: Limited visibility (Mock Mode). Detected potentially suspicious patterns in content structure.",
@@ -0,0 +1,370 @@
+import os
+import glob
+import json
+import mmap
+import time
+import hashlib
+import tempfile
+import threading
+import ipaddress
+from urllib.parse import urlsplit
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Feed files: one entry per line (domain, URL prefix, IP or CIDR network;
+# hosts-file lines like "0.0.0.0 bad.example" also work), "#" starts a comment. They are
+# compiled into one index file that every worker maps read-only, so the
+# page cache holds a single shared copy.
+BLOCKLIST_DIR = os.getenv("BLOCKLIST_DIR", "blocklists")
+BLOCKLIST_INDEX_PATH = os.getenv("BLOCKLIST_INDEX_PATH", "blocklist.idx")
+RELOAD_INTERVAL = float(os.getenv("BLOCKLIST_RELOAD_INTERVAL", "30"))
+
+MAGIC = b"CSBLIDX2"
+BLOOM_BITS_PER_ENTRY = 10  # ~1% false positives with 7 probes
+BLOOM_K = 7
+KINDS = ("domain", "url", "ip", "cidr")
+SINK_ADDRESSES = {"0.0.0.0", "127.0.0.1", "::", "::1"}
+
+
+def _hash(kind: str, key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{kind[0]}:{key}".encode(), digest_size=8).digest(), "little")
+
+
+def _bloom_positions(h: int, m: int):
+    # Kirsch-Mitzenmacher: k probes from the two 32-bit halves of one hash
+    h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+    return [(h1 + i * h2) % m for i in range(BLOOM_K)]
+
+
+def normalize_domain(host: str):
+    host = host.strip().strip(".").lower()
+    if not host or host.isascii():
+        return host or None
+    try:
+        return host.encode("idna").decode("ascii")
+    except UnicodeError:
+        return host
+
+
+def normalize_ip(value: str):
+    try:
+        return ipaddress.ip_address(value.strip("[]")).compressed
+    except ValueError:
+        return None
+
+
+def split_url(url: str):
+    """(host, path) of a URL or bare host/path; host is normalized."""
+    if "://" not in url:
+        url = "http://" + url
+    parts = urlsplit(url.strip())
+    host = parts.hostname or ""
+    path = parts.path.rstrip("/")
+    if parts.query:
+        path += "?" + parts.query
+    return host, path
+
+
+def normalize_network(value: str):
+    """Canonical "address/prefix" of a CIDR block (host bits dropped), or None."""
+    try:
+        return ipaddress.ip_network(value.strip(), strict=False)
+    except ValueError:
+        return None
+
+
+# classify() result for a line that can't be parsed (e.g. "http://[broken/x")
+INVALID_LINE = ("invalid", None)
+
+
+def classify(line: str):
+    """(kind, key) for one feed line, INVALID_LINE, or None for blanks and comments."""
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    fields = line.split()
+    if len(fields) >= 2 and fields[0] in SINK_ADDRESSES:
+        line = fields[1]
+    if "/" not in line and ":" not in line and not line.replace(".", "").isdigit():
+        # Plain domain, by far the most common feed line
+        return "domain", normalize_domain(line)
+    ip = normalize_ip(line)
+    if ip:
+        return "ip", ip
+    if "/" in line and "://" not in line:
+        # IP feeds (DROP lists, firewall sets) are mostly CIDR blocks
+        network = normalize_network(line)
+        if network is not None:
+            if network.prefixlen == network.max_prefixlen:
+                return "ip", network.network_address.compressed
+            return "cidr", network.compressed
+    try:
+        host, path = split_url(line)
+    except ValueError:
+        return INVALID_LINE
+    if not host:
+        return None
+    if path:
+        return "url", normalize_domain(host) + path
+    ip = normalize_ip(host)
+    if ip:
+        return "ip", ip
+    return "domain", normalize_domain(host)
+
+
+def is_current_index(path) -> bool:
+    """Whether an index file on disk was written in this build's format."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def build_index(feed_paths, index_path):
+    """Compiles feed files into an index file, replacing it atomically."""
+    feeds = [os.path.basename(p) for p in feed_paths]
+    entries = {kind: {} for kind in KINDS}
+    # CIDR lookups hash the address at each prefix length listed, per family
+    prefixes = {"4": set(), "6": set()}
+    invalid = 0
+    for feed_id, path in enumerate(feed_paths):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                item = classify(line)
+                if item is INVALID_LINE:
+                    # One bad line shouldn't cost the whole index
+                    invalid += 1
+                elif item:
+                    entries[item[0]].setdefault(_hash(*item), feed_id)
+                    if item[0] == "cidr":
+                        prefixes["6" if ":" in item[1] else "4"].add(int(item[1].rsplit("/", 1)[1]))
+
+    total = sum(len(e) for e in entries.values())
+    bloom_bits = max(64, total * BLOOM_BITS_PER_ENTRY)
+    bloom = np.zeros((bloom_bits + 7) // 8, dtype=np.uint8)
+
+    sections = {}
+    arrays = []
+    offset = 0
+    for kind in KINDS:
+        hashes = np.fromiter(entries[kind].keys(), dtype=np.uint64, count=len(entries[kind]))
+        feed_ids = np.fromiter(entries[kind].values(), dtype=np.uint16, count=len(entries[kind]))
+        order = np.argsort(hashes)
+        hashes, feed_ids = hashes[order], feed_ids[order]
+        if len(hashes):
+            # Vectorized bloom insert, same probes as _bloom_positions
+            h1 = hashes & np.uint64(0xFFFFFFFF)
+            h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+            for i in range(BLOOM_K):
+                pos = (h1 + np.uint64(i) * h2) % np.uint64(bloom_bits)
+                np.bitwise_or.at(bloom, (pos >> np.uint64(3)).astype(np.int64), (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+        sections[kind] = {"count": len(hashes), "hashes": offset, "feeds": offset + hashes.nbytes}
+        arrays += [hashes.tobytes(), feed_ids.tobytes()]
+        offset += hashes.nbytes + feed_ids.nbytes
+        pad = -offset % 8
+        arrays.append(b"\0" * pad)
+        offset += pad
+
+    header = json.dumps({
+        "feeds": feeds,
+        "sections": sections,
+        "prefixes": {family: sorted(lengths, reverse=True) for family, lengths in prefixes.items()},
+        "bloom": {"offset": offset, "bits": bloom_bits, "k": BLOOM_K},
+        "invalid_lines": invalid,
+        "built_at": time.time()
+    }).encode()
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+    directory = os.path.dirname(os.path.abspath(index_path))
+    fd, tmp = tempfile.mkstemp(prefix=".blocklist_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(MAGIC + len(header).to_bytes(4, "little") + header)
+            for chunk in arrays:
+                out.write(chunk)
+            out.write(bloom.tobytes())
+        # Readers holding the old mapping keep it until they reopen
+        os.replace(tmp, index_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {**{kind: sections[kind]["count"] for kind in KINDS}, "invalid_lines": invalid}
+
+
+class BlocklistIndex:
+    """Read-only view over a memory-mapped index file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a blocklist index")
+        header_len = int.from_bytes(self._mm[len(MAGIC):len(MAGIC) + 4], "little")
+        base = len(MAGIC) + 4 + header_len
+        header = json.loads(self._mm[len(MAGIC) + 4:base])
+        self.feeds = header["feeds"]
+        self.built_at = header["built_at"]
+        self.invalid_lines = header.get("invalid_lines", 0)
+        self.prefixes = {int(family): lengths for family, lengths in header["prefixes"].items()}
+        self.sections = {}
+        for kind, sec in header["sections"].items():
+            n = sec["count"]
+            hashes = np.frombuffer(self._mm, dtype=np.uint64, count=n, offset=base + sec["hashes"])
+            feed_ids = np.frombuffer(self._mm, dtype=np.uint16, count=n, offset=base + sec["feeds"])
+            self.sections[kind] = (hashes, feed_ids)
+        bloom = header["bloom"]
+        self.bloom_bits = bloom["bits"]
+        self._bloom = memoryview(self._mm)[base + bloom["offset"]:base + bloom["offset"] + (self.bloom_bits + 7) // 8]
+
+    def counts(self):
+        return {kind: len(hashes) for kind, (hashes, _) in self.sections.items()}
+
+    def lookup_network(self, ip: str):
+        """(network, feed) of the most specific listed CIDR block containing ip, or None."""
+        address = ipaddress.ip_address(ip)
+        for prefixlen in self.prefixes.get(address.version, ()):
+            network = ipaddress.ip_network(f"{ip}/{prefixlen}", strict=False).compressed
+            feed = self.lookup("cidr", network)
+            if feed:
+                return network, feed
+        return None
+
+    def lookup(self, kind: str, key: str):
+        """Feed name listing this exact key, or None."""
+        h = _hash(kind, key)
+        bloom = self._bloom
+        for pos in _bloom_positions(h, self.bloom_bits):
+            if not (bloom[pos >> 3] >> (pos & 7)) & 1:
+                return None
+        hashes, feed_ids = self.sections[kind]
+        i = int(np.searchsorted(hashes, np.uint64(h)))
+        if i < len(hashes) and int(hashes[i]) == h:
+            return self.feeds[feed_ids[i]]
+        return None
+
+
+class BlocklistService:
+    """
+    Nothing is read at import. The first lookup maps whatever index is
+    already on disk and checks the feeds in a background thread, which
+    rebuilds the index if they changed; WARMUP=1 does that at startup.
+    """
+
+    def __init__(self, feed_dir: str = BLOCKLIST_DIR, index_path: str = BLOCKLIST_INDEX_PATH):
+        self.feed_dir = feed_dir
+        self.index_path = index_path
+        self.index = None
+        self._index_mtime = None
+        self._mapped = False
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def _feed_paths(self):
+        return sorted(p for p in glob.glob(os.path.join(self.feed_dir, "*")) if os.path.isfile(p))
+
+    def refresh(self):
+        """Rebuilds the index if a feed changed, then maps the newest index."""
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                feeds = self._feed_paths()
+                index_mtime = os.path.getmtime(self.index_path) if os.path.exists(self.index_path) else None
+                # Rebuild on a newer feed, or a feed added/removed since the build
+                names = [os.path.basename(p) for p in feeds]
+                stale = (index_mtime is None or not is_current_index(self.index_path)
+                         or max((os.path.getmtime(p) for p in feeds), default=0) > index_mtime)
+                if feeds and (stale or (self.index is not None and names != self.index.feeds)):
+                    counts = build_index(feeds, self.index_path)
+                    print(f"Blocklist index built: {counts}")
+                    index_mtime = os.path.getmtime(self.index_path)
+                if index_mtime is not None and index_mtime != self._index_mtime:
+                    self.index = BlocklistIndex(self.index_path)
+                    self._index_mtime = index_mtime
+            except Exception as e:
+                print(f"Blocklist Error: {e}")
+
+    def warm_up(self):
+        self.refresh()
+        return self.loaded
+
+    def _map_existing(self):
+        # Mapping a built index is cheap; building one is not, so that's
+        # left to the background refresh
+        self._mapped = True
+        try:
+            if self.index is None and is_current_index(self.index_path):
+                index_mtime = os.path.getmtime(self.index_path)
+                self.index = BlocklistIndex(self.index_path)
+                self._index_mtime = index_mtime
+        except Exception as e:
+            print(f"Blocklist Error: {e}")
+
+    def _maybe_refresh(self):
+        # Rebuilding millions of entries takes seconds; lookups keep using the
+        # current mapping while a background thread does it
+        if time.monotonic() - self._checked >= RELOAD_INTERVAL and not self._lock.locked():
+            self._checked = time.monotonic()
+            threading.Thread(target=self.refresh, daemon=True).start()
+
+    @property
+    def loaded(self) -> bool:
+        return self.index is not None
+
+    def check_url(self, url: str):
+        """
+        Returns {"match", "kind", "feed"} for the first listed key covering
+        this URL (exact IP or an enclosing CIDR block, the host or any parent
+        domain, or a path prefix), or None.
+        """
+        if not self._mapped:
+            self._map_existing()
+        self._maybe_refresh()
+        index = self.index
+        if index is None:
+            return None
+
+        try:
+            host, path = split_url(url)
+        except ValueError:
+            # Malformed URL: not on a blocklist as far as we can tell
+            return None
+        if not host:
+            return None
+        ip = normalize_ip(host)
+        if ip:
+            feed = index.lookup("ip", ip)
+            if feed:
+                return {"match": ip, "kind": "ip", "feed": feed}
+            listed = index.lookup_network(ip)
+            if listed:
+                return {"match": listed[0], "kind": "cidr", "feed": listed[1]}
+        else:
+            host = normalize_domain(host)
+            labels = host.split(".")
+            for i in range(len(labels)):
+                domain = ".".join(labels[i:])
+                feed = index.lookup("domain", domain)
+                if feed:
+                    return {"match": domain, "kind": "domain", "feed": feed}
+
+        # Longest prefix first, cut at "/" boundaries
+        while path:
+            feed = index.lookup("url", host + path)
+            if feed:
+                return {"match": host + path, "kind": "url", "feed": feed}
+            path = path.split("?", 1)[0] if "?" in path else path.rsplit("/", 1)[0]
+        return None
+
+    def status(self):
+        if not self._mapped:
+            self._map_existing()
+        if self.index is None:
+            return {"loaded": False}
+        return {"loaded": True, "feeds": self.index.feeds, "entries": self.index.counts(),
+                "invalid_lines": self.index.invalid_lines, "built_at": self.index.built_at}
+
+
+blocklist_service = BlocklistService()
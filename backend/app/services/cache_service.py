@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class TTLCache:
+    """Small thread-safe LRU with a per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class VerdictCache:
+    """
+    Verdicts keyed by content SHA-256: an in-memory LRU in front of a SQLite
+    table that survives restarts. Each verdict source has its own TTL and the
+    disk tier is trimmed least-recently-used first once it grows past its
+    size budget.
+    """
+
+    DEFAULT_TTLS = {
+        "VirusTotal": 24 * 3600,
+        "Gemini AI": 7 * 24 * 3600,
+        "VirusTotal (Clean)": 3600,
+        # Local verdicts only change when the rules or the triage checks do;
+        # the signature file is edited more often than the parsers
+        "CyberSpy Signatures": 24 * 3600,
+        "CyberSpy Triage": 7 * 24 * 3600,
+    }
+
+    def __init__(self):
+        self.path = os.getenv("VERDICT_CACHE_PATH", "verdict_cache.db")
+        self.max_bytes = int(os.getenv("VERDICT_CACHE_MAX_MB", "256")) * 1024 * 1024
+        self.memory = TTLCache(int(os.getenv("VERDICT_CACHE_MEMORY_ENTRIES", "1024")))
+        self.ttls = {
+            source: int(os.getenv(f"VERDICT_TTL_{self._env_name(source)}", str(ttl)))
+            for source, ttl in self.DEFAULT_TTLS.items()
+        }
+        self.default_ttl = int(os.getenv("VERDICT_TTL_DEFAULT", "3600"))
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_bytes = 0
+        try:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    sha256 TEXT PRIMARY KEY,
+                    source TEXT,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_access ON verdicts(last_access)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM verdicts").fetchone()[0]
+        except Exception as e:
+            print(f"Verdict Cache Error: {e}")
+            self._db = None
+
+    @staticmethod
+    def _env_name(source: str) -> str:
+        return "".join(c if c.isalnum() else "_" for c in source.upper()).strip("_")
+
+    def ttl_for(self, source: str) -> int:
+        return self.ttls.get(source, self.default_ttl)
+
+    def get(self, sha256: str):
+        """Returns (verdict, tier) or None."""
+        verdict = self.memory.get(sha256)
+        if verdict is not None:
+            with self._lock:
+                self.hits["memory"] += 1
+            return verdict, "memory"
+
+        if self._db is not None:
+            now = time.time()
+            with self._lock:
+                try:
+                    row = self._db.execute(
+                        "SELECT payload, expires_at FROM verdicts WHERE sha256 = ?", (sha256,)
+                    ).fetchone()
+                    if row and row[1] >= now:
+                        self._db.execute("UPDATE verdicts SET last_access = ? WHERE sha256 = ?", (now, sha256))
+                        self._db.commit()
+                    elif row:
+                        self._db.execute("DELETE FROM verdicts WHERE sha256 = ?", (sha256,))
+                        self._db.commit()
+                        row = None
+                except Exception as e:
+                    print(f"Verdict Cache Read Error: {e}")
+                    row = None
+                if row:
+                    self.hits["disk"] += 1
+            if row:
+                verdict = json.loads(row[0])
+                self.memory.set(sha256, verdict, row[1] - now)
+                return verdict, "disk"
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, sha256: str, verdict: dict):
+        ttl = self.ttl_for(verdict.get("source", ""))
+        if ttl <= 0:
+            return
+        self.memory.set(sha256, verdict, ttl)
+        if self._db is None:
+            return
+
+        payload = json.dumps(verdict)
+        now = time.time()
+        with self._lock:
+            try:
+                old = self._db.execute("SELECT size FROM verdicts WHERE sha256 = ?", (sha256,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO verdicts (sha256, source, payload, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                    (sha256, verdict.get("source"), payload, len(payload), now + ttl, now)
+                )
+                self._disk_bytes += len(payload) - (old[0] if old else 0)
+                if self._disk_bytes > self.max_bytes:
+                    self._evict(now)
+                self._db.commit()
+            except Exception as e:
+                print(f"Verdict Cache Write Error: {e}")
+
+    def _evict(self, now: float):
+        # Expired rows go first, then least recently used until we're back
+        # under ~90% of the budget
+        self._db.execute("DELETE FROM verdicts WHERE expires_at < ?", (now,))
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM verdicts").fetchone()[0]
+        excess = self._disk_bytes - int(self.max_bytes * 0.9)
+        if excess <= 0:
+            return
+        freed = 0
+        stale = []
+        for sha256, size in self._db.execute("SELECT sha256, size FROM verdicts ORDER BY last_access"):
+            stale.append((sha256,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM verdicts WHERE sha256 = ?", stale)
+        self._disk_bytes -= freed
+        for (sha256,) in stale:
+            self.memory.delete(sha256)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_entries": len(self.memory),
+                "disk_bytes": self._disk_bytes,
+                "hits": dict(self.hits),
+                "misses": self.misses
+            }
+
+
+verdict_cache = VerdictCache()
@@ -0,0 +1,299 @@
+import os
+import time
+import queue
+import select
+import socket
+import struct
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from app.services.pcap_reader import iter_records
+from app.services.pcap_decoder import decode_batch, CATEGORY_NAMES, CAT_TCP, SNAP_BYTES, LINKTYPE_ETHERNET
+from app.services.flow_table import ip_to_str, TCP_SYN, TCP_ACK
+
+load_dotenv()
+
+# What feeds /ws/stream: "" keeps the simulated events, "af_packet" or
+# "af_packet:eth0" captures live (needs CAP_NET_RAW), "pcap:/path/file.pcap"
+# replays a capture at CAPTURE_SPEED ("1", "10", ... or "max"), looping.
+CAPTURE_SOURCE = os.getenv("CAPTURE_SOURCE", "")
+CAPTURE_SPEED = os.getenv("CAPTURE_SPEED", "1")
+# Frames are handed to the parser thread in batches through a bounded ring;
+# a batch that doesn't fit is dropped and counted, never blocks the capture
+CAPTURE_BATCH = int(os.getenv("CAPTURE_BATCH", "1024"))
+CAPTURE_BATCH_TIMEOUT = float(os.getenv("CAPTURE_BATCH_TIMEOUT", "0.05"))
+CAPTURE_RING_SLOTS = int(os.getenv("CAPTURE_RING_SLOTS", "256"))
+CAPTURE_RCVBUF = int(os.getenv("CAPTURE_RCVBUF_MB", "32")) * 1024 * 1024
+TOP_TALKERS = 10
+# Distinct sources tracked per second; past this the smallest are pruned,
+# which bounds memory under spoofed-source floods
+MAX_TALKERS = 4096
+
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+
+SERVICE_PORTS = {53: "DNS", 80: "HTTP", 443: "HTTPS", 22: "SSH", 21: "FTP", 25: "SMTP", 3389: "RDP"}
+
+
+class SecondSummary:
+    """Counters for the packets parsed during one wall-clock second."""
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.syn = 0
+        self.categories = np.zeros(len(CATEGORY_NAMES), dtype=np.int64)
+        self.services = dict.fromkeys(SERVICE_PORTS.values(), 0)
+        self.talkers = {}
+
+    def add(self, pkts):
+        wirelen = pkts["wirelen"].astype(np.int64)
+        self.packets += len(pkts)
+        self.bytes += int(wirelen.sum())
+        self.categories += np.bincount(pkts["category"], minlength=len(CATEGORY_NAMES))
+
+        flags = pkts["tcp_flags"]
+        self.syn += int(np.count_nonzero((pkts["category"] == CAT_TCP) & ((flags & TCP_SYN) != 0) & ((flags & TCP_ACK) == 0)))
+        sport, dport = pkts["sport"], pkts["dport"]
+        for port, name in SERVICE_PORTS.items():
+            self.services[name] += int(np.count_nonzero((sport == port) | (dport == port)))
+
+        ip = pkts["ip_version"] > 0
+        if ip.any():
+            sources, inverse = np.unique(pkts["src"][ip], return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(sources))
+            volume = np.bincount(inverse, weights=wirelen[ip], minlength=len(sources))
+            talkers = self.talkers
+            for key, c, v in zip(sources.tolist(), counts.tolist(), volume.tolist()):
+                entry = talkers.get(key)
+                if entry is None:
+                    talkers[key] = [c, int(v)]
+                else:
+                    entry[0] += c
+                    entry[1] += int(v)
+            if len(talkers) > MAX_TALKERS:
+                keep = sorted(talkers.items(), key=lambda kv: kv[1][1], reverse=True)[:MAX_TALKERS // 4]
+                self.talkers = dict(keep)
+
+    def result(self, second: int):
+        top = sorted(self.talkers.items(), key=lambda kv: kv[1][1], reverse=True)[:TOP_TALKERS]
+        return {
+            "second": second,
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "syn_rate": self.syn,
+            "protocols": {name: int(c) for name, c in zip(CATEGORY_NAMES, self.categories)},
+            "services": {name: c for name, c in self.services.items() if c},
+            "top_talkers": [{"ip": ip_to_str(key), "packets": p, "bytes": b} for key, (p, b) in top]
+        }
+
+
+def parse_speed(value: str):
+    """Replay speed factor, or None for as fast as possible."""
+    if value.lower() in ("max", "0", ""):
+        return None
+    return float(value.lower().rstrip("x"))
+
+
+class CaptureEngine:
+    """
+    Capture thread -> bounded batch ring -> parser thread. The capture side
+    only copies the first SNAP_BYTES of each frame; the parser decodes whole
+    batches with decode_batch and rolls them into per-second summaries that
+    are passed to `publish` (called from the parser thread).
+    """
+
+    def __init__(self, source: str = CAPTURE_SOURCE, speed: str = CAPTURE_SPEED):
+        self.source = source
+        self.speed = parse_speed(speed)
+        self.ring = queue.Queue(maxsize=CAPTURE_RING_SLOTS)
+        self.publish = None
+        self._stop = threading.Event()
+        self._threads = []
+        self.error = None
+        self.counters = {"captured": 0, "parsed": 0, "ring_dropped": 0, "kernel_dropped": 0, "summaries": 0}
+        self.last_summary = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.source)
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self, publish):
+        """Starts capturing; publish(summary) is called once per second."""
+        if self.running:
+            return
+        self.publish = publish
+        self._stop.clear()
+        self.error = None
+        if self.source.startswith("pcap:"):
+            capture = self._replay
+        elif self.source.startswith("af_packet"):
+            capture = self._capture_live
+        else:
+            raise ValueError(f"Unknown capture source: {self.source}")
+        self._threads = [
+            threading.Thread(target=self._guard, args=(capture,), name="capture", daemon=True),
+            threading.Thread(target=self._parse, name="capture-parser", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads = []
+
+    def _guard(self, capture):
+        try:
+            capture()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Capture Error: {self.error}")
+            self._stop.set()
+
+    def _handoff(self, batch):
+        self.counters["captured"] += len(batch)
+        try:
+            self.ring.put_nowait(batch)
+        except queue.Full:
+            self.counters["ring_dropped"] += len(batch)
+
+    # --- Sources
+
+    def _capture_live(self):
+        _, _, interface = self.source.partition(":")
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, CAPTURE_RCVBUF)
+            if interface:
+                sock.bind((interface, 0))
+            sock.setblocking(False)
+            buf = bytearray(CAPTURE_BATCH * SNAP_BYTES)
+            view = memoryview(buf)
+            lengths = [0] * CAPTURE_BATCH
+            stamps = [0.0] * CAPTURE_BATCH
+            n = 0
+            batch_started = 0.0
+
+            def flush():
+                self._handoff([
+                    (stamps[i], LINKTYPE_ETHERNET, bytes(view[i * SNAP_BYTES:i * SNAP_BYTES + min(lengths[i], SNAP_BYTES)]), lengths[i])
+                    for i in range(n)
+                ])
+                self._read_kernel_drops(sock)
+
+            while not self._stop.is_set():
+                try:
+                    # MSG_TRUNC: copy the headers only, but return the real length
+                    lengths[n] = sock.recv_into(view[n * SNAP_BYTES:(n + 1) * SNAP_BYTES], SNAP_BYTES, socket.MSG_TRUNC)
+                except BlockingIOError:
+                    waited = time.monotonic() - batch_started
+                    if n and waited >= CAPTURE_BATCH_TIMEOUT:
+                        flush()
+                        n = 0
+                    else:
+                        select.select([sock], [], [], CAPTURE_BATCH_TIMEOUT - waited if n else CAPTURE_BATCH_TIMEOUT)
+                    continue
+                stamps[n] = time.time()
+                if n == 0:
+                    batch_started = time.monotonic()
+                n += 1
+                if n == CAPTURE_BATCH:
+                    flush()
+                    n = 0
+        finally:
+            sock.close()
+
+    def _read_kernel_drops(self, sock):
+        # struct tpacket_stats {tp_packets, tp_drops}; reading resets it
+        try:
+            _, drops = struct.unpack("II", sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+            self.counters["kernel_dropped"] += drops
+        except OSError:
+            pass
+
+    def _replay(self):
+        path = self.source[len("pcap:"):]
+        while not self._stop.is_set():
+            with open(path, "rb") as f:
+                replayed = self._replay_file(f)
+            if not replayed and not self._stop.is_set():
+                # Looping over an empty (or not yet written) capture would just spin
+                raise ValueError(f"{path} has no packets to replay")
+
+    def _replay_file(self, f):
+        """Replays one pass of the file; returns the number of records read."""
+        count = 0
+        batch = []
+        first_ts = None
+        wall_start = time.monotonic()
+        flushed = wall_start
+        for record in iter_records(f):
+            if self._stop.is_set():
+                return count
+            count += 1
+            if self.speed is not None:
+                if first_ts is None:
+                    first_ts = record[0]
+                due = wall_start + (record[0] - first_ts) / self.speed
+                delay = due - time.monotonic()
+                if delay > 0.001:
+                    if batch:
+                        self._handoff(batch)
+                        batch = []
+                    time.sleep(min(delay, 1.0))
+                    flushed = time.monotonic()
+            batch.append((time.time(), record[1], record[2][:SNAP_BYTES], record[3]))
+            if len(batch) >= CAPTURE_BATCH or time.monotonic() - flushed >= CAPTURE_BATCH_TIMEOUT:
+                self._handoff(batch)
+                batch = []
+                flushed = time.monotonic()
+        if batch:
+            self._handoff(batch)
+        return count
+
+    # --- Parser
+
+    def _parse(self):
+        second = int(time.time())
+        summary = SecondSummary()
+        while not (self._stop.is_set() and self.ring.empty()):
+            try:
+                batch = self.ring.get(timeout=0.1)
+            except queue.Empty:
+                batch = None
+            if batch:
+                summary.add(decode_batch(batch))
+                self.counters["parsed"] += len(batch)
+            now = int(time.time())
+            if now != second:
+                self._emit(summary.result(second))
+                second, summary = now, SecondSummary()
+
+    def _emit(self, result):
+        result["dropped"] = self.counters["ring_dropped"] + self.counters["kernel_dropped"]
+        self.last_summary = result
+        self.counters["summaries"] += 1
+        try:
+            self.publish(result)
+        except Exception as e:
+            print(f"Capture Publish Error: {e}")
+
+    def status(self):
+        return {
+            "source": self.source or None,
+            "running": self.running,
+            "error": self.error,
+            "ring_depth": self.ring.qsize(),
+            **self.counters,
+            "last_summary": self.last_summary
+        }
+
+
+capture_engine = CaptureEngine()
@@ -0,0 +1,120 @@
+import os
+import time
+import uuid
+from collections import deque
+from dotenv import load_dotenv
+from app.services.ai_service import ai_service, CHAT_OFFLINE_REPLY
+from app.services.cache_service import TTLCache
+
+load_dotenv()
+
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "3600"))
+# History sent back to the model is trimmed, oldest exchanges first, to this
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "2000"))
+CHAT_MAX_TURNS = int(os.getenv("CHAT_MAX_TURNS", "20"))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class ChatSession:
+    def __init__(self):
+        # (user, model) exchanges, so trimming never leaves the history
+        # starting with a model turn or out of alternation
+        self.exchanges = deque(maxlen=max(1, CHAT_MAX_TURNS // 2))
+
+    def add(self, message: str, reply: str):
+        self.exchanges.append((message, reply))
+        tokens = sum(estimate_tokens(m) + estimate_tokens(r) for m, r in self.exchanges)
+        while self.exchanges and tokens > CHAT_HISTORY_TOKENS:
+            message, reply = self.exchanges.popleft()
+            tokens -= estimate_tokens(message) + estimate_tokens(reply)
+
+    def history(self):
+        history = []
+        for message, reply in self.exchanges:
+            history.append({"role": "user", "parts": [message]})
+            history.append({"role": "model", "parts": [reply]})
+        return history
+
+
+class ChatService:
+    """Per-session history and streaming-latency stats for SIMBA chat."""
+
+    def __init__(self):
+        self.sessions = TTLCache(CHAT_MAX_SESSIONS)
+        self._ttft = deque(maxlen=500)
+        self.streams = {"started": 0, "completed": 0, "cancelled": 0, "failed": 0}
+
+    def session(self, session_id: str = None):
+        session_id = session_id or uuid.uuid4().hex
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = ChatSession()
+        # Re-set on every use so idle sessions expire but active ones don't
+        self.sessions.set(session_id, session, CHAT_SESSION_TTL)
+        return session_id, session
+
+    async def reply(self, message: str, context: str, session_id: str = None):
+        session_id, session = self.session(session_id)
+        response = await ai_service.chat(message, context, session.history())
+        # A failed turn isn't something the model said; keep it out of the history
+        if not ai_service.is_chat_error(response):
+            session.add(message, response)
+        return session_id, response
+
+    async def stream(self, message: str, context: str, session_id: str = None):
+        """
+        Yields ("token", text) as the model produces it, then ("done", info)
+        or ("error", info). The user turn and the reply are only added to the
+        history once the reply is complete.
+        """
+        session_id, session = self.session(session_id)
+        self.streams["started"] += 1
+        started = time.perf_counter()
+        ttft = None
+        parts = []
+        try:
+            async for text in ai_service.chat_stream(message, context, session.history()):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    self._ttft.append(ttft)
+                parts.append(text)
+                yield "token", {"text": text}
+        except Exception as e:
+            self.streams["failed"] += 1
+            yield "error", {"detail": f"{type(e).__name__}: {e}", "session_id": session_id}
+            return
+        except BaseException:
+            # Generator closed or cancelled: the client disconnected
+            self.streams["cancelled"] += 1
+            raise
+
+        self.streams["completed"] += 1
+        reply = "".join(parts)
+        # Errors raise; only the offline notice comes through as text
+        if reply != CHAT_OFFLINE_REPLY:
+            session.add(message, reply)
+        yield "done", {
+            "session_id": session_id,
+            "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def stats(self):
+        samples = sorted(self._ttft)
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1) if samples else None
+
+        return {
+            "ttft_ms": {"p50": pct(0.5), "p95": pct(0.95), "samples": len(samples)},
+            "streams": dict(self.streams),
+            "sessions": len(self.sessions)
+        }
+
+
+chat_service = ChatService()
@@ -0,0 +1,306 @@
+import os
+import ipaddress
+import numpy as np
+
+# 5-tuple flow tracking for PCAP analysis. Flow records live in flat NumPy
+# columns indexed by slot and a dict maps the packed 5-tuple to its slot.
+# Counters are updated per batch by grouping on slot ids, and host-level
+# statistics are computed over integer ids rather than raw addresses, so the
+# table stays fast and compact at millions of flows.
+
+FLOW_KEY_DTYPE = np.dtype([
+    ("src", "V16"),
+    ("dst", "V16"),
+    ("sport", "u2"),
+    ("dport", "u2"),
+    ("proto", "u1"),
+])
+
+TCP_FIN, TCP_SYN, TCP_RST, TCP_ACK = 0x01, 0x02, 0x04, 0x10
+
+SCAN_MIN_TARGETS = int(os.getenv("PCAP_SCAN_MIN_TARGETS", "50"))
+SCAN_MIN_HALF_OPEN_RATIO = float(os.getenv("PCAP_SCAN_MIN_HALF_OPEN_RATIO", "0.7"))
+SYN_FLOOD_MIN_SYN = int(os.getenv("PCAP_SYN_FLOOD_MIN_SYN", "500"))
+FLOOD_MIN_PACKETS = int(os.getenv("PCAP_FLOOD_MIN_PACKETS", "10000"))
+FLOOD_MIN_PPS = float(os.getenv("PCAP_FLOOD_MIN_PPS", "1000"))
+TOP_HOSTS = 20
+
+_COLUMNS = ("keys", "packets", "bytes", "syn", "ack", "rst", "first_seen", "last_seen")
+
+
+def ip_to_str(addr) -> str:
+    """Formats a 16-byte address column value (IPv4 is stored IPv4-mapped)."""
+    ip = ipaddress.IPv6Address(bytes(addr))
+    return str(ip.ipv4_mapped) if ip.ipv4_mapped else str(ip)
+
+
+def _factorize(values):
+    """Dense integer ids for an array of 16-byte addresses, plus the uniques."""
+    words = np.ascontiguousarray(values).view(">u8").reshape(-1, 2)
+    order = np.lexsort((words[:, 1], words[:, 0]))
+    sorted_words = words[order]
+    new = np.ones(len(order), dtype=bool)
+    new[1:] = np.any(sorted_words[1:] != sorted_words[:-1], axis=1)
+    ids = np.empty(len(order), dtype=np.int64)
+    ids[order] = np.cumsum(new) - 1
+    return ids, values[order[new]]
+
+
+def _count_distinct(group, member, n_groups):
+    """Number of distinct members per group, for non-negative int arrays."""
+    width = int(member.max()) + 1
+    pairs = np.sort(group.astype(np.int64) * width + member)
+    pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+    return np.bincount(pairs // width, minlength=n_groups)
+
+
+class FlowTable:
+    def __init__(self, capacity: int = 1024):
+        self._index = {}
+        self.size = 0
+        self.keys = np.zeros(capacity, dtype=FLOW_KEY_DTYPE)
+        self.packets = np.zeros(capacity, dtype=np.uint64)
+        self.bytes = np.zeros(capacity, dtype=np.uint64)
+        self.syn = np.zeros(capacity, dtype=np.uint64)  # SYN without ACK
+        self.ack = np.zeros(capacity, dtype=np.uint64)  # any packet carrying ACK
+        self.rst = np.zeros(capacity, dtype=np.uint64)
+        self.first_seen = np.zeros(capacity, dtype=np.float64)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        # Ship only the used part of the columns between processes; the
+        # index is rebuilt from the keys on first use
+        state = {name: getattr(self, name)[:self.size].copy() for name in _COLUMNS}
+        state["size"] = self.size
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._index = None
+
+    def _grow(self, needed):
+        capacity = max(len(self.keys), 1)
+        if needed <= len(self.keys):
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in _COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _rebuild_index(self):
+        width = FLOW_KEY_DTYPE.itemsize
+        blob = np.ascontiguousarray(self.keys[:self.size]).tobytes()
+        self._index = {blob[i * width:(i + 1) * width]: i for i in range(self.size)}
+
+    def _slots(self, keys):
+        width = FLOW_KEY_DTYPE.itemsize
+        blob = np.ascontiguousarray(keys).tobytes()
+        slots = np.empty(len(keys), dtype=np.int64)
+        if self._index is None:
+            self._rebuild_index()
+        index = self._index
+        added = []
+        for i in range(len(keys)):
+            k = blob[i * width:(i + 1) * width]
+            slot = index.get(k)
+            if slot is None:
+                slot = self.size + len(added)
+                index[k] = slot
+                added.append(i)
+            slots[i] = slot
+
+        if added:
+            self._grow(self.size + len(added))
+            new_slots = slots[added]
+            self.keys[new_slots] = keys[added]
+            self.first_seen[new_slots] = np.inf
+            self.last_seen[new_slots] = -np.inf
+            self.size += len(added)
+        return slots
+
+    def _accumulate(self, slots, packets, nbytes, syn, ack, rst, first_seen, last_seen):
+        # slots must be unique here so fancy-index updates don't collide
+        self.packets[slots] += packets.astype(np.uint64)
+        self.bytes[slots] += nbytes.astype(np.uint64)
+        self.syn[slots] += syn.astype(np.uint64)
+        self.ack[slots] += ack.astype(np.uint64)
+        self.rst[slots] += rst.astype(np.uint64)
+        self.first_seen[slots] = np.minimum(self.first_seen[slots], first_seen)
+        self.last_seen[slots] = np.maximum(self.last_seen[slots], last_seen)
+
+    def add_packets(self, pkts):
+        """Folds a decoded PACKET_DTYPE batch into the table."""
+        pkts = pkts[pkts["ip_version"] > 0]
+        if len(pkts) == 0:
+            return
+
+        keys = np.zeros(len(pkts), dtype=FLOW_KEY_DTYPE)
+        for name in FLOW_KEY_DTYPE.names:
+            keys[name] = pkts[name]
+        slots, inverse = np.unique(self._slots(keys), return_inverse=True)
+        inverse = inverse.ravel()
+        n = len(slots)
+
+        flags = pkts["tcp_flags"]
+        is_tcp = pkts["proto"] == 6
+        syn = is_tcp & ((flags & (TCP_SYN | TCP_ACK)) == TCP_SYN)
+        ack = is_tcp & ((flags & TCP_ACK) != 0)
+        rst = is_tcp & ((flags & TCP_RST) != 0)
+
+        ts = pkts["ts"]
+        first = np.full(n, np.inf)
+        last = np.full(n, -np.inf)
+        np.minimum.at(first, inverse, ts)
+        np.maximum.at(last, inverse, ts)
+
+        self._accumulate(
+            slots,
+            np.bincount(inverse, minlength=n),
+            np.bincount(inverse, weights=pkts["wirelen"], minlength=n),
+            np.bincount(inverse, weights=syn, minlength=n),
+            np.bincount(inverse, weights=ack, minlength=n),
+            np.bincount(inverse, weights=rst, minlength=n),
+            first,
+            last,
+        )
+
+    def merge(self, other: "FlowTable"):
+        n = other.size
+        if n == 0:
+            return
+        self._accumulate(
+            self._slots(other.keys[:n]), other.packets[:n], other.bytes[:n], other.syn[:n],
+            other.ack[:n], other.rst[:n], other.first_seen[:n], other.last_seen[:n]
+        )
+
+    def _source_stats(self):
+        """Per-source totals, fan-out and SYN-without-ACK ratio as arrays."""
+        n = self.size
+        keys, syn, ack = self.keys[:n], self.syn[:n], self.ack[:n]
+        src_inv, src_ids = _factorize(keys["src"])
+        dst_inv, _ = _factorize(keys["dst"])
+        m = len(src_ids)
+
+        # Fan-out: distinct destination hosts and distinct (host, port) targets
+        service = (dst_inv << 24) | (keys["dport"].astype(np.int64) << 8) | keys["proto"]
+        _, service_ids = np.unique(service, return_inverse=True)
+        service_ids = service_ids.ravel()
+        # Scan detection compares fan-out against half-open SYNs, so both
+        # have to be measured over TCP: UDP lookups (DNS, NTP, mDNS) would
+        # otherwise inflate a host's targets
+        tcp = keys["proto"] == 6
+        tcp_hosts = tcp_targets = np.zeros(m, dtype=np.int64)
+        if tcp.any():
+            tcp_hosts = _count_distinct(src_inv[tcp], dst_inv[tcp], m)
+            tcp_targets = _count_distinct(src_inv[tcp], service_ids[tcp], m)
+
+        syn_flows = np.bincount(src_inv, weights=syn > 0, minlength=m)
+        half_open = np.bincount(src_inv, weights=(syn > 0) & (ack == 0), minlength=m)
+        first = np.full(m, np.inf)
+        last = np.full(m, -np.inf)
+        np.minimum.at(first, src_inv, self.first_seen[:n])
+        np.maximum.at(last, src_inv, self.last_seen[:n])
+
+        return {
+            "ip": src_ids,
+            "flows": np.bincount(src_inv, minlength=m),
+            "packets": np.bincount(src_inv, weights=self.packets[:n], minlength=m),
+            "bytes": np.bincount(src_inv, weights=self.bytes[:n], minlength=m),
+            "dst_hosts": _count_distinct(src_inv, dst_inv, m),
+            "dst_targets": _count_distinct(src_inv, service_ids, m),
+            "tcp_hosts": tcp_hosts,
+            "tcp_targets": tcp_targets,
+            "syn_flows": syn_flows,
+            "syn_without_ack_ratio": np.divide(half_open, syn_flows, out=np.zeros(m), where=syn_flows > 0),
+            "first_seen": first,
+            "last_seen": last,
+        }
+
+    @staticmethod
+    def _host_record(stats, i):
+        return {
+            "ip": ip_to_str(stats["ip"][i]),
+            "flows": int(stats["flows"][i]),
+            "packets": int(stats["packets"][i]),
+            "bytes": int(stats["bytes"][i]),
+            "dst_hosts": int(stats["dst_hosts"][i]),
+            "dst_targets": int(stats["dst_targets"][i]),
+            "syn_flows": int(stats["syn_flows"][i]),
+            "syn_without_ack_ratio": round(float(stats["syn_without_ack_ratio"][i]), 3),
+            "first_seen": float(stats["first_seen"][i]),
+            "last_seen": float(stats["last_seen"][i]),
+        }
+
+    def hosts(self, limit: int = TOP_HOSTS):
+        """Busiest sources first, ranked by fan-out then packets."""
+        if self.size == 0:
+            return []
+        stats = self._source_stats()
+        order = np.lexsort((-stats["packets"], -stats["dst_targets"]))[:limit]
+        return [self._host_record(stats, i) for i in order]
+
+    def detect(self):
+        """Scan and flood detection as a single pass over the flow table."""
+        detections = []
+        if self.size == 0:
+            return detections
+
+        stats = self._source_stats()
+        scanners = (stats["tcp_targets"] >= SCAN_MIN_TARGETS) & (stats["syn_without_ack_ratio"] >= SCAN_MIN_HALF_OPEN_RATIO)
+        for i in np.flatnonzero(scanners):
+            host = self._host_record(stats, i)
+            targets, hosts = int(stats["tcp_targets"][i]), int(stats["tcp_hosts"][i])
+            detections.append({
+                "type": "Port Scan" if hosts < targets / 2 else "Host Sweep",
+                "source": host["ip"],
+                "targets": targets,
+                "hosts": hosts,
+                "syn_without_ack_ratio": host["syn_without_ack_ratio"],
+                "first_seen": host["first_seen"],
+                "last_seen": host["last_seen"],
+            })
+
+        n = self.size
+        keys, packets, syn, ack = self.keys[:n], self.packets[:n], self.syn[:n], self.ack[:n]
+
+        # SYN flood: unanswered SYNs piling up on one destination service
+        tcp = keys["proto"] == 6
+        if tcp.any():
+            tcp_keys = keys[tcp]
+            dst_inv, dst_ids = _factorize(tcp_keys["dst"])
+            src_inv, _ = _factorize(tcp_keys["src"])
+            svc_keys, svc_inv = np.unique((dst_inv << 16) | tcp_keys["dport"], return_inverse=True)
+            svc_inv = svc_inv.ravel()
+            half_open_syn = np.bincount(svc_inv, weights=np.where(ack[tcp] == 0, syn[tcp], 0), minlength=len(svc_keys))
+            sources = _count_distinct(svc_inv, src_inv, len(svc_keys))
+            for i in np.flatnonzero(half_open_syn >= SYN_FLOOD_MIN_SYN):
+                detections.append({
+                    "type": "SYN Flood",
+                    "target": f"{ip_to_str(dst_ids[svc_keys[i] >> 16])}:{int(svc_keys[i] & 0xFFFF)}",
+                    "half_open_syn": int(half_open_syn[i]),
+                    "sources": int(sources[i]),
+                })
+
+        # Volumetric flood: sustained packet rate towards one host
+        dst_inv, dst_ids = _factorize(keys["dst"])
+        dst_packets = np.bincount(dst_inv, weights=packets, minlength=len(dst_ids))
+        first = np.full(len(dst_ids), np.inf)
+        last = np.full(len(dst_ids), -np.inf)
+        np.minimum.at(first, dst_inv, self.first_seen[:n])
+        np.maximum.at(last, dst_inv, self.last_seen[:n])
+        pps = dst_packets / np.maximum(last - first, 1.0)
+        for i in np.flatnonzero((dst_packets >= FLOOD_MIN_PACKETS) & (pps >= FLOOD_MIN_PPS)):
+            detections.append({
+                "type": "Packet Flood",
+                "target": ip_to_str(dst_ids[i]),
+                "packets": int(dst_packets[i]),
+                "pps": round(float(pps[i]), 1),
+            })
+
+        return detections
@@ -0,0 +1,331 @@
+import os
+import sys
+import time
+import uuid
+import bisect
+import threading
+from collections import Counter as _Tally
+from dotenv import load_dotenv
+from app.services.cache_service import TTLCache
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Per-request latency middleware; off leaves it out of the ASGI stack entirely
+HTTP_METRICS_ENABLED = METRICS_ENABLED and os.getenv("HTTP_METRICS_ENABLED", "1") != "0"
+# Per-request sampling profiles (X-Profile: 1 header or ?profile=1); off
+# unless enabled, since a profile shows code paths and file names
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_KEEP = 50
+PROFILE_TTL = 600
+
+# Seconds; covers microsecond lookups up to minute-long VirusTotal polls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, key)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.values = {}
+
+    def inc(self, value=1, **labels):
+        if METRICS_ENABLED:
+            key = _label_key(self.labelnames, labels)
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        for key, value in list(self.values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge:
+    """Read at scrape time from a callback returning a number or {label: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labelname=None):
+        self.name, self.help, self.fn, self.labelname = name, help, fn, labelname
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Metrics Gauge Error ({self.name}): {e}")
+            return
+        if isinstance(value, dict):
+            for label, v in value.items():
+                yield self.name, _format_labels((self.labelname,), (str(label),)), v
+        elif value is not None:
+            yield self.name, "", value
+
+
+class CounterCallback(Gauge):
+    """A running total kept by a service (monotonic), read at scrape time."""
+    kind = "counter"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [per-bucket counts..., +Inf count, sum]
+
+    def _row(self, key):
+        row = self.values.get(key)
+        if row is None:
+            row = self.values[key] = [0] * (len(self.buckets) + 2)
+        return row
+
+    def observe(self, value, **labels):
+        if METRICS_ENABLED:
+            self.observe_row(self._row(_label_key(self.labelnames, labels)), value)
+
+    def observe_row(self, row, value):
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self, **labels):
+        return Span(self, self._row(_label_key(self.labelnames, labels)))
+
+    def samples(self):
+        for key, row in list(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, key, (("le", bound),)), cumulative
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), row[-1]
+
+
+class Span:
+    """Times a block (sync `with` or inside async code) into a histogram row."""
+    __slots__ = ("histogram", "row", "started")
+
+    def __init__(self, histogram, row):
+        self.histogram = histogram
+        self.row = row
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            self.histogram.observe_row(self.row, time.perf_counter() - self.started)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.families = []
+
+    def add(self, family):
+        self.families.append(family)
+        return family
+
+    def counter(self, name, help, labelnames=()):
+        return self.add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, fn, labelname=None):
+        return self.add(Gauge(name, help, fn, labelname))
+
+    def counter_callback(self, name, help, fn, labelname=None):
+        return self.add(CounterCallback(name, help, fn, labelname))
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for family in self.families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for name, labels, value in family.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "cyberspy_stage_seconds", "Time spent in each analysis stage.", ("stage",))
+http_seconds = registry.histogram(
+    "cyberspy_http_request_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+cache_events = registry.counter(
+    "cyberspy_cache_total", "Cache lookups by cache and result.", ("cache", "result"))
+vt_responses = registry.counter(
+    "cyberspy_virustotal_responses_total", "VirusTotal API responses by status code (0 = transport error).", ("status",))
+gemini_calls = registry.counter(
+    "cyberspy_gemini_calls_total", "Gemini calls by outcome.", ("outcome",))
+errors = registry.counter(
+    "cyberspy_errors_total", "Handled errors by component.", ("component",))
+
+
+def span(stage: str):
+    """`with span("virustotal"):` / inside async functions alike."""
+    return Span(stage_seconds, stage_seconds._row((stage,)))
+
+
+# --- Per-request sampling profiler
+
+class SamplingProfiler:
+    """
+    Samples every thread's stack each PROFILE_INTERVAL while a request runs
+    and aggregates them as collapsed stacks ("a;b;c count"), the input
+    format of flamegraph tools. Async handlers share the loop thread, so a
+    profile also shows whatever else ran concurrently.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+profiles = TTLCache(PROFILE_KEEP)
+
+
+_templates = {}
+
+
+def _route_template(scope):
+    """
+    "/api/analyze/file", "/api/history/{id}"...: the template, not the raw
+    path, so ids don't explode the label set. Routes of included routers
+    only know their own part, so the mount prefix is taken from the path.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    path = scope["path"]
+    if not scope.get("path_params"):
+        cached = _templates.get(path)
+        if cached is not None:
+            return cached
+    template = route.path
+    regex = getattr(route, "path_regex", None)
+    if regex is not None:
+        for i, c in enumerate(path):
+            if c == "/" and regex.match(path[i:]):
+                template = path[:i] + route.path_format
+                break
+    if not scope.get("path_params") and len(_templates) < 1024:
+        _templates[path] = template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: request latency by route template, plus a sampling
+    profile for requests that ask for one when PROFILING_ENABLED. It runs
+    on every request, so the common path is kept to one closure, two clock
+    reads and a cached histogram row; HTTP_METRICS_ENABLED=0 leaves it out.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # (method, path, status) -> histogram row, for paths without parameters
+        self._rows = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        if PROFILING_ENABLED and (b"profile=1" in scope.get("query_string", b"")
+                                  or (b"x-profile", b"1") in scope.get("headers", [])):
+            return await self._profiled(scope, receive, send)
+
+        code = 500
+
+        async def send_wrapper(message):
+            nonlocal code
+            if message["type"] == "http.response.start":
+                code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_seconds.observe_row(self._row(scope, code), elapsed)
+
+    def _row(self, scope, code):
+        key = (scope["method"], scope["path"], code)
+        row = self._rows.get(key)
+        if row is None:
+            row = http_seconds._row((scope["method"], _route_template(scope), str(code)))
+            if scope.get("route") is not None and not scope.get("path_params") and len(self._rows) < 4096:
+                self._rows[key] = row
+        return row
+
+    async def _profiled(self, scope, receive, send):
+        profiler = SamplingProfiler().start()
+        profile_id = uuid.uuid4().hex[:12]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_seconds.observe_row(self._row(scope, status["code"]), elapsed)
+            profiler.stop()
+            profiles.set(profile_id, profiler, PROFILE_TTL)
@@ -0,0 +1,309 @@
+import os
+import re
+import sys
+import time
+import shutil
+import asyncio
+from dotenv import load_dotenv
+from app.services.system_service import get_network_interfaces
+
+load_dotenv()
+
+# Scans run in the background this often; a snapshot older than the TTL
+# triggers one immediately (requests still get the stale one meanwhile)
+NETWORK_SCAN_INTERVAL = float(os.getenv("NETWORK_SCAN_INTERVAL", "30"))
+NETWORK_SCAN_TTL = float(os.getenv("NETWORK_SCAN_TTL", "60"))
+NETWORK_SCAN_TIMEOUT = float(os.getenv("NETWORK_SCAN_TIMEOUT", "10"))
+# A signal change smaller than this (percent points) isn't reported as a change
+SIGNAL_CHANGE_THRESHOLD = 10
+
+SYS_CLASS_NET = "/sys/class/net"
+PROC_NET_WIRELESS = "/proc/net/wireless"
+
+
+def dbm_to_percent(dbm: float) -> int:
+    # -100 dBm or weaker is 0%, -50 dBm or stronger is 100%
+    return int(min(100, max(0, 2 * (dbm + 100))))
+
+
+def security_status(security: str) -> str:
+    sec = security.upper()
+    if "OPEN" in sec:
+        return "Danger"
+    if "WPA2" in sec or "WPA3" in sec:
+        return "Trusted"
+    return "Warning"
+
+
+def parse_netsh(output: str):
+    """`netsh wlan show networks mode=bssid` -> one entry per BSSID."""
+    networks = []
+    ssid = security = None
+    current = None
+    for line in output.splitlines():
+        key, _, value = line.strip().partition(":")
+        key, value = key.strip(), value.strip()
+        if re.match(r"^SSID \d+$", key):
+            ssid, security, current = value, None, None
+        elif key == "Authentication":
+            security = value.upper()
+        elif re.match(r"^BSSID \d+$", key):
+            current = {"ssid": ssid, "bssid": value.lower(), "signal": None, "security": security or "UNKNOWN"}
+            networks.append(current)
+        elif key == "Signal" and current is not None:
+            current["signal"] = int(value.rstrip("%") or 0)
+    return networks
+
+
+def _split_terse(line: str):
+    # nmcli -t escapes ":" inside values as "\:"
+    return [field.replace("\\:", ":") for field in re.split(r"(?<!\\):", line)]
+
+
+def parse_nmcli(output: str):
+    """`nmcli -t -f SSID,BSSID,SIGNAL,SECURITY dev wifi list`."""
+    networks = []
+    for line in output.splitlines():
+        fields = _split_terse(line)
+        if len(fields) < 4:
+            continue
+        ssid, bssid, signal, security = fields[:4]
+        security = security.strip().replace(" ", "/").upper() or "OPEN"
+        networks.append({
+            "ssid": ssid,
+            "bssid": bssid.lower(),
+            "signal": int(signal) if signal.isdigit() else None,
+            "security": security
+        })
+    return networks
+
+
+def parse_iw_scan(output: str):
+    """`iw dev <if> scan dump` -> one entry per BSS."""
+    networks = []
+    current = None
+
+    def finish():
+        if current is None:
+            return
+        rsn, wpa, privacy = current.pop("rsn"), current.pop("wpa"), current.pop("privacy")
+        current["security"] = "WPA2" if rsn else "WPA" if wpa else "WEP" if privacy else "OPEN"
+        networks.append(current)
+
+    for line in output.splitlines():
+        m = re.match(r"^BSS ([0-9a-fA-F:]{17})", line)
+        if m:
+            finish()
+            current = {"ssid": "", "bssid": m.group(1).lower(), "signal": None, "rsn": False, "wpa": False, "privacy": False}
+            continue
+        if current is None:
+            continue
+        stripped = line.strip()
+        if stripped.startswith("SSID:"):
+            current["ssid"] = stripped[5:].strip()
+        elif stripped.startswith("signal:"):
+            try:
+                current["signal"] = dbm_to_percent(float(stripped.split()[1]))
+            except (IndexError, ValueError):
+                pass
+        elif stripped.startswith("RSN:"):
+            current["rsn"] = True
+        elif stripped.startswith("WPA:"):
+            current["wpa"] = True
+        elif stripped.startswith("capability:") and "Privacy" in stripped:
+            current["privacy"] = True
+    finish()
+    return networks
+
+
+def parse_proc_wireless(text: str):
+    """/proc/net/wireless -> {interface: link quality percent}."""
+    quality = {}
+    for line in text.splitlines()[2:]:
+        name, _, rest = line.partition(":")
+        fields = rest.split()
+        if len(fields) >= 3:
+            try:
+                # Column is "link" quality out of 70 on most drivers
+                quality[name.strip()] = min(100, int(float(fields[1].rstrip(".")) * 100 / 70))
+            except ValueError:
+                pass
+    return quality
+
+
+def read_sys_interfaces(root: str = SYS_CLASS_NET):
+    """{interface: {"wireless", "operstate"}} from sysfs."""
+    interfaces = {}
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return interfaces
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            with open(os.path.join(path, "operstate")) as f:
+                operstate = f.read().strip()
+        except OSError:
+            operstate = "unknown"
+        interfaces[name] = {"wireless": os.path.isdir(os.path.join(path, "wireless")), "operstate": operstate}
+    return interfaces
+
+
+def summarize(networks):
+    """Strongest entry per SSID, in the shape the dashboard expects."""
+    best = {}
+    for n in networks:
+        if not n.get("ssid"):
+            continue
+        prev = best.get(n["ssid"])
+        if prev is None or (n["signal"] or 0) > (prev["signal"] or 0):
+            best[n["ssid"]] = n
+    results = [{
+        "ssid": n["ssid"],
+        "security": n["security"],
+        "signal": n["signal"] if n["signal"] is not None else 0,
+        "status": security_status(n["security"])
+    } for n in best.values()]
+    return sorted(results, key=lambda r: r["signal"], reverse=True)
+
+
+def diff_networks(old, new):
+    """Added / removed / changed SSIDs between two summarize() results."""
+    before = {n["ssid"]: n for n in old}
+    after = {n["ssid"]: n for n in new}
+    changed = []
+    for ssid in before.keys() & after.keys():
+        a, b = before[ssid], after[ssid]
+        if a["security"] != b["security"] or abs(a["signal"] - b["signal"]) >= SIGNAL_CHANGE_THRESHOLD:
+            changed.append({"ssid": ssid, "before": a, "after": b})
+    return {
+        "added": sorted(after.keys() - before.keys()),
+        "removed": sorted(before.keys() - after.keys()),
+        "changed": changed
+    }
+
+
+async def run_command(*argv, timeout: float = NETWORK_SCAN_TIMEOUT):
+    """Output of a command run without a shell, or None if it failed."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+    except (OSError, ValueError):
+        return None
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        print(f"Network scan timed out: {' '.join(argv)}")
+        return None
+    if proc.returncode != 0:
+        return None
+    return stdout.decode("utf-8", errors="ignore")
+
+
+class NetworkDiscovery:
+    """
+    Background Wi-Fi and interface discovery. Requests read the latest
+    snapshot; scans run as async subprocesses (netsh on Windows, nmcli or iw
+    on Linux) on a schedule and when the snapshot is older than the TTL.
+    """
+
+    def __init__(self):
+        self.networks = []
+        self.interfaces = []
+        self.backend = None
+        self.scanned_at = None
+        self.changes = {"added": [], "removed": [], "changed": []}
+        self.version = 0
+        self._task = None
+        self._scan = None
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(NETWORK_SCAN_INTERVAL)
+
+    def refresh(self):
+        """Starts a scan unless one is running; awaitable either way."""
+        if self._scan is None or self._scan.done():
+            self._scan = asyncio.ensure_future(self._do_scan())
+        return asyncio.shield(self._scan)
+
+    async def _do_scan(self):
+        try:
+            backend, networks = await self._scan_wifi()
+            interfaces = await asyncio.to_thread(self._scan_interfaces)
+        except Exception as e:
+            print(f"Network Discovery Error: {e}")
+            return
+        summary = summarize(networks)
+        changes = diff_networks(self.networks, summary)
+        if self.scanned_at is None or any(changes.values()):
+            self.version += 1
+            self.changes = changes
+        self.networks = summary
+        self.interfaces = interfaces
+        self.backend = backend
+        self.scanned_at = time.time()
+
+    async def _scan_wifi(self):
+        if sys.platform == "win32":
+            output = await run_command("netsh", "wlan", "show", "networks", "mode=bssid")
+            return "netsh", parse_netsh(output) if output else []
+        if shutil.which("nmcli"):
+            output = await run_command("nmcli", "-t", "-f", "SSID,BSSID,SIGNAL,SECURITY", "dev", "wifi", "list")
+            if output is not None:
+                return "nmcli", parse_nmcli(output)
+        if shutil.which("iw"):
+            networks = []
+            for name, info in read_sys_interfaces().items():
+                if info["wireless"]:
+                    output = await run_command("iw", "dev", name, "scan", "dump")
+                    networks += parse_iw_scan(output) if output else []
+            return "iw", networks
+        return None, []
+
+    @staticmethod
+    def _scan_interfaces():
+        interfaces = get_network_interfaces()
+        sysfs = read_sys_interfaces()
+        try:
+            with open(PROC_NET_WIRELESS) as f:
+                quality = parse_proc_wireless(f.read())
+        except OSError:
+            quality = {}
+        for intf in interfaces:
+            info = sysfs.get(intf["ssid"], {})
+            intf["wireless"] = info.get("wireless", False)
+            if intf["ssid"] in quality:
+                intf["signal"] = quality[intf["ssid"]]
+        return interfaces
+
+    async def snapshot(self):
+        """Latest scan, refreshed in the background when stale."""
+        self._ensure_running()
+        if self.scanned_at is None:
+            # First request waits for the first scan (bounded by the scan timeout)
+            await self.refresh()
+        elif time.time() - self.scanned_at > NETWORK_SCAN_TTL:
+            self.refresh()
+        return self
+
+    def status(self):
+        return {
+            "backend": self.backend,
+            "scanned_at": self.scanned_at,
+            "networks": len(self.networks),
+            "interfaces": len(self.interfaces),
+            "version": self.version,
+            "changes": self.changes
+        }
+
+
+network_discovery = NetworkDiscovery()
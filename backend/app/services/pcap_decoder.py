@@ -0,0 +1,203 @@
+import numpy as np
+
+# Raw-header fast path for PCAP analysis. Each batch of records is copied
+# into an (n, SNAP_BYTES) matrix of leading bytes and the fixed
+# Ethernet/IPv4/IPv6/TCP/UDP fields are pulled out column-wise, so the cost
+# per packet is a few array operations instead of a Scapy dissection.
+# Anything the fast path can't classify with certainty (tunnels, IPv6
+# extension headers, exotic link types, truncated headers) is marked
+# NEEDS_DISSECTION and left to Scapy.
+
+SNAP_BYTES = 128
+
+# Categories, in the order of the "protocols" counters in the response
+CAT_TCP, CAT_UDP, CAT_DNS, CAT_HTTP, CAT_OTHER = range(5)
+CATEGORY_NAMES = ["TCP", "UDP", "DNS", "HTTP", "Other"]
+
+# Decode status
+DECODED, NEEDS_DISSECTION = 0, 1
+
+TCP_SYN = 0x02
+
+PACKET_DTYPE = np.dtype([
+    ("ts", "f8"),
+    ("caplen", "u4"),
+    ("wirelen", "u4"),
+    ("linktype", "u2"),
+    ("ethertype", "u2"),
+    ("ip_version", "u1"),
+    ("proto", "u1"),
+    ("src", "V16"),  # IPv4 addresses are stored IPv4-mapped (::ffff:a.b.c.d)
+    ("dst", "V16"),
+    ("sport", "u2"),
+    ("dport", "u2"),
+    ("tcp_flags", "u2"),
+    ("category", "u1"),
+    ("status", "u1"),
+])
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 101)
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86DD
+VLAN_TAGS = (0x8100, 0x88A8)
+
+# Ethertypes that can still carry IP further down (PPPoE, MAC-in-MAC, LLC/SNAP...)
+DEEP_ETHERTYPES = (0x0001, 0x8864, 0x8870, 0x88E7, 0x8847, 0x8848)
+# IP protocols that encapsulate another IP packet (IPIP, IPv6-in-IPv4, GRE)
+TUNNEL_PROTOS = (4, 41, 47)
+# IPv6 extension headers: hop-by-hop, routing, fragment, destination options
+IPV6_EXT_HEADERS = (0, 43, 44, 60)
+# UDP ports Scapy decodes into tunnels that may contain TCP (L2TP, GRE, VXLAN)
+UDP_TUNNEL_PORTS = (1701, 4754, 4789, 4790, 6633, 8472, 48879)
+
+_V4_MAPPED_PREFIX = np.array([0] * 10 + [0xFF, 0xFF], dtype=np.uint8)
+
+
+def _u8(hdr, rows, off):
+    return hdr[rows, np.minimum(off, SNAP_BYTES - 1)]
+
+
+def _u16(hdr, rows, off):
+    off = np.minimum(off, SNAP_BYTES - 2)
+    return (hdr[rows, off].astype(np.uint16) << 8) | hdr[rows, off + 1]
+
+
+def _bytes_at(hdr, rows, off, width):
+    cols = np.minimum(off[:, None] + np.arange(width), SNAP_BYTES - 1)
+    return hdr[rows[:, None], cols]
+
+
+def decode_batch(records):
+    """Decodes (ts, linktype, data, wirelen) records into a PACKET_DTYPE array."""
+    n = len(records)
+    out = np.zeros(n, dtype=PACKET_DTYPE)
+    if n == 0:
+        return out
+
+    ts, linktypes, datas, wirelens = zip(*records)
+    out["ts"] = ts
+    out["linktype"] = linktypes
+    out["wirelen"] = wirelens
+    caplen = np.fromiter(map(len, datas), dtype=np.int64, count=n)
+    out["caplen"] = caplen
+
+    pad = b"\0" * SNAP_BYTES
+    hdr = np.frombuffer(b"".join((d[:SNAP_BYTES] + pad)[:SNAP_BYTES] for d in datas), dtype=np.uint8)
+    hdr = hdr.reshape(n, SNAP_BYTES)
+    rows = np.arange(n)
+    linktype = out["linktype"]
+
+    # --- Link layer: find the ethertype and where the network header starts
+    ethertype = np.zeros(n, dtype=np.uint16)
+    l3 = np.zeros(n, dtype=np.int64)
+    deep = np.ones(n, dtype=bool)
+
+    eth = linktype == LINKTYPE_ETHERNET
+    ethertype[eth] = _u16(hdr, rows, 12)[eth]
+    l3[eth] = 14
+    for _ in range(2):  # 802.1Q / QinQ
+        tagged = eth & np.isin(ethertype, VLAN_TAGS)
+        ethertype[tagged] = _u16(hdr, rows, l3 + 2)[tagged]
+        l3[tagged] += 4
+    deep[eth] = caplen[eth] < l3[eth]
+
+    sll = linktype == LINKTYPE_LINUX_SLL
+    ethertype[sll] = _u16(hdr, rows, 14)[sll]
+    l3[sll] = 16
+    deep[sll] = caplen[sll] < 16
+
+    sll2 = linktype == LINKTYPE_LINUX_SLL2
+    ethertype[sll2] = _u16(hdr, rows, 0)[sll2]
+    l3[sll2] = 20
+    deep[sll2] = caplen[sll2] < 20
+
+    raw = np.isin(linktype, LINKTYPE_RAW) | (linktype == LINKTYPE_IPV4) | (linktype == LINKTYPE_IPV6)
+    nibble = hdr[:, 0] >> 4
+    ethertype[raw & (nibble == 4)] = ETH_IPV4
+    ethertype[raw & (nibble == 6)] = ETH_IPV6
+    deep[raw] = (caplen[raw] < 1) | ~np.isin(nibble[raw], (4, 6))
+    deep[(linktype == LINKTYPE_IPV4) & (nibble != 4)] = True
+    deep[(linktype == LINKTYPE_IPV6) & (nibble != 6)] = True
+
+    out["ethertype"] = ethertype
+    known = ~deep
+    deep |= known & ((ethertype <= 1500) | np.isin(ethertype, DEEP_ETHERTYPES) | np.isin(ethertype, VLAN_TAGS))
+
+    version = _u8(hdr, rows, l3) >> 4
+    v4 = ~deep & (ethertype == ETH_IPV4)
+    v6 = ~deep & (ethertype == ETH_IPV6)
+    deep |= v4 & (version != 4)
+    deep |= v6 & (version != 6)
+    v4 &= ~deep
+    v6 &= ~deep
+
+    # --- Network layer
+    proto = np.zeros(n, dtype=np.uint8)
+    l4 = np.zeros(n, dtype=np.int64)
+    fragment = np.zeros(n, dtype=bool)
+
+    ihl = (_u8(hdr, rows, l3) & 0x0F).astype(np.int64)
+    proto[v4] = _u8(hdr, rows, l3 + 9)[v4]
+    l4[v4] = (l3 + ihl * 4)[v4]
+    fragment[v4] = (_u16(hdr, rows, l3 + 6) & 0x1FFF)[v4] > 0
+    deep |= v4 & ((ihl < 5) | (caplen < l4))
+
+    proto[v6] = _u8(hdr, rows, l3 + 6)[v6]
+    l4[v6] = l3[v6] + 40
+    deep |= v6 & ((caplen < l4) | np.isin(proto, IPV6_EXT_HEADERS))
+
+    ip = (v4 | v6) & ~deep
+    deep |= ip & np.isin(proto, TUNNEL_PROTOS)
+    ip &= ~deep
+
+    src = np.zeros((n, 16), dtype=np.uint8)
+    dst = np.zeros((n, 16), dtype=np.uint8)
+    v4 &= ip
+    v6 &= ip
+    if v4.any():
+        src[v4, :12] = _V4_MAPPED_PREFIX
+        dst[v4, :12] = _V4_MAPPED_PREFIX
+        src[v4, 12:] = _bytes_at(hdr, rows, l3 + 12, 4)[v4]
+        dst[v4, 12:] = _bytes_at(hdr, rows, l3 + 16, 4)[v4]
+    if v6.any():
+        src[v6] = _bytes_at(hdr, rows, l3 + 8, 16)[v6]
+        dst[v6] = _bytes_at(hdr, rows, l3 + 24, 16)[v6]
+    out["src"] = src.view("V16").ravel()
+    out["dst"] = dst.view("V16").ravel()
+    out["ip_version"][v4] = 4
+    out["ip_version"][v6] = 6
+    out["proto"] = proto
+
+    # --- Transport layer. Non-first fragments carry no transport header.
+    tcp = ip & (proto == 6) & ~fragment
+    udp = ip & (proto == 17) & ~fragment
+    deep |= tcp & (caplen < l4 + 20)
+    deep |= udp & (caplen < l4 + 8)
+    tcp &= ~deep
+    udp &= ~deep
+
+    l4_hdr = tcp | udp
+    sport = _u16(hdr, rows, l4)
+    dport = _u16(hdr, rows, l4 + 2)
+    out["sport"][l4_hdr] = sport[l4_hdr]
+    out["dport"][l4_hdr] = dport[l4_hdr]
+    deep |= udp & (np.isin(sport, UDP_TUNNEL_PORTS) | np.isin(dport, UDP_TUNNEL_PORTS))
+    udp &= ~deep
+
+    # 9 flag bits, NS lives in the low bit of the data-offset byte
+    flags = ((_u8(hdr, rows, l4 + 12).astype(np.uint16) & 0x01) << 8) | _u8(hdr, rows, l4 + 13)
+    out["tcp_flags"][tcp] = flags[tcp]
+
+    category = np.full(n, CAT_OTHER, dtype=np.uint8)
+    category[tcp] = CAT_TCP
+    category[udp] = CAT_UDP
+    out["category"] = category
+    out["status"][deep] = NEEDS_DISSECTION
+    return out
+
@@ -0,0 +1,355 @@
+import os
+import struct
+
+# Classic pcap magics (microsecond / nanosecond timestamps)
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+
+# pcapng block types
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002  # Obsolete Packet Block
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Guards so a corrupt length field can't make us buffer the whole upload
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+MAX_BLOCK_SIZE = 32 * 1024 * 1024
+
+
+class PcapFormatError(ValueError):
+    pass
+
+
+class PcapStreamReader:
+    """
+    Incremental pcap/pcapng parser. Feed it arbitrary byte chunks as they
+    arrive and it returns the complete records found so far as
+    (timestamp, linktype, data, wirelen) tuples. Only the current partial
+    record is kept in memory.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+        self.format = None
+        self.bytes_seen = 0
+        self.truncated = False
+
+        # Classic pcap state
+        self._endian = "<"
+        self._ts_scale = 1e-6
+        self._linktype = 1
+
+        # pcapng state: (linktype, snaplen, ts_scale, ts_offset) per interface
+        self._interfaces = []
+        self.interface_blocks = 0
+
+    @property
+    def pending(self):
+        """Bytes buffered towards a record that hasn't been completed yet."""
+        return len(self._buf) - self._pos
+
+    def feed(self, data: bytes):
+        if not data:
+            return []
+        self.bytes_seen += len(data)
+        self._buf += data
+
+        if self.format is None and not self._detect_format():
+            return []
+
+        if self.format == "pcap":
+            records = self._parse_pcap()
+        else:
+            records = self._parse_pcapng()
+
+        # Compact the buffer once per chunk instead of once per record
+        if self._pos:
+            del self._buf[:self._pos]
+            self._pos = 0
+        return records
+
+    def close(self):
+        if self.format is None:
+            raise PcapFormatError("Not a pcap or pcapng file")
+        # A capture cut off mid-record (e.g. a sensor killed mid-write) still
+        # yields everything before the cut, same as rdpcap.
+        self.truncated = len(self._buf) > self._pos
+
+    def _detect_format(self):
+        if len(self._buf) < 24:
+            return False
+
+        magic_le = struct.unpack_from("<I", self._buf, 0)[0]
+        magic_be = struct.unpack_from(">I", self._buf, 0)[0]
+
+        if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS) or magic_be in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            self._endian = "<" if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS) else ">"
+            magic = magic_le if self._endian == "<" else magic_be
+            self._ts_scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+            self._linktype = struct.unpack_from(self._endian + "I", self._buf, 20)[0] & 0x0FFFFFFF
+            self.format = "pcap"
+            self._pos = 24
+            return True
+
+        if magic_le == PCAPNG_SHB:
+            self.format = "pcapng"
+            return True
+
+        raise PcapFormatError("Not a pcap or pcapng file")
+
+    def _parse_pcap(self):
+        records = []
+        buf = self._buf
+        end = len(buf)
+        pos = self._pos
+        header = struct.Struct(self._endian + "IIII")
+        scale = self._ts_scale
+        linktype = self._linktype
+
+        while pos + 16 <= end:
+            ts_sec, ts_frac, caplen, wirelen = header.unpack_from(buf, pos)
+            if caplen > MAX_RECORD_SIZE:
+                raise PcapFormatError(f"Record length {caplen} exceeds limit")
+            if pos + 16 + caplen > end:
+                break
+            records.append((ts_sec + ts_frac * scale, linktype, bytes(buf[pos + 16:pos + 16 + caplen]), wirelen))
+            pos += 16 + caplen
+
+        self._pos = pos
+        return records
+
+    def _parse_pcapng(self):
+        records = []
+        buf = self._buf
+        end = len(buf)
+        pos = self._pos
+
+        while pos + 12 <= end:
+            block_type = struct.unpack_from(self._endian + "I", buf, pos)[0]
+
+            if block_type == PCAPNG_SHB:
+                # Each section declares its own byte order
+                bom = struct.unpack_from("<I", buf, pos + 8)[0]
+                if bom == PCAPNG_BYTE_ORDER_MAGIC:
+                    self._endian = "<"
+                elif struct.unpack_from(">I", buf, pos + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+                    self._endian = ">"
+                else:
+                    raise PcapFormatError("Invalid pcapng section header")
+
+            block_len = struct.unpack_from(self._endian + "I", buf, pos + 4)[0]
+            if block_len < 12 or block_len % 4 or block_len > MAX_BLOCK_SIZE:
+                raise PcapFormatError(f"Invalid pcapng block length {block_len}")
+            if pos + block_len > end:
+                break
+
+            body = pos + 8
+            body_end = pos + block_len - 4
+
+            if block_type == PCAPNG_SHB:
+                self._interfaces = []
+                self.interface_blocks += 1
+            elif block_type == PCAPNG_IDB:
+                self._interfaces.append(self._parse_idb(buf, body, body_end))
+                self.interface_blocks += 1
+            elif block_type == PCAPNG_EPB:
+                record = self._parse_epb(buf, body, body_end)
+                if record:
+                    records.append(record)
+            elif block_type == PCAPNG_SPB:
+                record = self._parse_spb(buf, body, body_end)
+                if record:
+                    records.append(record)
+            elif block_type == PCAPNG_PB:
+                record = self._parse_pb(buf, body, body_end)
+                if record:
+                    records.append(record)
+            # Name resolution, statistics, custom blocks etc. are skipped
+
+            pos += block_len
+
+        self._pos = pos
+        return records
+
+    def _parse_idb(self, buf, body, body_end):
+        e = self._endian
+        linktype, _, snaplen = struct.unpack_from(e + "HHI", buf, body)
+        ts_scale = 1e-6
+        ts_offset = 0
+
+        opt = body + 8
+        while opt + 4 <= body_end:
+            code, length = struct.unpack_from(e + "HH", buf, opt)
+            if code == 0:  # opt_endofopt
+                break
+            value = opt + 4
+            if code == 9 and length >= 1:  # if_tsresol
+                resol = buf[value]
+                ts_scale = 2.0 ** -(resol & 0x7F) if resol & 0x80 else 10.0 ** -resol
+            elif code == 14 and length >= 8:  # if_tsoffset
+                ts_offset = struct.unpack_from(e + "q", buf, value)[0]
+            opt = value + ((length + 3) & ~3)
+
+        return (linktype, snaplen, ts_scale, ts_offset)
+
+    def _interface(self, if_id):
+        if if_id >= len(self._interfaces):
+            raise PcapFormatError(f"Packet references unknown interface {if_id}")
+        return self._interfaces[if_id]
+
+    def _parse_epb(self, buf, body, body_end):
+        if_id, ts_high, ts_low, caplen, wirelen = struct.unpack_from(self._endian + "IIIII", buf, body)
+        linktype, _, ts_scale, ts_offset = self._interface(if_id)
+        data = body + 20
+        caplen = min(caplen, body_end - data)
+        ts = ((ts_high << 32) | ts_low) * ts_scale + ts_offset
+        return (ts, linktype, bytes(buf[data:data + caplen]), wirelen)
+
+    def _parse_spb(self, buf, body, body_end):
+        wirelen = struct.unpack_from(self._endian + "I", buf, body)[0]
+        linktype, snaplen, _, _ = self._interface(0)
+        data = body + 4
+        caplen = min(wirelen, body_end - data)
+        if snaplen:
+            caplen = min(caplen, snaplen)
+        # Simple Packet Blocks carry no timestamp
+        return (0.0, linktype, bytes(buf[data:data + caplen]), wirelen)
+
+    def _parse_pb(self, buf, body, body_end):
+        if_id, _, ts_high, ts_low, caplen, wirelen = struct.unpack_from(self._endian + "HHIIII", buf, body)
+        linktype, _, ts_scale, ts_offset = self._interface(if_id)
+        data = body + 20
+        caplen = min(caplen, body_end - data)
+        ts = ((ts_high << 32) | ts_low) * ts_scale + ts_offset
+        return (ts, linktype, bytes(buf[data:data + caplen]), wirelen)
+
+
+def iter_records(file_obj, chunk_size: int = 1024 * 1024):
+    """Yields parsed records from a file-like object, one chunk at a time."""
+    reader = PcapStreamReader()
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield from reader.feed(chunk)
+    reader.close()
+
+
+# --- Splitting a capture file into record-aligned ranges for parallel analysis
+
+RESYNC_WINDOW = 4 * 1024 * 1024
+RESYNC_CHAIN = 8
+PACKET_BLOCKS = (PCAPNG_EPB, PCAPNG_SPB, PCAPNG_PB)
+# Blocks that may legitimately follow a packet block mid-file
+RESYNC_BLOCKS = PACKET_BLOCKS + (0x00000004, 0x00000005, 0x0000000A, 0x00000BAD, 0x40000BAD)
+
+
+def _pcap_chain_ok(buf, pos, endian, first_ts, ts_limit):
+    header = struct.Struct(endian + "IIII")
+    for _ in range(RESYNC_CHAIN):
+        if pos + 16 > len(buf):
+            return True  # ran off the window (or EOF) with every header valid
+        ts_sec, ts_frac, caplen, wirelen = header.unpack_from(buf, pos)
+        if ts_frac >= ts_limit or caplen > MAX_RECORD_SIZE or caplen == 0 or caplen > wirelen:
+            return False
+        if not (first_ts - 86400 <= ts_sec <= first_ts + 10 * 365 * 86400):
+            return False
+        pos += 16 + caplen
+    return True
+
+
+def _pcapng_chain_ok(buf, pos, endian):
+    for _ in range(RESYNC_CHAIN):
+        if pos + 12 > len(buf):
+            return True
+        block_type, block_len = struct.unpack_from(endian + "II", buf, pos)
+        if block_type not in RESYNC_BLOCKS or block_len < 12 or block_len % 4 or block_len > MAX_BLOCK_SIZE:
+            return False
+        if pos + block_len <= len(buf) and struct.unpack_from(endian + "I", buf, pos + block_len - 4)[0] != block_len:
+            return False
+        pos += block_len
+    return True
+
+
+def split_ranges(path: str, parts: int):
+    """
+    Splits a capture into about `parts` byte ranges that start on record
+    boundaries. Returns (prefix, ranges): prefix holds the file/section
+    headers every range must be parsed with.
+
+    Cut points are found by scanning forward from an even split for a chain
+    of plausible record headers. That is a heuristic, so callers must check
+    that each range parsed to exactly its end (see PcapStreamReader.pending)
+    and fall back to a sequential pass if one didn't.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(min(size, RESYNC_WINDOW))
+        if len(head) < 24:
+            raise PcapFormatError("Not a pcap or pcapng file")
+
+        magic_le = struct.unpack_from("<I", head, 0)[0]
+        magic_be = struct.unpack_from(">I", head, 0)[0]
+        if magic_le == PCAPNG_SHB:
+            endian = "<" if struct.unpack_from("<I", head, 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            data_start = 0
+            # Section and interface blocks up to the first packet form the prefix
+            while data_start + 8 <= len(head):
+                block_type, block_len = struct.unpack_from(endian + "II", head, data_start)
+                if block_type in PACKET_BLOCKS or block_len < 12:
+                    break
+                data_start += block_len
+
+            def chain_ok(buf, pos):
+                return pos % 4 == 0 and _pcapng_chain_ok(buf, pos, endian)
+        elif PCAP_MAGIC_US in (magic_le, magic_be) or PCAP_MAGIC_NS in (magic_le, magic_be):
+            endian = "<" if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS) else ">"
+            ts_limit = 10 ** 9 if PCAP_MAGIC_NS in (magic_le, magic_be) else 10 ** 6
+            data_start = 24
+            first_ts = struct.unpack_from(endian + "I", head, 24)[0] if len(head) >= 28 else 0
+
+            def chain_ok(buf, pos):
+                return _pcap_chain_ok(buf, pos, endian, first_ts, ts_limit)
+        else:
+            raise PcapFormatError("Not a pcap or pcapng file")
+
+        prefix = head[:data_start]
+        cuts = [data_start]
+        for i in range(1, parts):
+            # Start 4-byte aligned so window offsets keep pcapng block alignment
+            approx = (data_start + (size - data_start) * i // parts) & ~3
+            if approx <= cuts[-1]:
+                continue
+            f.seek(approx)
+            window = f.read(RESYNC_WINDOW)
+            for offset in range(len(window) - 16):
+                if chain_ok(window, offset):
+                    cuts.append(approx + offset)
+                    break
+
+    cuts.append(size)
+    return prefix, [(start, end) for start, end in zip(cuts, cuts[1:]) if end > start]
+
+
+def read_range(path: str, prefix: bytes, start: int, end: int, chunk_size: int = 1024 * 1024):
+    """Yields batches of records from [start, end) parsed after `prefix`."""
+    reader = PcapStreamReader()
+    reader.feed(prefix)
+    header_blocks = reader.interface_blocks
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield reader.feed(chunk)
+    reader.close()
+    # Misaligned start, a record spilling past `end`, or a new section/interface
+    # mid-range all mean this split can't be trusted
+    if reader.pending or remaining or reader.interface_blocks != header_blocks:
+        raise PcapFormatError("Capture range is not record aligned")
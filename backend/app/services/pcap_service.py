@@ -1,74 +1,296 @@
 import os
-import random
+import json
+import time
+import socket
 import shutil
+import asyncio
+import tempfile
+import multiprocessing
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app.services.pcap_reader import PcapStreamReader, PcapFormatError, iter_records, split_ranges, read_range
+from app.services.pcap_decoder import decode_batch, CATEGORY_NAMES, CAT_TCP, CAT_UDP, CAT_DNS, NEEDS_DISSECTION
+from app.services.flow_table import FlowTable
+
+# Scapy is only needed for packets the raw-header decoder hands back, so
+# it's imported on the first such packet rather than with the app
+_scapy = None
+
+
+def load_scapy():
+    """The Scapy layers dissection uses, or None if Scapy isn't usable."""
+    global _scapy
+    if _scapy is None:
+        try:
+            # Submodules, not scapy.all: these register the Ethernet, SLL,
+            # raw IP and IPv6 link types at a fraction of the import time
+            from scapy.config import conf
+            from scapy.layers import l2  # noqa: F401
+            from scapy.layers.inet import IP, TCP, UDP
+            from scapy.layers.inet6 import IPv6
+            from scapy.layers.dns import DNS
+            _scapy = SimpleNamespace(conf=conf, IP=IP, IPv6=IPv6, TCP=TCP, UDP=UDP, DNS=DNS)
+        except (ImportError, OSError):
+            _scapy = False
+    return _scapy or None
+
+
+def _link_layer(layers, linktype):
+    if linktype not in layers.conf.l2types:
+        # 802.11, PPP and friends: register every layer once
+        try:
+            import scapy.layers.all  # noqa: F401
+        except (ImportError, OSError):
+            pass
+    return layers.conf.l2types.get(linktype, layers.conf.raw_layer)
+
+
+TIMELINE_POINTS = 100
+BATCH_SIZE = 8192
+PROGRESS_INTERVAL = float(os.getenv("PCAP_PROGRESS_INTERVAL", "0.5"))
+PCAP_WORKERS = int(os.getenv("PCAP_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_MIN_BYTES = int(os.getenv("PCAP_PARALLEL_MIN_MB", "64")) * 1024 * 1024
+
+
+class PCAPStats:
+    """Running counters for a capture; packets are dropped once counted."""
+
+    def __init__(self):
+        self.packets = 0
+        self.first_time = None
+        self.last_time = None
+        self.protocols = {"TCP": 0, "UDP": 0, "DNS": 0, "HTTP": 0, "Other": 0}
+        self.dissected = 0
+        self.timeline = []
+        self.flows = FlowTable()
+
+    def add_records(self, records):
+        if not records:
+            return
+        pkts = decode_batch(records)
+        deep = np.flatnonzero(pkts["status"] == NEEDS_DISSECTION)
+        if len(deep):
+            self._dissect(pkts, deep, records)
+
+        self.packets += len(pkts)
+        if self.first_time is None:
+            self.first_time = float(pkts["ts"][0])
+        self.last_time = float(pkts["ts"][-1])
+
+        # Protocol Stats
+        counts = np.bincount(pkts["category"], minlength=len(CATEGORY_NAMES))
+        for name, count in zip(CATEGORY_NAMES, counts):
+            self.protocols[name] += int(count)
+
+        self.flows.add_packets(pkts)
+
+        # Timeline sampling
+        room = TIMELINE_POINTS - len(self.timeline)
+        if room > 0:
+            head = pkts[:room]
+            self.timeline.extend(
+                {"time": int(t), "len": int(l)} for t, l in zip(head["ts"], head["caplen"])
+            )
+
+    def _dissect(self, pkts, rows, records):
+        # Slow path: only packets the raw-header decoder couldn't classify
+        layers = load_scapy()
+        if layers is None:
+            return
+        for i in rows:
+            _, linktype, data, _ = records[i]
+            self.dissected += 1
+            try:
+                p = _link_layer(layers, linktype)(data)
+            except Exception:
+                # Same as rdpcap: undecodable frames count as raw data
+                continue
+            if p.haslayer(layers.TCP):
+                pkts["category"][i] = CAT_TCP
+                pkts["tcp_flags"][i] = int(p[layers.TCP].flags)
+                self._fill_flow_key(layers, pkts, i, p[layers.TCP])
+            elif p.haslayer(layers.UDP):
+                pkts["category"][i] = CAT_UDP
+                self._fill_flow_key(layers, pkts, i, p[layers.UDP])
+            elif p.haslayer(layers.DNS):
+                pkts["category"][i] = CAT_DNS
+
+    @staticmethod
+    def _fill_flow_key(layers, pkts, i, l4):
+        # Tunnelled traffic is tracked by its innermost IP header
+        ip = l4.underlayer
+        if isinstance(ip, layers.IP):
+            prefix = b"\0" * 10 + b"\xff\xff"
+            pkts["src"][i] = prefix + socket.inet_aton(ip.src)
+            pkts["dst"][i] = prefix + socket.inet_aton(ip.dst)
+            pkts["ip_version"][i] = 4
+        elif isinstance(ip, layers.IPv6):
+            pkts["src"][i] = socket.inet_pton(socket.AF_INET6, ip.src)
+            pkts["dst"][i] = socket.inet_pton(socket.AF_INET6, ip.dst)
+            pkts["ip_version"][i] = 6
+        else:
+            return
+        pkts["proto"][i] = 6 if isinstance(l4, layers.TCP) else 17
+        pkts["sport"][i] = l4.sport
+        pkts["dport"][i] = l4.dport
+
+    def merge(self, other: "PCAPStats"):
+        """Folds in the stats of the capture range that follows this one."""
+        if other.packets == 0:
+            return
+        if self.first_time is None:
+            self.first_time = other.first_time
+        self.last_time = other.last_time
+        self.packets += other.packets
+        self.dissected += other.dissected
+        for name, count in other.protocols.items():
+            self.protocols[name] += count
+        self.timeline.extend(other.timeline[:TIMELINE_POINTS - len(self.timeline)])
+        self.flows.merge(other.flows)
+
+    def result(self):
+        detections = self.flows.detect()
+        summary = {
+            "packets": self.packets,
+            "duration": f"{self.last_time - self.first_time:.2f}s" if self.packets > 1 else "0s",
+            "protocols": dict(self.protocols),
+            "flows": len(self.flows),
+            "suspicious": len(detections)
+        }
+        chart_data = [{"name": k, "value": v} for k, v in summary["protocols"].items() if v > 0]
+        return {
+            "stats": summary,
+            "chart": chart_data,
+            "timeline": self.timeline,
+            "detections": detections,
+            "hosts": self.flows.hosts()
+        }
+
+
+def _analyze_range(path, prefix, start, end):
+    # Runs in a pool worker; the returned stats are pickled back and merged
+    stats = PCAPStats()
+    for records in read_range(path, prefix, start, end):
+        stats.add_records(records)
+    return stats
 
-# Try importing Scapy
-try:
-    from scapy.all import rdpcap, TCP, UDP, DNS
-    SCAPY_AVAILABLE = True
-except (ImportError, OSError):
-    SCAPY_AVAILABLE = False
 
 class PCAPService:
-    def analyze(self, file_obj, filename):
-        if not SCAPY_AVAILABLE:
-            return self._mock_pcap()
+    def __init__(self):
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: forking a server process that already runs threads is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=PCAP_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
 
-        temp_path = f"temp_{filename}_{random.randint(1000,9999)}.pcap"
+    def close(self):
+        """Stops the worker processes; queued ranges are dropped. Blocks until they exit."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def analyze_upload(self, upload):
+        """Entry point for the /pcap route; never blocks the event loop."""
+        size = upload.size or 0
+        if PCAP_WORKERS > 1 and size >= PARALLEL_MIN_BYTES:
+            return await self.analyze_parallel(upload.file, upload.filename)
+        return await run_in_threadpool(self.analyze, upload.file, upload.filename)
+
+    async def analyze_parallel(self, file_obj, filename):
+        """
+        Splits the capture into record-aligned byte ranges, analyzes them in a
+        process pool and merges the partial stats in capture order.
+        """
+        # Pool workers need a path they can open, so large uploads are spooled
+        # to a named file once
+        fd, path = tempfile.mkstemp(prefix="cyberspy_", suffix=".pcap")
         try:
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file_obj, buffer)
-            
-            packets = rdpcap(temp_path)
-            summary = {
-                "packets": len(packets),
-                "duration": f"{packets[-1].time - packets[0].time:.2f}s" if len(packets) > 1 else "0s",
-                "protocols": {"TCP": 0, "UDP": 0, "DNS": 0, "HTTP": 0, "Other": 0},
-                "suspicious": 0
-            }
-            
-            timeline = []
-            
-            for p in packets:
-                # Protocol Stats
-                if p.haslayer(TCP): summary["protocols"]["TCP"] += 1
-                elif p.haslayer(UDP): summary["protocols"]["UDP"] += 1
-                elif p.haslayer(DNS): summary["protocols"]["DNS"] += 1
-                else: summary["protocols"]["Other"] += 1
-                
-                # Simple Heuristics
-                if p.haslayer(TCP) and p[TCP].flags == 'S': 
-                    summary["suspicious"] += 1
-                
-                # Timeline sampling
-                if len(timeline) < 100: # Limit points
-                    timeline.append({"time": int(p.time), "len": len(p)})
-
-            chart_data = [{"name": k, "value": v} for k, v in summary["protocols"].items() if v > 0]
-            
-            return {
-                "stats": summary,
-                "chart": chart_data,
-                "timeline": timeline
-            }
+            with os.fdopen(fd, "wb") as out:
+                await run_in_threadpool(shutil.copyfileobj, file_obj, out, 1024 * 1024)
+
+            try:
+                prefix, ranges = await run_in_threadpool(split_ranges, path, PCAP_WORKERS)
+                loop = asyncio.get_running_loop()
+                pool = self._get_pool()
+                futures = [loop.run_in_executor(pool, _analyze_range, path, prefix, start, end) for start, end in ranges]
+                partials = await asyncio.gather(*futures)
+            except BrokenProcessPool:
+                # A worker died (OOM, killed); start a fresh pool next time
+                self._pool = None
+                raise
+            except PcapFormatError as e:
+                # A cut landed off a record boundary (or the file isn't a
+                # capture at all); the sequential pass gives the exact answer
+                print(f"PCAP parallel split failed ({e}), falling back to sequential")
+                with open(path, "rb") as f:
+                    return await run_in_threadpool(self.analyze, f, filename)
+
+            def merge():
+                stats = PCAPStats()
+                for partial in partials:
+                    stats.merge(partial)
+                return stats.result()
+
+            return await run_in_threadpool(merge)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"PCAP Error: {str(e)}")
         finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            if os.path.exists(path):
+                os.remove(path)
 
-    def _mock_pcap(self):
-        return {
-            "stats": {
-                "packets": 0,
-                "duration": "N/A (Npcap Missing)",
-                "protocols": {},
-                "suspicious": 0
-            },
-            "chart": [],
-            "timeline": [],
-            "error": "Scapy/Npcap driver not found. Please install Npcap."
-        }
+    def analyze(self, file_obj, filename):
+        try:
+            stats = PCAPStats()
+            batch = []
+            for record in iter_records(file_obj):
+                batch.append(record)
+                if len(batch) >= BATCH_SIZE:
+                    stats.add_records(batch)
+                    batch = []
+            stats.add_records(batch)
+            return stats.result()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"PCAP Error: {str(e)}")
+
+    async def analyze_stream(self, chunks, filename):
+        """
+        Parses a capture while it is still being uploaded. Yields NDJSON lines:
+        periodic "progress" events with the counters so far, then one
+        "result" event in the same shape as analyze().
+        """
+        reader = PcapStreamReader()
+        stats = PCAPStats()
+        last_report = time.monotonic()
+        try:
+            async for chunk in chunks:
+                records = reader.feed(chunk)
+                if records:
+                    # Dissection is CPU bound, keep it off the event loop
+                    await run_in_threadpool(stats.add_records, records)
+
+                now = time.monotonic()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    yield json.dumps({
+                        "event": "progress",
+                        "filename": filename,
+                        "bytes": reader.bytes_seen,
+                        "packets": stats.packets,
+                        "protocols": dict(stats.protocols),
+                        "flows": len(stats.flows)
+                    }) + "\n"
+
+            reader.close()
+            yield json.dumps({"event": "result", "filename": filename, "bytes": reader.bytes_seen, **stats.result()}) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": f"PCAP Error: {str(e)}"}) + "\n"
 
 pcap_service = PCAPService()
@@ -0,0 +1,265 @@
+import io
+import os
+import hashlib
+import importlib.util
+import time
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# All optional: without a decoder every image goes to Gemini Vision as
+# before; without Pillow it goes at its original size and isn't hashed
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    from pyzbar import pyzbar
+    PYZBAR_AVAILABLE = True
+except (ImportError, OSError):  # OSError: libzbar itself missing
+    PYZBAR_AVAILABLE = False
+
+# Longest side used for local decoding, and for images still sent to Vision
+QR_DECODE_MAX_SIDE = int(os.getenv("QR_DECODE_MAX_SIDE", "1600"))
+QR_VISION_MAX_SIDE = int(os.getenv("QR_VISION_MAX_SIDE", "1024"))
+QR_VISION_JPEG_QUALITY = int(os.getenv("QR_VISION_JPEG_QUALITY", "85"))
+# Perceptual cache: 256-bit difference hashes within this many bits count
+# as the same picture. Every QR code shares the same finder patterns, so
+# distinct codes can be only 3 bits apart: the default only matches
+# near-exact copies (same pixels re-encoded), and a hit on a different
+# file is reported as a near duplicate, not as this image's own verdict
+QR_PHASH_DISTANCE = int(os.getenv("QR_PHASH_DISTANCE", "2"))
+QR_PHASH_ENTRIES = int(os.getenv("QR_PHASH_ENTRIES", "4096"))
+QR_PHASH_TTL = float(os.getenv("QR_PHASH_TTL", str(24 * 3600)))
+HASH_SIDE = 16
+
+_cv2 = None
+
+
+def load_cv2():
+    """OpenCV, imported on first use (it's heavy), or None."""
+    global _cv2
+    if _cv2 is None:
+        try:
+            import cv2
+            _cv2 = cv2
+        except ImportError:
+            _cv2 = False
+    return _cv2 or None
+
+
+class PerceptualCache:
+    """
+    Verdicts keyed by a difference hash of the image, stored with the
+    image's SHA-256. Lookups are a vectorised Hamming-distance scan over
+    every stored hash, so a near duplicate hits even though its bytes
+    differ; the SHA-256 tells the caller whether it was the same file.
+    Oldest entries are overwritten once full.
+    """
+
+    def __init__(self, capacity: int = QR_PHASH_ENTRIES, max_distance: int = QR_PHASH_DISTANCE):
+        self.max_distance = max_distance
+        self.hashes = np.zeros((capacity, HASH_SIDE * HASH_SIDE // 8), dtype=np.uint8)
+        self.expires = np.zeros(capacity)
+        self.values = [None] * capacity
+        self.sha256s = [None] * capacity
+        self.next = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, digest: np.ndarray, sha256: str = None):
+        """(value, SHA-256 of the image it was stored for) of the closest match, or None."""
+        with self._lock:
+            live = self.expires > time.time()
+            if live.any():
+                distances = np.unpackbits(self.hashes ^ digest, axis=1).sum(axis=1, dtype=np.int32)
+                distances[~live] = self.max_distance + 1
+                if sha256 is not None:
+                    # The same file wins over a look-alike at the same distance
+                    same = np.fromiter((s == sha256 for s in self.sha256s), bool, len(self.sha256s))
+                    distances[same & live] = -1
+                best = int(distances.argmin())
+                if distances[best] <= self.max_distance:
+                    self.hits += 1
+                    return self.values[best], self.sha256s[best]
+            self.misses += 1
+            return None
+
+    def set(self, digest: np.ndarray, value, ttl: float = QR_PHASH_TTL, sha256: str = None):
+        with self._lock:
+            slot = self.next
+            self.hashes[slot] = digest
+            self.expires[slot] = time.time() + ttl
+            self.values[slot] = value
+            self.sha256s[slot] = sha256
+            self.next = (slot + 1) % len(self.values)
+
+    def __len__(self):
+        return int((self.expires > time.time()).sum())
+
+
+class DecodedImage:
+    """What the CPU side learned about an upload."""
+    __slots__ = ("payloads", "decoder", "digest", "sha256", "vision_bytes", "vision_mime")
+
+    def __init__(self, payloads, decoder, digest, vision_bytes, vision_mime, sha256=None):
+        self.payloads = payloads
+        self.decoder = decoder
+        self.digest = digest
+        self.sha256 = sha256
+        self.vision_bytes = vision_bytes
+        self.vision_mime = vision_mime
+
+
+class QRService:
+    """
+    Local half of /api/analyze/qr: decode QR codes on the CPU (zbar, then
+    OpenCV), hash the picture for the perceptual cache and, for images that
+    still need Gemini Vision, crop to a detected-but-unreadable code or
+    downscale. CPU-bound; call process() from a worker thread.
+    """
+
+    def __init__(self):
+        self.cache = PerceptualCache()
+        self.counters = {"decoded": 0, "vision": 0, "undecodable_images": 0}
+
+    def process(self, image_bytes: bytes, mime_type: str) -> DecodedImage:
+        gray, image = self._load(image_bytes)
+        if gray is None:
+            self.counters["undecodable_images"] += 1
+            return DecodedImage([], None, None, image_bytes, mime_type)
+
+        payloads, decoder, box = self._decode(gray)
+        if payloads:
+            self.counters["decoded"] += 1
+            return DecodedImage(payloads, decoder, None, None, None)
+
+        self.counters["vision"] += 1
+        vision_bytes, vision_mime = self._for_vision(image, gray, box, image_bytes, mime_type)
+        return DecodedImage([], None, difference_hash(gray), vision_bytes, vision_mime,
+                            hashlib.sha256(image_bytes).hexdigest())
+
+    def cached_verdict(self, image: DecodedImage):
+        """
+        Vision verdict for this picture from the perceptual cache, or None.
+        Only the same file gets the stored verdict as its own; a look-alike
+        gets it flagged as near_duplicate, since what it decodes to may differ.
+        """
+        if image.digest is None:
+            return None
+        found = self.cache.get(image.digest, image.sha256)
+        if found is None:
+            return None
+        verdict, sha256 = found
+        if sha256 == image.sha256:
+            return {**verdict, "cached": True}
+        return {
+            **verdict,
+            "cached": True,
+            "near_duplicate": True,
+            "near_duplicate_of": sha256,
+            "summary": f"Visually near-identical to a previously analysed image; its verdict is shown. {verdict.get('summary', '')}".strip()
+        }
+
+    def remember(self, image: DecodedImage, verdict: dict):
+        if image.digest is not None:
+            self.cache.set(image.digest, verdict, sha256=image.sha256)
+
+    def _load(self, image_bytes):
+        """(grayscale uint8 array, PIL image or None); (None, None) if unreadable."""
+        if PIL_AVAILABLE:
+            try:
+                image = Image.open(io.BytesIO(image_bytes))
+                image.draft("RGB", (QR_DECODE_MAX_SIDE, QR_DECODE_MAX_SIDE))  # JPEG: decode at reduced size
+                image = ImageOps.exif_transpose(image).convert("RGB")
+                return np.asarray(_fit(image, QR_DECODE_MAX_SIDE).convert("L")), image
+            except Exception:
+                return None, None
+        cv2 = load_cv2()
+        if cv2 is not None:
+            gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if gray is not None:
+                scale = QR_DECODE_MAX_SIDE / max(gray.shape)
+                if scale < 1:
+                    gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                return gray, None
+        return None, None
+
+    def _decode(self, gray):
+        """(payloads, decoder name, bounding box of a code that wouldn't decode)."""
+        if PYZBAR_AVAILABLE:
+            symbols = pyzbar.decode(gray, symbols=[pyzbar.ZBarSymbol.QRCODE])
+            payloads = [s.data.decode("utf-8", "replace") for s in symbols if s.data]
+            if payloads:
+                return payloads, "zbar", None
+        box = None
+        cv2 = load_cv2()
+        if cv2 is not None:
+            ok, texts, points, _ = cv2.QRCodeDetector().detectAndDecodeMulti(gray)
+            if ok:
+                payloads = [t for t in texts if t]
+                if payloads:
+                    return payloads, "opencv", None
+                if points is not None and len(points):
+                    corners = points.reshape(-1, 2)
+                    box = (*corners.min(axis=0), *corners.max(axis=0))
+        return [], None, box
+
+    def _for_vision(self, image, gray, box, image_bytes, mime_type):
+        if image is None:
+            return image_bytes, mime_type
+        if box is not None:
+            # A code was found but not read: Vision only needs that region.
+            # The box is in decode-scale coordinates.
+            scale = max(image.size) / max(gray.shape)
+            x0, y0, x1, y1 = (v * scale for v in box)
+            margin = 0.15 * max(x1 - x0, y1 - y0)
+            image = image.crop((int(max(0, x0 - margin)), int(max(0, y0 - margin)),
+                                int(min(image.width, x1 + margin)), int(min(image.height, y1 + margin))))
+        elif max(image.size) <= QR_VISION_MAX_SIDE and len(image_bytes) <= 1024 * 1024:
+            return image_bytes, mime_type
+        out = io.BytesIO()
+        _fit(image, QR_VISION_MAX_SIDE).save(out, "JPEG", quality=QR_VISION_JPEG_QUALITY)
+        return out.getvalue(), "image/jpeg"
+
+    def status(self):
+        return {
+            "pillow": PIL_AVAILABLE,
+            "zbar": PYZBAR_AVAILABLE,
+            "opencv": importlib.util.find_spec("cv2") is not None,
+            "perceptual_cache": {"entries": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses},
+            **self.counters
+        }
+
+
+def _fit(image, max_side):
+    if max(image.size) <= max_side:
+        return image
+    scale = max_side / max(image.size)
+    return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+
+def difference_hash(gray: np.ndarray) -> np.ndarray:
+    """
+    256-bit dHash: shrink to 17x16 by block averaging, then one bit per
+    horizontal neighbour pair (brighter or not). Survives rescaling,
+    recompression and small lighting changes.
+    """
+    h, w = gray.shape
+    rows = np.linspace(0, h, HASH_SIDE + 1).astype(int)
+    cols = np.linspace(0, w, HASH_SIDE + 2).astype(int)
+    if h < HASH_SIDE or w < HASH_SIDE + 1:
+        # Tiny images: nearest-neighbour sampling instead of block means
+        small = gray[np.minimum(rows[:-1], h - 1)][:, np.minimum(cols[:-1], w - 1)].astype(np.float32)
+    else:
+        small = np.add.reduceat(np.add.reduceat(gray.astype(np.float32), rows[:-1], axis=0), cols[:-1], axis=1)
+        small /= np.outer(np.diff(rows), np.diff(cols))
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+
+qr_service = QRService()
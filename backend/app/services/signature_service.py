@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import time
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# pyahocorasick is optional; without it literals go through one alternation regex
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "rules", "signatures.json")
+RULES_PATH = os.getenv("SIGNATURE_RULES_PATH", DEFAULT_RULES_PATH)
+RELOAD_INTERVAL = float(os.getenv("SIGNATURE_RELOAD_INTERVAL", "5"))
+# A local score at or above this is trusted without asking Gemini
+CONCLUSIVE_SCORE = int(os.getenv("SIGNATURE_CONCLUSIVE_SCORE", "70"))
+
+CHUNK_SIZE = 4 * 1024 * 1024
+# Chunks overlap so matches up to this long aren't lost at a boundary
+OVERLAP = 4096
+
+
+class SignatureEngine:
+    """
+    Literal patterns of every rule are compiled into one automaton, so a
+    chunk is scanned once for all of them; regex rules are precompiled and
+    run separately (one big alternation defeats re's literal-prefix search
+    and is several times slower).
+
+    Rule format (see app/rules/signatures.json):
+        {"id", "name", "score", "patterns": [...]}  literals, case-insensitive
+        {"id", "name", "score", "regex": "..."}     bytes regex
+    """
+
+    def __init__(self, rules):
+        self.rules = {rule["id"]: rule for rule in rules}
+        self.literal_rules = {}
+        self.regexes = []
+        for rule in rules:
+            for pattern in rule.get("patterns", []):
+                self.literal_rules.setdefault(pattern.lower(), set()).add(rule["id"])
+            if rule.get("regex"):
+                self.regexes.append((rule["id"], re.compile(rule["regex"].encode())))
+
+        self.automaton = None
+        self.literal_regex = None
+        if self.literal_rules and AHOCORASICK_AVAILABLE:
+            self.automaton = ahocorasick.Automaton()
+            for literal in self.literal_rules:
+                self.automaton.add_word(literal, literal)
+            self.automaton.make_automaton()
+        elif self.literal_rules:
+            literals = sorted(self.literal_rules, key=len, reverse=True)
+            self.literal_regex = re.compile(b"|".join(re.escape(l.encode("latin-1")) for l in literals))
+
+    @property
+    def backend(self):
+        return "aho-corasick" if self.automaton is not None else "regex"
+
+    def scan(self, file_obj):
+        """Returns {rule_id: first offset} for every rule that matched."""
+        hits = {}
+        base = 0
+        tail = b""
+        while True:
+            chunk = file_obj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            data = tail + chunk
+            start = base - len(tail)
+            self._scan_block(data, start, hits)
+            tail = data[-OVERLAP:]
+            base += len(chunk)
+        return hits
+
+    def _scan_block(self, data, start, hits):
+        def hit(rule_id, offset):
+            if rule_id not in hits or offset < hits[rule_id]:
+                hits[rule_id] = offset
+
+        if self.automaton is not None:
+            lowered = data.lower().decode("latin-1")
+            for end, literal in self.automaton.iter(lowered):
+                for rule_id in self.literal_rules[literal]:
+                    hit(rule_id, start + end - len(literal) + 1)
+        elif self.literal_regex is not None:
+            for m in self.literal_regex.finditer(data.lower()):
+                for rule_id in self.literal_rules[m.group(0).decode("latin-1")]:
+                    hit(rule_id, start + m.start())
+
+        for rule_id, regex in self.regexes:
+            if rule_id in hits:
+                # Chunks come in file order, a later match can't be earlier
+                continue
+            m = regex.search(data)
+            if m:
+                hit(rule_id, start + m.start())
+
+
+class SignatureService:
+    def __init__(self, path: str = RULES_PATH):
+        self.path = path
+        self.engine = None
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                rules = json.load(f)["rules"]
+            # Swapped in only once it compiled, so a bad edit keeps the old rules
+            self.engine = SignatureEngine(rules)
+            self._mtime = mtime
+            print(f"Signature rules loaded: {len(rules)} rules ({self.engine.backend})")
+        except Exception as e:
+            print(f"Signature Rules Error: {e}")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            if now - self._checked >= RELOAD_INTERVAL:
+                self._checked = now
+                self._reload()
+
+    def scan(self, file_obj):
+        """
+        Scans a whole file object. Returns a verdict in the usual
+        risk_score/summary/threats/technical_details shape plus "conclusive",
+        or None when no rules are loaded.
+        """
+        self._maybe_reload()
+        engine = self.engine
+        if engine is None:
+            return None
+
+        hits = engine.scan(file_obj)
+        matched = sorted((engine.rules[rule_id] for rule_id in hits), key=lambda r: r["score"], reverse=True)
+        # Strongest rule sets the score, every further rule adds a little
+        risk_score = min(100, matched[0]["score"] + 5 * (len(matched) - 1)) if matched else 0
+        return {
+            "risk_score": risk_score,
+            "summary": f"Local signature scan matched {len(matched)} rule(s): {', '.join(r['name'] for r in matched)}."
+                       if matched else "No local signatures matched.",
+            "threats": [r["name"] for r in matched],
+            "technical_details": {
+                "matches": [{"rule": r["id"], "offset": hits[r["id"]], "score": r["score"]} for r in matched],
+                "engine": engine.backend
+            },
+            "conclusive": risk_score >= CONCLUSIVE_SCORE
+        }
+
+
+signature_service = SignatureService()
@@ -1,39 +1,403 @@
 import os
-from supabase import create_client, Client
+import json
+import time
+import uuid
+import base64
+import sqlite3
+import asyncio
+import threading
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from app.services.metrics_service import span, errors
 
 load_dotenv()
 
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "")  # "supabase" | "sqlite"; default picks by config
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", "analysis_results.db")
+STORAGE_SPOOL_PATH = os.getenv("STORAGE_SPOOL_PATH", "analysis_spool.jsonl")
+STORAGE_BATCH_SIZE = int(os.getenv("STORAGE_BATCH_SIZE", "100"))
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", "0.5"))
+STORAGE_QUEUE_MAX = int(os.getenv("STORAGE_QUEUE_MAX", "10000"))
+# After a failed write the backend is left alone this long; batches go to the spool
+STORAGE_RETRY_INTERVAL = float(os.getenv("STORAGE_RETRY_INTERVAL", "15"))
+# flush()/close() give up waiting on the writer after this long
+STORAGE_FLUSH_TIMEOUT = float(os.getenv("STORAGE_FLUSH_TIMEOUT", "10"))
+HISTORY_MAX_PAGE = 500
+
+COLUMNS = ("id", "created_at", "filename", "risk_score", "summary", "details", "source", "content_hash")
+
+
+def encode_cursor(row: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([row["created_at"], row["id"]]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    (created_at, id) from a cursor made by encode_cursor. Cursors come from
+    clients and end up in backend filters, so anything but an ISO-8601
+    timestamp and a UUID or integer id is rejected.
+    """
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at, row_id = str(created_at), str(row_id)
+        datetime.fromisoformat(created_at)
+        if not (row_id.isascii() and row_id.isdigit()):
+            row_id = str(uuid.UUID(row_id))
+        return created_at, row_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class SupabaseBackend:
+    name = "supabase"
+
+    def __init__(self, client):
+        self.client = client
+
+    def insert_many(self, records):
+        # upsert on id: replaying a spool that was partly written is harmless
+        self.client.table("analysis_results").upsert(records).execute()
+
+    def query(self, filters: dict, cursor, limit: int):
+        q = self.client.table("analysis_results").select(",".join(COLUMNS))
+        if filters.get("since"):
+            q = q.gte("created_at", filters["since"])
+        if filters.get("until"):
+            q = q.lt("created_at", filters["until"])
+        if filters.get("source"):
+            q = q.eq("source", filters["source"])
+        if filters.get("min_score") is not None:
+            q = q.gte("risk_score", filters["min_score"])
+        if filters.get("filename"):
+            q = q.eq("filename", filters["filename"])
+        if filters.get("content_hash"):
+            q = q.eq("content_hash", filters["content_hash"])
+        if cursor:
+            # Values are quoted so they're never read as PostgREST syntax
+            created_at, row_id = cursor
+            q = q.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")')
+        return q.order("created_at", desc=True).order("id", desc=True).limit(limit).execute().data
+
+
+class SQLiteBackend:
+    """Local stand-in with the same analysis_results columns as schema.sql."""
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_results (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                risk_score INTEGER,
+                summary TEXT,
+                details TEXT,
+                source TEXT,
+                content_hash TEXT
+            )
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(analysis_results)")}
+        if "content_hash" not in columns:
+            self._db.execute("ALTER TABLE analysis_results ADD COLUMN content_hash TEXT")
+        # Same indexes as schema.sql
+        self._db.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_analysis_source ON analysis_results(source);
+            CREATE INDEX IF NOT EXISTS idx_analysis_risk ON analysis_results(risk_score);
+            CREATE INDEX IF NOT EXISTS idx_analysis_created ON analysis_results(created_at DESC, id DESC);
+            CREATE INDEX IF NOT EXISTS idx_analysis_source_created ON analysis_results(source, created_at DESC, id DESC);
+            CREATE INDEX IF NOT EXISTS idx_analysis_hash ON analysis_results(content_hash);
+            CREATE INDEX IF NOT EXISTS idx_analysis_filename ON analysis_results(filename);
+        """)
+        self._db.commit()
+
+    def insert_many(self, records):
+        rows = [
+            tuple(json.dumps(r["details"]) if c == "details" else r.get(c) for c in COLUMNS)
+            for r in records
+        ]
+        with self._lock:
+            self._db.executemany(
+                f"INSERT OR IGNORE INTO analysis_results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows
+            )
+            self._db.commit()
+
+    def query(self, filters: dict, cursor, limit: int):
+        where, params = [], []
+        for key, clause in (
+            ("since", "created_at >= ?"),
+            ("until", "created_at < ?"),
+            ("source", "source = ?"),
+            ("min_score", "risk_score >= ?"),
+            ("filename", "filename = ?"),
+            ("content_hash", "content_hash = ?"),
+        ):
+            if filters.get(key) is not None:
+                where.append(clause)
+                params.append(filters[key])
+        if cursor:
+            # Keyset: continue strictly after the last row of the previous page
+            where.append("(created_at, id) < (?, ?)")
+            params += list(cursor)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM analysis_results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, params + [limit]).fetchall()
+        items = [dict(zip(COLUMNS, row)) for row in rows]
+        for item in items:
+            item["details"] = json.loads(item["details"]) if item["details"] else {}
+        return items
+
+
 class StorageService:
+    """
+    Write-behind persistence. save_analysis() only enqueues; a background
+    task writes records in batches of up to STORAGE_BATCH_SIZE or every
+    STORAGE_FLUSH_INTERVAL seconds. Batches that can't be written are
+    appended to a local JSONL spool and replayed once the backend answers
+    again: when the writer starts, and every STORAGE_RETRY_INTERVAL while
+    it's idle. A full queue makes callers wait (backpressure) instead of
+    growing without bound. A writer that dies is restarted.
+    """
+
     def __init__(self):
         self.url = os.getenv("SUPABASE_URL")
         self.key = os.getenv("SUPABASE_KEY")
-        self.client: Client = None
-        if self.url and self.key:
-            try:
+        self.client = None
+        self.spool_path = STORAGE_SPOOL_PATH
+        self._backend = None
+        self._backend_loaded = False
+        self._backend_lock = threading.Lock()
+
+        self._queue = None
+        self._loop = None
+        self._writer = None
+        self._down_until = 0.0
+        self.counters = {"queued": 0, "written": 0, "spooled": 0, "replayed": 0, "failed_batches": 0, "dropped": 0}
+
+    @property
+    def backend(self):
+        # The Supabase SDK is imported and connected on first use (or by
+        # warm_up()), so importing the app doesn't pay for it
+        if not self._backend_loaded:
+            with self._backend_lock:
+                if not self._backend_loaded:
+                    self._backend = self._connect()
+                    self._backend_loaded = True
+        return self._backend
+
+    @backend.setter
+    def backend(self, value):
+        self._backend = value
+        self._backend_loaded = True
+
+    def _connect(self):
+        backend = STORAGE_BACKEND or ("supabase" if self.url and self.key else "sqlite")
+        try:
+            if backend == "supabase":
+                from supabase import create_client
                 self.client = create_client(self.url, self.key)
+                return SupabaseBackend(self.client)
+            return SQLiteBackend(STORAGE_SQLITE_PATH)
+        except Exception as e:
+            print(f"Storage Connection Error: {e}")
+            return None
+
+    def warm_up(self):
+        return self.backend is not None
+
+    def start(self):
+        """Starts the writer, which replays any spool left by a previous run."""
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        # Queue and writer belong to the running loop
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue(maxsize=STORAGE_QUEUE_MAX)
+            self._loop = loop
+            self._writer = None
+        if self._writer is None or self._writer.done():
+            self._writer = loop.create_task(self._run_writer())
+            self._writer.add_done_callback(self._writer_done)
+
+    def _writer_done(self, task):
+        if task.cancelled() or task is not self._writer:
+            return
+        print(f"Storage Writer Error: writer stopped ({task.exception()!r}), restarting")
+        errors.inc(component="storage")
+        # Done callbacks run on the writer's loop
+        self._ensure_writer()
+
+    @staticmethod
+    def _record(data: dict):
+        return {
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "filename": data.get("filename", "unknown"),
+            "risk_score": data.get("risk_score", 0),
+            "summary": data.get("summary", ""),
+            "details": data.get("technical_details", {}),
+            "source": data.get("source", "unknown"),
+            "content_hash": data.get("sha256")
+        }
+
+    async def save_analysis(self, data: dict):
+        """Queues a result for persistence; returns the record id."""
+        record = self._record(data)
+        self._ensure_writer()
+        await self._queue.put(record)
+        self.counters["queued"] += 1
+        return record["id"]
+
+    async def _run_writer(self):
+        loop = asyncio.get_running_loop()
+        await self._replay_pending()
+        while True:
+            try:
+                batch = [await asyncio.wait_for(self._queue.get(), STORAGE_RETRY_INTERVAL)]
+            except asyncio.TimeoutError:
+                # Idle: the spool is retried on a timer, not only when a new record arrives
+                await self._replay_pending()
+                continue
+            deadline = loop.time() + STORAGE_FLUSH_INTERVAL
+            while len(batch) < STORAGE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write(batch)
             except Exception as e:
-                print(f"Supabase Connection Error: {e}")
+                # Couldn't even spool (disk full, ...): lose this batch, keep the writer
+                print(f"Storage Writer Error ({len(batch)} records dropped): {e}")
+                errors.inc(component="storage")
+                self.counters["dropped"] += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
 
-    def save_analysis(self, data: dict):
-        if not self.client:
-            print("Supabase client not initialized")
-            return None
-        
+    async def _replay_pending(self):
+        if not os.path.exists(self.spool_path) or time.monotonic() < self._down_until:
+            return
         try:
-            # Prepare data for insertion
-            record = {
-                "filename": data.get("filename", "unknown"),
-                "risk_score": data.get("risk_score", 0),
-                "summary": data.get("summary", ""),
-                "details": data.get("technical_details", {}),
-                "source": data.get("source", "unknown")
-            }
-            
-            response = self.client.table("analysis_results").insert(record).execute()
-            return response
+            if not self._backend_loaded:
+                await asyncio.to_thread(self.warm_up)
+            if self.backend is not None:
+                await asyncio.to_thread(self._replay_spool)
         except Exception as e:
-            print(f"Error saving to Supabase: {e}")
-            return None
+            print(f"Storage Replay Error: {e}")
+            errors.inc(component="storage")
+            self._down_until = time.monotonic() + STORAGE_RETRY_INTERVAL
+
+    async def _write(self, batch):
+        if not self._backend_loaded:
+            await asyncio.to_thread(self.warm_up)
+        if self.backend is not None and time.monotonic() >= self._down_until:
+            try:
+                if os.path.exists(self.spool_path):
+                    await asyncio.to_thread(self._replay_spool)
+                with span("storage_write"):
+                    await asyncio.to_thread(self.backend.insert_many, batch)
+                self.counters["written"] += len(batch)
+                return
+            except Exception as e:
+                print(f"Storage Write Error ({len(batch)} records spooled): {e}")
+                errors.inc(component="storage")
+                self.counters["failed_batches"] += 1
+                self._down_until = time.monotonic() + STORAGE_RETRY_INTERVAL
+        await asyncio.to_thread(self._spool, batch)
+
+    def _spool(self, records):
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        self.counters["spooled"] += len(records)
+
+    def _replay_spool(self):
+        # Claim the spool by renaming it, so records spooled meanwhile (by
+        # this or another worker) land in a fresh file instead of being lost
+        claimed = f"{self.spool_path}.{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(self.spool_path, claimed)
+        except FileNotFoundError:
+            return
+        with open(claimed, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        try:
+            for i in range(0, len(records), STORAGE_BATCH_SIZE):
+                self.backend.insert_many(records[i:i + STORAGE_BATCH_SIZE])
+        except Exception:
+            # Put everything back; ids make the already-written part a no-op later
+            self._spool(records)
+            self.counters["spooled"] -= len(records)
+            raise
+        finally:
+            os.remove(claimed)
+        self.counters["replayed"] += len(records)
+        print(f"Storage: replayed {len(records)} spooled records")
+
+    def query_analyses(self, filters: dict, cursor: str = None, limit: int = 50):
+        """
+        Newest-first page of stored results matching filters (since, until,
+        source, min_score, filename, content_hash). Pass next_cursor back to
+        get the following page; cost doesn't grow with page depth.
+        """
+        if self.backend is None:
+            return {"items": [], "next_cursor": None}
+        limit = max(1, min(limit, HISTORY_MAX_PAGE))
+        position = decode_cursor(cursor) if cursor else None
+        rows = self.backend.query(filters, position, limit + 1)
+        items = rows[:limit]
+        next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    async def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until everything queued so far has been written or spooled.
+        False if that didn't happen within timeout (STORAGE_FLUSH_TIMEOUT).
+        """
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return True
+        if self._queue.qsize():
+            self._ensure_writer()
+        try:
+            await asyncio.wait_for(self._queue.join(), STORAGE_FLUSH_TIMEOUT if timeout is None else timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"Storage: flush timed out with {self._queue.qsize()} records pending")
+            return False
+
+    async def close(self):
+        flushed = await self.flush()
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.cancel()
+        if not flushed and self._queue is not None:
+            # Whatever the writer didn't get to goes to the spool for next time
+            pending = []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+                self._queue.task_done()
+            if pending:
+                await asyncio.to_thread(self._spool, pending)
+
+    def status(self):
+        return {
+            # Not connected yet reads as None rather than connecting here
+            "backend": self._backend.name if self._backend else None,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "backend_down": time.monotonic() < self._down_until,
+            **self.counters
+        }
 
 storage_service = StorageService()
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import zlib
+import random
+import asyncio
+from collections import deque
+from app.services.system_service import get_system_metrics
+from app.services.capture_service import capture_engine
+
+# Events a subscriber may fall behind by before the oldest are dropped
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+
+GEO_LOCATIONS = ["US", "CN", "RU", "DE", "BR", "IN", "JP", "FR"]
+PROTOCOLS = ["TCP", "UDP", "HTTP", "DNS", "SSH", "FTP", "SMTP", "RDP"]
+FLAGS = ["SYN", "ACK", "FIN", "PSH", "RST", "URG", "ECE"]
+
+
+class StreamEvent:
+    """One published event, serialized once and shared by every subscriber."""
+    __slots__ = ("seq", "data", "text")
+
+    def __init__(self, seq: int, data: dict):
+        self.seq = seq
+        self.data = data
+        self.text = json.dumps(data, separators=(",", ":"))
+
+
+class Subscription:
+    def __init__(self, maxlen: int):
+        self.queue = deque(maxlen=maxlen)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, event: StreamEvent):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(event)
+        self._ready.set()
+
+    async def next_batch(self):
+        """Waits for events, then returns everything queued (oldest first)."""
+        while not self.queue:
+            self._ready.clear()
+            await self._ready.wait()
+        events = list(self.queue)
+        self.queue.clear()
+        return events
+
+
+class StreamHub:
+    """
+    One producer for /ws/stream. The producer samples system metrics once
+    per tick and publishes into every subscriber's bounded queue, so the
+    psutil calls and packet generation don't scale with connected clients.
+    A slow client only loses its own oldest events. With CAPTURE_SOURCE set
+    the events are per-second summaries of real traffic instead.
+    """
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self._producer = None
+        self._seq = 0
+        self._frame_cache = {}
+        self.published = 0
+        # Drops by clients that have since disconnected, so the total never goes down
+        self._dropped_gone = 0
+
+    def subscribe(self) -> Subscription:
+        sub = Subscription(self.queue_size)
+        self.subscribers.add(sub)
+        if self._producer is None or self._producer.done():
+            self._producer = asyncio.get_running_loop().create_task(self._produce())
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        if sub in self.subscribers:
+            self.subscribers.discard(sub)
+            self._dropped_gone += sub.dropped
+
+    def dropped_total(self) -> int:
+        return self._dropped_gone + sum(sub.dropped for sub in self.subscribers)
+
+    def publish(self, data: dict):
+        self._seq += 1
+        event = StreamEvent(self._seq, data)
+        for sub in self.subscribers:
+            sub.push(event)
+        self.published += 1
+        self._frame_cache.clear()
+
+    async def _produce(self):
+        # Runs while anyone is subscribed
+        if capture_engine.enabled:
+            await self._relay_capture()
+        while self.subscribers:
+            system = get_system_metrics()
+            # Occasionally send a "burst" of packets
+            burst = random.randint(1, 3) if random.random() > 0.8 else 1
+            for i in range(burst):
+                self.publish({"system": system, "packet": self._packet()})
+                if burst > 1 and i < burst - 1:
+                    await asyncio.sleep(0.1)
+            await asyncio.sleep(0.5 + random.random() * 0.5)
+
+    async def _relay_capture(self):
+        # Real traffic: one event per second from the capture engine. Falls
+        # through to simulated events if the capture can't run.
+        loop = asyncio.get_running_loop()
+        try:
+            capture_engine.start(lambda summary: loop.call_soon_threadsafe(self._publish_capture, summary))
+        except Exception as e:
+            print(f"Capture Error: {e}")
+            return
+        try:
+            while self.subscribers and capture_engine.running:
+                await asyncio.sleep(0.5)
+        finally:
+            await asyncio.to_thread(capture_engine.stop)
+
+    def _publish_capture(self, summary):
+        packet = None
+        if summary["packets"]:
+            # Heaviest talker of the second, in the packet shape the dashboard reads
+            services = summary["services"]
+            top = summary["top_talkers"][0] if summary["top_talkers"] else {"ip": None}
+            packet = {
+                "id": summary["second"] * 1000,
+                "type": max(services, key=services.get) if services else max(summary["protocols"], key=summary["protocols"].get),
+                "size": summary["bytes"] // summary["packets"],
+                "source": top["ip"],
+                "flag": "SYN" if summary["syn_rate"] else None,
+                "geo": None
+            }
+        self.publish({"system": get_system_metrics(), "packet": packet, "capture": summary})
+
+    @staticmethod
+    def _packet():
+        return {
+            "id": int(time.time() * 1000),
+            "type": random.choice(PROTOCOLS),
+            "size": random.randint(64, 4096),
+            "source": f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}",
+            "flag": random.choice(FLAGS) if random.random() > 0.3 else None,
+            "geo": random.choice(GEO_LOCATIONS)
+        }
+
+    def batch_frame(self, events, binary: bool):
+        """
+        One frame for a run of events: {"events": [...]} as text, or deflated
+        when binary. Subscribers that are caught up drain the same run, so the
+        frame is built once per tick and reused.
+        """
+        key = (events[0].seq, events[-1].seq, binary)
+        frame = self._frame_cache.get(key)
+        if frame is None:
+            text = '{"events":[' + ",".join(e.text for e in events) + "]}"
+            frame = zlib.compress(text.encode(), 6) if binary else text
+            self._frame_cache[key] = frame
+        return frame
+
+    def status(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": sum(sub.dropped for sub in self.subscribers)
+        }
+
+
+stream_hub = StreamHub()
@@ -1,22 +1,175 @@
+import os
 import psutil
 import time
 import random
+import threading
+import numpy as np
+from dotenv import load_dotenv
 
-def get_system_metrics():
+load_dotenv()
+
+# One sample per interval; the ring holds SAMPLER_HISTORY seconds (24h by default)
+SAMPLER_INTERVAL = float(os.getenv("SAMPLER_INTERVAL", "1"))
+SAMPLER_HISTORY = float(os.getenv("SAMPLER_HISTORY", "86400"))
+SAMPLER_MAX_INTERFACES = int(os.getenv("SAMPLER_MAX_INTERFACES", "8"))
+HISTORY_MAX_POINTS = 2000
+
+# Ring buffer columns; rates are bytes per second since the previous sample
+FIELDS = ("time", "cpu", "memory", "sent", "recv", "sent_rate", "recv_rate")
+
+
+def _read_metrics():
     cpu = psutil.cpu_percent(interval=None)
     mem = psutil.virtual_memory().percent
     try:
         net = psutil.net_io_counters()
-        sent = round(net.bytes_sent / 1024 / 1024, 2)
-        recv = round(net.bytes_recv / 1024 / 1024, 2)
+        sent, recv = net.bytes_sent, net.bytes_recv
     except:
         sent, recv = 0, 0
-    return {
-        "cpu": cpu,
-        "memory": mem,
-        "sent": sent,
-        "recv": recv
-    }
+    return cpu, mem, sent, recv
+
+
+class MetricsSampler:
+    """
+    Samples CPU, memory and network counters (total and per interface) on a
+    background thread into fixed-size NumPy ring buffers. Readers get the
+    latest sample or a downsampled history without touching psutil.
+    """
+
+    def __init__(self, interval: float = SAMPLER_INTERVAL, history: float = SAMPLER_HISTORY,
+                 max_interfaces: int = SAMPLER_MAX_INTERFACES):
+        self.interval = interval
+        self.capacity = max(2, int(history / interval))
+        self.data = np.zeros((self.capacity, len(FIELDS)), dtype=np.float64)
+        # [sample, interface slot, (sent_rate, recv_rate)]
+        self.if_rates = np.zeros((self.capacity, max_interfaces, 2), dtype=np.float32)
+        self.interfaces = {}
+        self.max_interfaces = max_interfaces
+        self.count = 0
+        self._latest = None
+        self._prev = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._sample()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        next_at = time.monotonic()
+        while True:
+            next_at += self.interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"Metrics Sampler Error: {e}")
+
+    def _sample(self):
+        now = time.time()
+        cpu, mem, sent, recv = _read_metrics()
+        try:
+            per_if = {name: (c.bytes_sent, c.bytes_recv) for name, c in psutil.net_io_counters(pernic=True).items()}
+        except:
+            per_if = {}
+
+        rates = np.zeros((self.max_interfaces, 2), dtype=np.float32)
+        sent_rate = recv_rate = 0.0
+        if self._prev is not None:
+            prev_time, prev_sent, prev_recv, prev_if = self._prev
+            elapsed = max(now - prev_time, 1e-6)
+            # Counters can reset (interface down/up); count that as no traffic
+            sent_rate = max(0, sent - prev_sent) / elapsed
+            recv_rate = max(0, recv - prev_recv) / elapsed
+            for name, (s, r) in per_if.items():
+                slot = self.interfaces.get(name)
+                if slot is None:
+                    if len(self.interfaces) >= self.max_interfaces:
+                        continue
+                    slot = self.interfaces[name] = len(self.interfaces)
+                if name in prev_if:
+                    ps, pr = prev_if[name]
+                    rates[slot] = (max(0, s - ps) / elapsed, max(0, r - pr) / elapsed)
+        self._prev = (now, sent, recv, per_if)
+
+        row = (now, cpu, mem, sent, recv, sent_rate, recv_rate)
+        i = self.count % self.capacity
+        self.data[i] = row
+        self.if_rates[i] = rates
+        self.count += 1
+        self._latest = {
+            "cpu": cpu,
+            "memory": mem,
+            "sent": round(sent / 1024 / 1024, 2),
+            "recv": round(recv / 1024 / 1024, 2)
+        }
+
+    def latest(self):
+        """Most recent sample in the get_system_metrics() shape."""
+        if self._latest is None:
+            self.start()
+        return self._latest
+
+    def _window(self, seconds: float):
+        """Samples from the last `seconds`, oldest first (copies)."""
+        count = self.count
+        n = min(count, self.capacity, max(1, int(seconds / self.interval)))
+        idx = (np.arange(count - n, count) % self.capacity)
+        return self.data[idx], self.if_rates[idx]
+
+    def history(self, seconds: float = 3600, points: int = 300):
+        """
+        The last `seconds` of samples reduced to at most `points` buckets,
+        each with min/max/avg per metric (counters report the last value).
+        """
+        if self._latest is None:
+            self.start()
+        points = max(1, min(points, HISTORY_MAX_POINTS))
+        rows, if_rates = self._window(seconds)
+        if len(rows) == 0:
+            return {"interval": self.interval, "resolution": self.interval, "points": 0, "series": {}, "interfaces": {}}
+
+        bucket = max(1, -(-len(rows) // points))
+        starts = np.arange(0, len(rows), bucket)
+        ends = np.minimum(starts + bucket, len(rows)) - 1
+
+        def reduce(values):
+            return {
+                "min": np.round(np.minimum.reduceat(values, starts), 2).tolist(),
+                "max": np.round(np.maximum.reduceat(values, starts), 2).tolist(),
+                "avg": np.round(np.add.reduceat(values, starts) / (ends - starts + 1), 2).tolist()
+            }
+
+        col = {name: i for i, name in enumerate(FIELDS)}
+        series = {"time": np.round(rows[starts, col["time"]], 3).tolist()}
+        for name in ("cpu", "memory", "sent_rate", "recv_rate"):
+            series[name] = reduce(rows[:, col[name]])
+        for name in ("sent", "recv"):
+            series[name] = np.round(rows[ends, col[name]] / 1024 / 1024, 2).tolist()
+
+        interfaces = {}
+        for name, slot in self.interfaces.items():
+            interfaces[name] = {
+                "sent_rate": reduce(if_rates[:, slot, 0].astype(np.float64)),
+                "recv_rate": reduce(if_rates[:, slot, 1].astype(np.float64))
+            }
+        return {
+            "interval": self.interval,
+            "resolution": round(bucket * self.interval, 3),
+            "points": len(starts),
+            "series": series,
+            "interfaces": interfaces
+        }
+
+
+metrics_sampler = MetricsSampler()
+
+
+def get_system_metrics():
+    return metrics_sampler.latest()
 
 def get_network_interfaces():
     networks = []
@@ -0,0 +1,542 @@
+import os
+import io
+import mmap
+import time
+import struct
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Entropy is measured on ENTROPY_WINDOW-byte windows: every window of small
+# files, an evenly spaced sample of TRIAGE_SAMPLE_WINDOWS of large ones, so
+# cost stays flat whatever the file size
+ENTROPY_WINDOW = 4096
+TRIAGE_SAMPLE_WINDOWS = int(os.getenv("TRIAGE_SAMPLE_WINDOWS", "1024"))
+SECTION_SAMPLE_WINDOWS = 16
+HIGH_ENTROPY = 7.2
+# Files at least this big are memory-mapped instead of read
+MMAP_MIN_BYTES = 1024 * 1024
+# Caps against malformed or hostile headers
+MAX_SECTIONS = 96
+MAX_LIBRARIES = 256
+MAX_IMPORTS = 4096
+# Symbol/thunk entries read, named or not, so a table of ordinals or
+# unnamed symbols can't keep the parser walking
+MAX_SYMBOLS = MAX_IMPORTS * 4
+MAX_LOAD_COMMANDS = 512
+# Document markers are searched for in this much of the file
+MARKER_SCAN_BYTES = 16 * 1024 * 1024
+
+PACKER_SECTIONS = {
+    b"UPX0": "UPX", b"UPX1": "UPX", b"UPX2": "UPX", b".aspack": "ASPack", b".adata": "ASPack",
+    b".petite": "Petite", b".nsp0": "NsPack", b".nsp1": "NsPack", b"MPRESS1": "MPRESS", b"MPRESS2": "MPRESS",
+    b".themida": "Themida", b".winlice": "WinLicense", b".vmp0": "VMProtect", b".vmp1": "VMProtect",
+    b".enigma1": "Enigma", b".perplex": "Perplex", b"pebundle": "PEBundle", b".yP": "Y0da", b".MPress": "MPRESS",
+}
+
+# (id, name, score, imports that must all be present, only for programs
+# with at most this many imports). The syscall combinations are what a
+# small implant is made of, but every language runtime imports them too.
+# (IsDebuggerPresent isn't here: the MSVC runtime imports it everywhere.)
+IMPORT_RULES = (
+    ("process-injection", "Process Injection APIs", 70, {"VirtualAllocEx", "WriteProcessMemory", "CreateRemoteThread"}, None),
+    ("process-hollowing", "Process Hollowing APIs", 70, {"NtUnmapViewOfSection", "WriteProcessMemory"}, None),
+    ("keylogger", "Keylogging APIs", 55, {"SetWindowsHookExA", "GetAsyncKeyState"}, None),
+    ("keylogger", "Keylogging APIs", 55, {"SetWindowsHookExW", "GetAsyncKeyState"}, None),
+    ("downloader", "Download-and-Execute APIs", 55, {"URLDownloadToFileA", "WinExec"}, None),
+    ("downloader", "Download-and-Execute APIs", 55, {"URLDownloadToFileW", "ShellExecuteW"}, None),
+    ("anti-debug", "Anti-Debugging Checks", 20, {"CheckRemoteDebuggerPresent"}, None),
+    ("reverse-shell", "Reverse Shell Syscalls", 60, {"socket", "connect", "dup2", "execve"}, 80),
+    ("fileless-exec", "Fileless Execution (memfd)", 55, {"memfd_create", "fexecve"}, 80),
+    ("anti-debug", "Anti-Debugging Checks", 20, {"ptrace"}, 80),
+)
+
+PE_MACHINES = {0x14c: "x86", 0x8664: "x86-64", 0xaa64: "arm64", 0x1c0: "arm", 0x1c4: "arm"}
+ELF_MACHINES = {3: "x86", 62: "x86-64", 40: "arm", 183: "arm64", 8: "mips", 243: "riscv", 20: "ppc", 21: "ppc64"}
+MACHO_CPUS = {7: "x86", 0x01000007: "x86-64", 12: "arm", 0x0100000C: "arm64"}
+
+# Magic bytes for formats that are only named, not parsed
+MAGICS = (
+    (b"%PDF-", "PDF"), (b"PK\x03\x04", "ZIP"), (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "OLE2"),
+    (b"\x1f\x8b", "GZIP"), (b"7z\xbc\xaf\x27\x1c", "7-Zip"), (b"Rar!\x1a\x07", "RAR"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"), (b"\xff\xd8\xff", "JPEG"), (b"GIF8", "GIF"),
+    (b"\x00asm", "WebAssembly"), (b"dex\n", "Android DEX"), (b"MSCF", "Cabinet"),
+    (b"\xfd7zXZ\x00", "XZ"), (b"BZh", "BZIP2"), (b"\x28\xb5\x2f\xfd", "Zstandard"),
+)
+
+
+class TriageError(Exception):
+    pass
+
+
+def _entropy(counts):
+    """Shannon entropy (bits/byte) of each row of a 256-bin histogram."""
+    counts = np.atleast_2d(counts).astype(np.float64)
+    totals = counts.sum(axis=1, keepdims=True)
+    p = counts / np.where(totals == 0, 1, totals)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return -np.nansum(np.where(p > 0, p * np.log2(p), 0), axis=1)
+
+
+def _unpack(fmt, buf, offset):
+    """struct.unpack_from for header fields, which may point anywhere."""
+    # Negative offsets would silently read from the end, 64-bit ones overflow
+    if offset < 0 or offset + struct.calcsize(fmt) > len(buf):
+        raise TriageError(f"Header field at {offset:#x} is outside the file")
+    return struct.unpack_from(fmt, buf, offset)
+
+
+def _cstring(buf, offset, limit=256):
+    if offset < 0 or offset >= len(buf):
+        return ""
+    return bytes(buf[offset:offset + limit]).split(b"\0", 1)[0].decode("latin-1")
+
+
+class Binary:
+    """A file's bytes (mmap or bytes) plus lazily computed entropy views."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.size = len(buf)
+        self.array = np.frombuffer(buf, dtype=np.uint8)
+        self._windows = None
+
+    def range_histogram(self, start, end, windows=SECTION_SAMPLE_WINDOWS):
+        """Byte histogram of [start, end): exact when small, sampled otherwise."""
+        start, end = max(0, start), min(self.size, end)
+        if end <= start:
+            return np.zeros(256, dtype=np.int64)
+        if end - start <= windows * ENTROPY_WINDOW:
+            return np.bincount(self.array[start:end], minlength=256)
+        offsets = np.linspace(start, end - ENTROPY_WINDOW, windows).astype(np.int64)
+        return sum(np.bincount(self.array[o:o + ENTROPY_WINDOW], minlength=256) for o in offsets)
+
+    def windows(self):
+        """(offsets, per-window histograms): the sliding-window entropy sample."""
+        if self._windows is None:
+            count = -(-self.size // ENTROPY_WINDOW)
+            if count <= TRIAGE_SAMPLE_WINDOWS:
+                offsets = np.arange(count, dtype=np.int64) * ENTROPY_WINDOW
+            else:
+                offsets = np.linspace(0, self.size - ENTROPY_WINDOW, TRIAGE_SAMPLE_WINDOWS).astype(np.int64)
+            counts = np.empty((len(offsets), 256), dtype=np.int64)
+            for i, o in enumerate(offsets):
+                counts[i] = np.bincount(self.array[o:o + ENTROPY_WINDOW], minlength=256)
+            self._windows = (offsets, counts)
+        return self._windows
+
+    def release(self):
+        # numpy views keep the mmap's buffer exported; drop them before close
+        self.array = None
+        self._windows = None
+
+
+class TriageService:
+    """
+    Local structural triage for binary uploads: magic-byte sniffing,
+    sampled byte-histogram and window entropy, and PE/ELF/Mach-O header
+    parsing (sections, imports, packer and loader anomalies) straight off
+    a memory map. Only the headers and the sampled windows are read, so a
+    100 MB binary costs about what a 4 MB one does.
+    """
+
+    def analyze(self, file_obj, size=None):
+        """Triage verdict in the usual risk_score/summary/threats/technical_details shape."""
+        started = time.perf_counter()
+        buf, mapped = self._open(file_obj, size)
+        binary = Binary(buf)
+        try:
+            report = self._triage(binary)
+        finally:
+            binary.release()
+            if mapped:
+                try:
+                    buf.close()
+                except BufferError:
+                    pass  # a view is still alive; the map goes when it does
+            file_obj.seek(0)
+        report["triage_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return self._verdict(report)
+
+    def _open(self, file_obj, size):
+        if size is None or size >= MMAP_MIN_BYTES:
+            try:
+                return mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ), True
+            except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+                pass
+        file_obj.seek(0)
+        return file_obj.read(), False
+
+    def _triage(self, binary):
+        report = {"format": "Unknown", "size": binary.size, "indicators": []}
+        if binary.size == 0:
+            report["entropy"] = {"overall": 0.0, "max_window": 0.0, "high_entropy_share": 0.0}
+            return report
+
+        parser = self._parser(binary.buf)
+        if parser is not None:
+            try:
+                parser(binary, report)
+            except (struct.error, TriageError, IndexError, ValueError, OverflowError) as e:
+                # Truncated or corrupt headers are themselves worth flagging
+                self._indicator(report, "malformed-headers", "Malformed Executable Headers", 35, str(e))
+        else:
+            report["format"] = self._sniff(binary.buf)
+            self._document_markers(binary, report)
+
+        offsets, counts = binary.windows()
+        window_entropy = _entropy(counts)
+        overall = float(_entropy(counts.sum(axis=0))[0])
+        report["entropy"] = {
+            "overall": round(overall, 3),
+            "max_window": round(float(window_entropy.max()), 3),
+            "high_entropy_share": round(float((window_entropy > HIGH_ENTROPY).mean()), 3),
+            "sampled_windows": len(offsets)
+        }
+        if report["format"] in ("Unknown", "Data") and overall > 7.5:
+            self._indicator(report, "encrypted-blob", "Encrypted or Compressed Payload", 25,
+                            f"Unrecognised format with {overall:.2f} bits/byte entropy")
+        return report
+
+    def _parser(self, buf):
+        head = bytes(buf[:8])
+        if head[:2] == b"MZ":
+            return self._parse_pe
+        if head[:4] == b"\x7fELF":
+            return self._parse_elf
+        if head[:4] in (b"\xce\xfa\xed\xfe", b"\xcf\xfa\xed\xfe", b"\xfe\xed\xfa\xce", b"\xfe\xed\xfa\xcf"):
+            return self._parse_macho
+        # Java class files share the fat Mach-O magic; their version field is large
+        if head[:4] == b"\xca\xfe\xba\xbe" and 0 < struct.unpack(">I", head[4:8])[0] < 30:
+            return self._parse_fat_macho
+        return None
+
+    def _sniff(self, buf):
+        head = bytes(buf[:16])
+        for magic, name in MAGICS:
+            if head.startswith(magic):
+                return name
+        if head[:4] == b"\xca\xfe\xba\xbe":
+            return "Java Class"
+        return "Data"
+
+    # --- PE
+
+    def _parse_pe(self, binary, report):
+        buf = binary.buf
+        (e_lfanew,) = _unpack("<I", buf, 0x3C)
+        if bytes(buf[e_lfanew:e_lfanew + 4]) != b"PE\0\0":
+            report["format"] = "MS-DOS"
+            return
+        machine, nsections, timestamp, _, _, opt_size, characteristics = _unpack("<HHIIIHH", buf, e_lfanew + 4)
+        opt = e_lfanew + 24
+        (magic,) = _unpack("<H", buf, opt)
+        pe64 = magic == 0x20B
+        if magic not in (0x10B, 0x20B):
+            raise TriageError(f"Unknown optional header magic {magic:#x}")
+        (entry,) = _unpack("<I", buf, opt + 16)
+        subsystem, dll_characteristics = _unpack("<HH", buf, opt + 68)
+        (rva_count,) = _unpack("<I", buf, opt + (108 if pe64 else 92))
+        directories = [_unpack("<II", buf, opt + (112 if pe64 else 96) + 8 * i) for i in range(min(rva_count, 16))]
+
+        report["format"] = ("PE32+" if pe64 else "PE32") + (" DLL" if characteristics & 0x2000 else " executable")
+        report["arch"] = PE_MACHINES.get(machine, hex(machine))
+        report["entry_point"] = entry
+        report["compile_time"] = timestamp
+        report["signed"] = len(directories) > 4 and directories[4][1] > 0
+        report["dotnet"] = len(directories) > 14 and directories[14][1] > 0
+
+        sections = []
+        table = opt + opt_size
+        for i in range(min(nsections, MAX_SECTIONS)):
+            name, vsize, va, raw_size, raw_ptr, _, _, _, _, flags = _unpack("<8sIIIIIIHHI", buf, table + 40 * i)
+            sections.append({
+                "name": name.rstrip(b"\0").decode("latin-1"), "raw": name.rstrip(b"\0"),
+                "virtual_address": va, "virtual_size": vsize, "offset": raw_ptr, "raw_size": raw_size,
+                "executable": bool(flags & 0x20000000) or bool(flags & 0x20), "writable": bool(flags & 0x80000000)
+            })
+        self._section_checks(binary, report, sections)
+
+        entry_section = next((s for s in sections if s["virtual_address"] <= entry < s["virtual_address"] + max(s["virtual_size"], s["raw_size"])), None)
+        if entry and entry_section is None:
+            self._indicator(report, "entry-outside-sections", "Entry Point Outside Sections", 45, f"Entry RVA {entry:#x}")
+        elif entry_section is not None and entry_section["writable"]:
+            self._indicator(report, "writable-entry", "Entry Point in Writable Section", 45, entry_section["name"])
+        if any(s["raw_size"] == 0 and s["virtual_size"] > 64 * 1024 and s["executable"] for s in sections):
+            self._indicator(report, "unpacking-stub", "Empty Executable Section (Unpacks at Runtime)", 40,
+                            ", ".join(s["name"] for s in sections if s["raw_size"] == 0 and s["executable"]))
+
+        # Overlay: data appended after the last section (droppers, SFX payloads)
+        end = max((s["offset"] + s["raw_size"] for s in sections if s["raw_size"]), default=binary.size)
+        if report["signed"] and len(directories) > 4:
+            # The Authenticode blob lives there legitimately
+            end = max(end, directories[4][0] + directories[4][1])
+        if binary.size - end > 4096:
+            overlay = float(_entropy(binary.range_histogram(end, binary.size))[0])
+            report["overlay"] = {"offset": end, "size": binary.size - end, "entropy": round(overlay, 3)}
+            if overlay > HIGH_ENTROPY:
+                self._indicator(report, "packed-overlay", "High-Entropy Overlay", 30,
+                                f"{binary.size - end} bytes at {end:#x}, {overlay:.2f} bits/byte")
+
+        libraries, functions = ([], [])
+        if len(directories) > 1 and directories[1][0]:
+            libraries, functions = self._pe_imports(buf, directories[1][0], sections, pe64)
+        self._import_checks(report, libraries, functions, windows=not report["dotnet"])
+
+    def _pe_imports(self, buf, rva, sections, pe64):
+        def offset(rva):
+            for s in sections:
+                if s["virtual_address"] <= rva < s["virtual_address"] + max(s["virtual_size"], s["raw_size"]):
+                    return rva - s["virtual_address"] + s["offset"]
+            return rva  # inside the headers
+
+        libraries, functions = [], []
+        thunk_size, ordinal_flag = (8, 1 << 63) if pe64 else (4, 1 << 31)
+        descriptor = offset(rva)
+        visited = 0
+        for _ in range(MAX_LIBRARIES):
+            original, _, _, name_rva, first = _unpack("<IIIII", buf, descriptor)
+            if not (original or name_rva or first):
+                break
+            libraries.append(_cstring(buf, offset(name_rva)))
+            thunk = offset(original or first)
+            while len(functions) < MAX_IMPORTS and visited < MAX_SYMBOLS:
+                visited += 1
+                (value,) = _unpack("<Q" if pe64 else "<I", buf, thunk)
+                if not value:
+                    break
+                if not value & ordinal_flag:
+                    functions.append(_cstring(buf, offset(value & 0x7FFFFFFF) + 2))
+                thunk += thunk_size
+            descriptor += 20
+        return libraries, functions
+
+    # --- ELF
+
+    def _parse_elf(self, binary, report):
+        buf = binary.buf
+        elf64, little = buf[4] == 2, buf[5] == 1
+        e = "<" if little else ">"
+        fields = _unpack(e + ("HHIQQQIHHHHHH" if elf64 else "HHIIIIIHHHHHH"), buf, 16)
+        e_type, machine, _, entry, phoff, shoff, _, _, phentsize, phnum, shentsize, shnum, shstrndx = fields
+        report["format"] = "ELF" + ("64 " if elf64 else "32 ") + {1: "relocatable", 2: "executable", 3: "shared object", 4: "core"}.get(e_type, "file")
+        report["arch"] = ELF_MACHINES.get(machine, str(machine))
+        report["entry_point"] = entry
+
+        segments = []
+        for i in range(min(phnum, MAX_SECTIONS)):
+            if elf64:
+                p_type, p_flags, p_offset, _, _, p_filesz, _, _ = _unpack(e + "IIQQQQQQ", buf, phoff + i * phentsize)
+            else:
+                p_type, p_offset, _, _, p_filesz, _, p_flags, _ = _unpack(e + "IIIIIIII", buf, phoff + i * phentsize)
+            segments.append((p_type, p_flags, p_offset, p_filesz))
+        if any(t == 1 and f & 1 and f & 2 for t, f, _, _ in segments):
+            self._indicator(report, "wx-segment", "Writable and Executable Segment", 40, "PT_LOAD with RWX")
+        report["dynamic"] = any(t == 3 for t, _, _, _ in segments)  # PT_INTERP
+
+        if bytes(buf[:8192]).find(b"UPX!") >= 0:
+            self._indicator(report, "packer", "Packed Executable (UPX)", 50, "UPX! marker in the header area")
+
+        sections, raw_sections = [], []
+        if shnum and shoff:
+            for i in range(min(shnum, MAX_SECTIONS)):
+                fmt = e + ("IIQQQQIIQQ" if elf64 else "IIIIIIIIII")
+                raw_sections.append(_unpack(fmt, buf, shoff + i * shentsize))
+            names_offset = raw_sections[shstrndx][4] if shstrndx < len(raw_sections) else 0
+            for name, s_type, flags, _, offset, size, link, _, _, entsize in raw_sections:
+                sections.append({
+                    "name": _cstring(buf, names_offset + name) if names_offset else "", "type": s_type,
+                    "offset": offset, "raw_size": size if s_type != 8 else 0, "link": link, "entsize": entsize,
+                    "executable": bool(flags & 0x4), "writable": bool(flags & 0x1)
+                })
+        elif e_type in (2, 3):
+            self._indicator(report, "no-section-headers", "Section Headers Stripped", 35,
+                            "Common after packing or deliberate header stripping")
+        report["stripped"] = bool(sections) and not any(s["type"] == 2 for s in sections)  # SHT_SYMTAB
+        self._section_checks(binary, report, [s for s in sections if s["type"] != 0])
+
+        libraries, functions = [], []
+        for s in sections:
+            if s["type"] == 11 and s["link"] < len(sections):  # SHT_DYNSYM
+                strings = sections[s["link"]]["offset"]
+                step = s["entsize"] or (24 if elf64 else 16)
+                end = min(s["offset"] + s["raw_size"], s["offset"] + step * (MAX_SYMBOLS + 1))
+                for off in range(s["offset"] + step, end, step):
+                    if elf64:
+                        name, _, _, shndx, _, _ = _unpack(e + "IBBHQQ", buf, off)
+                    else:
+                        name, _, _, _, _, shndx = _unpack(e + "IIIBBH", buf, off)
+                    if shndx == 0 and name:
+                        functions.append(_cstring(buf, strings + name))
+                    if len(functions) >= MAX_IMPORTS:
+                        break
+            elif s["type"] == 6 and s["link"] < len(sections):  # SHT_DYNAMIC: DT_NEEDED entries
+                strings = sections[s["link"]]["offset"]
+                step = 16 if elf64 else 8
+                for off in range(s["offset"], s["offset"] + s["raw_size"], step):
+                    tag, value = _unpack(e + ("qQ" if elf64 else "iI"), buf, off)
+                    if tag == 0 or len(libraries) >= MAX_LIBRARIES:
+                        break
+                    if tag == 1:
+                        libraries.append(_cstring(buf, strings + value))
+        self._import_checks(report, libraries, [f.split("@")[0] for f in functions], windows=False)
+
+    # --- Mach-O
+
+    def _parse_fat_macho(self, binary, report):
+        buf = binary.buf
+        (count,) = _unpack(">I", buf, 4)
+        archs = [_unpack(">IIIII", buf, 8 + 20 * i) for i in range(count)]
+        report["architectures"] = [MACHO_CPUS.get(cpu, hex(cpu)) for cpu, _, _, _, _ in archs]
+        # Triage the first slice; the rest are usually the same code for another CPU
+        self._parse_macho(binary, report, archs[0][2])
+        report["format"] = "Mach-O universal (" + ", ".join(report["architectures"]) + ")"
+
+    def _parse_macho(self, binary, report, base=0):
+        buf = binary.buf
+        magic = bytes(buf[base:base + 4])
+        e = "<" if magic[0] in (0xCE, 0xCF) else ">"
+        macho64 = magic in (b"\xcf\xfa\xed\xfe", b"\xfe\xed\xfa\xcf")
+        _, cpu, _, filetype, ncmds, _, _ = _unpack(e + "IiiIIII", buf, base)
+        report["format"] = "Mach-O" + (" 64-bit " if macho64 else " ") + {1: "object", 2: "executable", 6: "dylib", 8: "bundle"}.get(filetype, "file")
+        report["arch"] = MACHO_CPUS.get(cpu & 0xFFFFFFFF, hex(cpu & 0xFFFFFFFF))
+
+        sections, libraries, functions = [], [], []
+        signed = False
+        symtab = None
+        cmd_offset = base + (32 if macho64 else 28)
+        for _ in range(min(ncmds, MAX_LOAD_COMMANDS)):
+            cmd, size = _unpack(e + "II", buf, cmd_offset)
+            if size < 8:
+                raise TriageError("Load command smaller than its header")
+            if cmd in (0x1, 0x19):  # LC_SEGMENT(_64)
+                if macho64:
+                    segname, _, _, _, _, _, initprot, nsects, _ = _unpack(e + "16sQQQQiiII", buf, cmd_offset + 8)
+                    sect, sect_fmt, sect_size = cmd_offset + 72, e + "16s16sQQI", 80
+                else:
+                    segname, _, _, _, _, _, initprot, nsects, _ = _unpack(e + "16sIIIIiiII", buf, cmd_offset + 8)
+                    sect, sect_fmt, sect_size = cmd_offset + 56, e + "16s16sIII", 68
+                if initprot & 2 and initprot & 4:
+                    self._indicator(report, "wx-segment", "Writable and Executable Segment", 40, segname.rstrip(b"\0").decode("latin-1"))
+                for i in range(min(nsects, MAX_SECTIONS - len(sections))):
+                    sectname, seg, _, sect_bytes, offset = _unpack(sect_fmt, buf, sect + i * sect_size)
+                    sections.append({
+                        "name": seg.rstrip(b"\0").decode("latin-1") + "," + sectname.rstrip(b"\0").decode("latin-1"),
+                        "offset": base + offset if offset else 0, "raw_size": sect_bytes if offset else 0,
+                        "executable": bool(initprot & 4), "writable": bool(initprot & 2)
+                    })
+            elif cmd in (0xC, 0x80000018, 0x8000001F):  # LC_LOAD_DYLIB, weak, re-export
+                (name_offset,) = _unpack(e + "I", buf, cmd_offset + 8)
+                if len(libraries) < MAX_LIBRARIES:
+                    libraries.append(_cstring(buf, cmd_offset + name_offset))
+            elif cmd == 0x1D:  # LC_CODE_SIGNATURE
+                signed = True
+            elif cmd == 0x2:  # LC_SYMTAB
+                symtab = _unpack(e + "IIII", buf, cmd_offset + 8)
+            elif cmd in (0x21, 0x2C):  # LC_ENCRYPTION_INFO(_64)
+                report["encrypted"] = _unpack(e + "I", buf, cmd_offset + 16)[0] != 0
+            cmd_offset += size
+
+        if symtab:
+            symoff, nsyms, stroff, _ = symtab
+            entry_size = 16 if macho64 else 12
+            for i in range(min(nsyms, MAX_SYMBOLS)):
+                strx, n_type = _unpack(e + "IB", buf, base + symoff + i * entry_size)
+                if n_type & 0x0E == 0 and n_type & 0x01 and strx:  # undefined external
+                    functions.append(_cstring(buf, base + stroff + strx).lstrip("_"))
+                    if len(functions) >= MAX_IMPORTS:
+                        break
+        report["signed"] = signed
+        if not signed and filetype == 2:
+            self._indicator(report, "unsigned", "Unsigned Mach-O Executable", 15, "No LC_CODE_SIGNATURE")
+        self._section_checks(binary, report, sections)
+        self._import_checks(report, libraries, functions, windows=False)
+
+    # --- shared checks
+
+    def _section_checks(self, binary, report, sections):
+        for s in sections:
+            if s.get("raw_size"):
+                s["entropy"] = round(float(_entropy(binary.range_histogram(s["offset"], s["offset"] + s["raw_size"]))[0]), 3)
+        packers = sorted({PACKER_SECTIONS[s["raw"]] for s in sections if s.get("raw") in PACKER_SECTIONS})
+        if packers:
+            self._indicator(report, "packer", f"Packed Executable ({', '.join(packers)})", 50,
+                            "Section names: " + ", ".join(s["name"] for s in sections if s.get("raw") in PACKER_SECTIONS))
+        packed_code = [s["name"] for s in sections if s["executable"] and s.get("entropy", 0) > HIGH_ENTROPY]
+        if packed_code:
+            self._indicator(report, "high-entropy-code", "Compressed or Encrypted Code", 45, ", ".join(packed_code))
+        wx = [s["name"] for s in sections if s["executable"] and s["writable"]]
+        if wx:
+            self._indicator(report, "wx-section", "Writable and Executable Section", 40, ", ".join(wx))
+        report["sections"] = [{k: v for k, v in s.items() if k in ("name", "offset", "raw_size", "entropy", "executable", "writable")}
+                              for s in sections]
+
+    def _import_checks(self, report, libraries, functions, windows):
+        names = set(functions)
+        suspicious = set()
+        for rule_id, name, score, required, max_imports in IMPORT_RULES:
+            if required <= names and (max_imports is None or len(names) <= max_imports):
+                suspicious |= required
+                self._indicator(report, rule_id, name, score, ", ".join(sorted(required)))
+        if windows:
+            if not functions:
+                self._indicator(report, "no-imports", "No Import Table", 30, "Imports resolved at runtime or stripped")
+            elif len(functions) <= 8 and {"LoadLibraryA", "GetProcAddress"} & names:
+                self._indicator(report, "dynamic-imports", "Minimal Imports with Runtime Resolution", 40,
+                                f"{len(functions)} imports incl. LoadLibrary/GetProcAddress")
+        report["imports"] = {
+            "libraries": libraries[:64],
+            "count": len(functions),
+            "suspicious": sorted(suspicious)
+        }
+
+    def _document_markers(self, binary, report):
+        fmt = report["format"]
+        head = bytes(binary.buf[:MARKER_SCAN_BYTES])
+        if fmt == "OLE2" and "_VBA_PROJECT".encode("utf-16-le") in head:
+            self._indicator(report, "office-macros", "Office Document with VBA Macros", 50, "_VBA_PROJECT stream")
+        elif fmt == "ZIP":
+            tail = bytes(binary.buf[max(0, binary.size - 1024 * 1024):])
+            if b"vbaProject.bin" in tail:
+                self._indicator(report, "office-macros", "Office Document with VBA Macros", 50, "vbaProject.bin")
+            if b"classes.dex" in tail and b"AndroidManifest.xml" in tail:
+                report["format"] = "Android APK"
+            elif b"META-INF/MANIFEST.MF" in tail:
+                report["format"] = "Java Archive"
+        elif fmt == "PDF":
+            keys = {key: head.count(key) for key in (b"/JavaScript", b"/JS", b"/OpenAction", b"/Launch", b"/EmbeddedFile")}
+            if keys[b"/Launch"]:
+                self._indicator(report, "pdf-launch", "PDF Launch Action", 60, "/Launch")
+            if keys[b"/JavaScript"] or keys[b"/JS"]:
+                auto = keys[b"/OpenAction"] > 0
+                self._indicator(report, "pdf-javascript", "PDF with JavaScript" + (" on Open" if auto else ""),
+                                55 if auto else 40, "/JavaScript" + (" + /OpenAction" if auto else ""))
+            if keys[b"/EmbeddedFile"]:
+                self._indicator(report, "pdf-embedded-file", "PDF with Embedded File", 25, "/EmbeddedFile")
+
+    @staticmethod
+    def _indicator(report, rule_id, name, score, detail):
+        if not any(i["id"] == rule_id for i in report["indicators"]):
+            report["indicators"].append({"id": rule_id, "name": name, "score": score, "detail": detail})
+
+    @staticmethod
+    def _verdict(report):
+        indicators = sorted(report["indicators"], key=lambda i: i["score"], reverse=True)
+        report["indicators"] = indicators
+        # Same combination as the signature engine: strongest sets the score
+        risk_score = min(100, indicators[0]["score"] + 5 * (len(indicators) - 1)) if indicators else 0
+        described = report["format"] + (f" ({report['arch']})" if report.get("arch") else "")
+        if indicators:
+            summary = f"{described}: {len(indicators)} structural indicator(s): {', '.join(i['name'] for i in indicators)}."
+        else:
+            summary = f"{described}: no structural indicators found."
+        return {
+            "risk_score": risk_score,
+            "summary": summary,
+            "threats": [i["name"] for i in indicators],
+            "technical_details": report
+        }
+
+
+triage_service = TriageService()
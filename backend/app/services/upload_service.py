@@ -0,0 +1,133 @@
+import os
+import codecs
+import hashlib
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "512")) * 1024 * 1024
+# Leading bytes used to decide text vs binary and to build the text excerpt
+UPLOAD_SNIFF_BYTES = int(os.getenv("UPLOAD_SNIFF_BYTES", str(64 * 1024)))
+# Whole multipart request to /batch/files, all files together
+UPLOAD_BATCH_MAX_BYTES = int(os.getenv("UPLOAD_BATCH_MAX_MB", "2048")) * 1024 * 1024
+# Room for the multipart boundaries and part headers around a single file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class SpooledUpload:
+    """
+    An uploaded file that stays in its spool (Starlette keeps bodies over
+    1 MB on disk) and is described by values computed in one pass over it.
+    """
+
+    def __init__(self, file, filename, content_type, size, sha256, text):
+        self.file = file
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+        # Decoded start of the file, or None if it doesn't look like UTF-8 text
+        self.text = text
+
+    @property
+    def is_text(self) -> bool:
+        return self.text is not None
+
+    def open(self):
+        """Rewinds the spool for a consumer that streams it (e.g. the VT upload)."""
+        self.file.seek(0)
+        return self.file
+
+
+class UploadService:
+    def __init__(self, max_bytes: int = UPLOAD_MAX_BYTES, sniff_bytes: int = UPLOAD_SNIFF_BYTES):
+        self.max_bytes = max_bytes
+        self.sniff_bytes = sniff_bytes
+
+    async def ingest(self, upload) -> SpooledUpload:
+        """Hashes and sniffs an UploadFile chunk by chunk; 413 past the size limit."""
+        if upload.size is not None and upload.size > self.max_bytes:
+            raise self._too_large()
+        return await run_in_threadpool(self._scan, upload)
+
+    def _scan(self, upload) -> SpooledUpload:
+        f = upload.file
+        f.seek(0)
+        digest = hashlib.sha256()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        size = 0
+        text = ""
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise self._too_large()
+            digest.update(chunk)
+
+            # Only the sniff window is decoded; a multi-byte character cut by
+            # the window edge stays in the decoder and isn't an error
+            room = self.sniff_bytes - (size - len(chunk))
+            if room > 0 and text is not None:
+                try:
+                    text += decoder.decode(chunk[:room])
+                except UnicodeDecodeError:
+                    text = None
+
+        if text is not None and size <= self.sniff_bytes:
+            # Whole file was in the window, so a dangling partial character is an error
+            try:
+                text += decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                text = None
+
+        f.seek(0)
+        return SpooledUpload(f, upload.filename, upload.content_type, size, digest.hexdigest(), text)
+
+    def _too_large(self):
+        return HTTPException(status_code=413, detail=f"File exceeds {self.max_bytes // (1024 * 1024)} MB upload limit")
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware capping request bodies on upload routes before
+    Starlette spools them: a Content-Length over the limit is refused
+    without reading the body, and bodies without one (chunked) are counted
+    as they arrive and cut off once past it.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits  # path -> max body bytes
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        detail = f"Upload exceeds {limit // (1024 * 1024)} MB request limit"
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing; FastAPI passes HTTPException through
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+upload_service = UploadService()
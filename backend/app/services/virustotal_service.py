@@ -1,115 +1,450 @@
 import os
+import uuid
+import shutil
 import hashlib
 import base64
-import time
-import virustotal_python
-from virustotal_python import VirustotalError
+import heapq
+import random
+import asyncio
+import tempfile
+import itertools
+import httpx
 from dotenv import load_dotenv
+from app.services.metrics_service import span, vt_responses, errors
 
 load_dotenv()
 
+VT_API_URL = os.getenv("VIRUSTOTAL_API_URL", "https://www.virustotal.com/api/v3")
+VT_TIMEOUT = float(os.getenv("VIRUSTOTAL_TIMEOUT", "30"))
+VT_MAX_CONNECTIONS = int(os.getenv("VIRUSTOTAL_MAX_CONNECTIONS", "20"))
+VT_MAX_RETRIES = int(os.getenv("VIRUSTOTAL_MAX_RETRIES", "4"))
+# Analysis polling: first check after POLL_INITIAL seconds, backing off to at
+# most POLL_MAX between checks, giving up after POLL_DEADLINE
+VT_POLL_INITIAL = float(os.getenv("VIRUSTOTAL_POLL_INITIAL", "1"))
+VT_POLL_MAX = float(os.getenv("VIRUSTOTAL_POLL_MAX", "15"))
+VT_POLL_DEADLINE = float(os.getenv("VIRUSTOTAL_POLL_DEADLINE", "60"))
+# Account quota shared by every call; the public API allows 4 per minute
+VT_QUOTA_PER_MINUTE = float(os.getenv("VIRUSTOTAL_QUOTA_PER_MINUTE", "4"))
+VT_QUOTA_BURST = float(os.getenv("VIRUSTOTAL_QUOTA_BURST", str(max(1.0, VT_QUOTA_PER_MINUTE))))
+# Uploads: scan-owned copies of the caller's spool stay in memory up to
+# this size, and are streamed to VirusTotal in chunks of UPLOAD_CHUNK
+VT_SPOOL_MEMORY_BYTES = int(os.getenv("VIRUSTOTAL_SPOOL_MEMORY_MB", "8")) * 1024 * 1024
+UPLOAD_CHUNK = 256 * 1024
+
+# Scheduler priorities: lookups/submissions someone is waiting on go first
+PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND = 0, 1
+
+
+class VirusTotalError(Exception):
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(f"VirusTotal HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+def _backoff(attempt: int, base: float, cap: float) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _copy_spool(file_obj):
+    """A private copy of a file object, rewound; blocking, run it in a thread."""
+    copy = tempfile.SpooledTemporaryFile(max_size=VT_SPOOL_MEMORY_BYTES)
+    file_obj.seek(0)
+    shutil.copyfileobj(file_obj, copy, UPLOAD_CHUNK)
+    copy.seek(0)
+    return copy
+
+
+def _multipart(content, filename: str):
+    """
+    (headers, body factory) for a multipart/form-data file upload. Each call
+    of the factory gives a fresh async stream, so retries resend from the
+    start; file reads and the rewind run in worker threads, not on the loop.
+    """
+    boundary = uuid.uuid4().hex
+    safe_name = "".join("%22" if c == '"' else c for c in filename if c not in "\r\n")
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{safe_name}\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n").encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    if isinstance(content, (bytes, bytearray)):
+        size = len(content)
+    else:
+        content.seek(0, os.SEEK_END)
+        size = content.tell()
+
+    async def body():
+        yield head
+        if isinstance(content, (bytes, bytearray)):
+            yield bytes(content)
+        else:
+            await asyncio.to_thread(content.seek, 0)
+            while True:
+                chunk = await asyncio.to_thread(content.read, UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+        yield tail
+
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Content-Length": str(len(head) + size + len(tail))
+    }
+    return headers, body
+
+
+def _retry_after(response: httpx.Response):
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class QuotaScheduler:
+    """
+    Token bucket in front of the VirusTotal API. Callers await acquire()
+    before each request; when the bucket is empty they queue and are
+    released in priority order as tokens refill.
+    """
+
+    def __init__(self, per_minute: float, burst: float):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.tokens = burst
+        self._updated = None
+        self._waiters = []
+        self._seq = itertools.count()
+        self._pump = None
+        self.granted = 0
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        if self.rate <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        self._refill(loop.time())
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            self.granted += 1
+            return
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump is None or self._pump.done():
+            self._pump = loop.create_task(self._release())
+        await future
+
+    async def _release(self):
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            self._refill(loop.time())
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            # Waiters whose request was cancelled don't use up a token
+            if not future.done():
+                self.tokens -= 1
+                self.granted += 1
+                future.set_result(None)
+
+    def depth(self):
+        queued = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued[priority] += 1
+        return {"interactive": queued[PRIORITY_INTERACTIVE], "background": queued[PRIORITY_BACKGROUND]}
+
+
 class VirusTotalService:
     def __init__(self):
         self.api_key = os.getenv("VIRUSTOTAL_API_KEY")
-        self.client = None
-        if self.api_key and "your_" not in self.api_key:
+        self.enabled = bool(self.api_key and "your_" not in self.api_key)
+        self._client = None
+        self._client_loop = None
+        self._closing = None
+        # Set on a 429 so every caller backs off, not just the throttled one
+        self._throttled_until = 0.0
+        self.scheduler = QuotaScheduler(VT_QUOTA_PER_MINUTE, VT_QUOTA_BURST)
+        # In-flight scans by file hash / URL id; concurrent callers share one
+        self._inflight = {}
+        self.coalesced = 0
+        if self.enabled:
             print(f"VT Service: Loaded API Key (Ends with {self.api_key[-4:] if len(self.api_key)>4 else '****'})")
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # One pooled keep-alive client per event loop
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            if self._client is not None:
+                self._close_stale(self._client, self._client_loop, loop)
+            self._client = httpx.AsyncClient(
+                base_url=VT_API_URL,
+                headers={"x-apikey": self.api_key, "accept": "application/json"},
+                timeout=VT_TIMEOUT,
+                limits=httpx.Limits(max_connections=VT_MAX_CONNECTIONS, max_keepalive_connections=VT_MAX_CONNECTIONS),
+            )
+            self._client_loop = loop
+        return self._client
+
+    def _close_stale(self, client, client_loop, loop):
+        """Closes the client left behind by another event loop."""
+        if client_loop is not None and client_loop.is_running():
+            # Still serving requests in its own thread; close it there
+            asyncio.run_coroutine_threadsafe(self._aclose(client), client_loop)
+        else:
+            # Its loop is gone; the pool's sockets can still be shut from here
+            self._closing = loop.create_task(self._aclose(client))
+
+    @staticmethod
+    async def _aclose(client):
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"VT Client Close Error: {e!r}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, priority: int = PRIORITY_INTERACTIVE,
+                       deadline: float = None, body=None, **kwargs) -> dict:
+        """
+        Sends one API call through the quota scheduler, retrying 429s
+        (honouring Retry-After), 5xx and connection errors with backoff.
+        deadline (loop time) bounds the whole call including the quota
+        queue; body is a factory for a fresh request stream per attempt.
+        Returns the "data" object or raises VirusTotalError.
+        """
+        client = self._get_client()
+        loop = asyncio.get_running_loop()
+        for attempt in range(VT_MAX_RETRIES + 1):
+            last_try = attempt == VT_MAX_RETRIES
+            wait = self._throttled_until - loop.time()
+            if wait > 0:
+                wait += random.uniform(0, wait)
+                if deadline is not None and loop.time() + wait > deadline:
+                    raise VirusTotalError(0, "deadline exceeded while throttled")
+                await asyncio.sleep(wait)
+            try:
+                if deadline is None:
+                    await self.scheduler.acquire(priority)
+                else:
+                    await asyncio.wait_for(self.scheduler.acquire(priority), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                raise VirusTotalError(0, "deadline exceeded waiting for quota")
+            if body is not None:
+                kwargs["content"] = body()
             try:
-                self.client = virustotal_python.Virustotal(API_KEY=self.api_key, API_VERSION=3)
-            except Exception as e:
-                print(f"VT Init Error: {e}")
+                resp = await client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                vt_responses.inc(status=0)
+                if last_try:
+                    raise VirusTotalError(0, str(e))
+                await asyncio.sleep(_backoff(attempt, 0.5, 8))
+                continue
+
+            vt_responses.inc(status=resp.status_code)
+            if resp.status_code == 429 or resp.status_code >= 500:
+                if last_try:
+                    raise VirusTotalError(resp.status_code, resp.text[:200])
+                delay = _backoff(attempt, 1, 30)
+                if resp.status_code == 429:
+                    delay += _retry_after(resp) or 0
+                    self._throttled_until = max(self._throttled_until, loop.time() + delay)
+                await asyncio.sleep(delay)
+                continue
+            if resp.status_code >= 400:
+                raise VirusTotalError(resp.status_code, resp.text[:200])
+            return resp.json().get("data", {})
+
+    async def _single_flight(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: one caller going away must not cancel the scan for the rest
+        return await asyncio.shield(task)
+
+    def status(self):
+        return {
+            "queued": self.scheduler.depth(),
+            "tokens": round(self.scheduler.tokens, 2),
+            "quota_per_minute": VT_QUOTA_PER_MINUTE,
+            "requests_sent": self.scheduler.granted,
+            "in_flight": len(self._inflight),
+            "coalesced": self.coalesced
+        }
 
     def calculate_hash(self, content: bytes) -> str:
         return hashlib.sha256(content).hexdigest()
 
-    def scan_file(self, content: bytes, filename: str):
-        if not self.client:
+    async def scan_file(self, content, filename: str, file_hash: str = None):
+        """
+        content is bytes or a binary file object positioned at the start; a
+        file object is streamed to VirusTotal without being read into memory.
+        """
+        if not self.enabled:
             return None
 
-        file_hash = self.calculate_hash(content)
-        
+        if file_hash is None:
+            file_hash = self.calculate_hash(content)
+        key = ("file", file_hash)
+        owned = None
+        if not isinstance(content, (bytes, bytearray)) and key not in self._inflight:
+            # The scan is shared and outlives this request if the client
+            # leaves, so it reads its own copy, not the caller's UploadFile
+            owned = content = await asyncio.to_thread(_copy_spool, content)
+        started = []
+
+        def factory():
+            started.append(True)
+            return self._scan_file(content, filename, file_hash, owned)
+
+        try:
+            return await self._single_flight(key, factory)
+        finally:
+            # Someone else started the same scan while we were copying
+            if owned is not None and not started:
+                owned.close()
+
+    async def _scan_file(self, content, filename: str, file_hash: str, owned=None):
+        try:
+            return await self._lookup_or_upload(content, filename, file_hash)
+        finally:
+            if owned is not None:
+                await asyncio.to_thread(owned.close)
+
+    async def _lookup_or_upload(self, content, filename: str, file_hash: str):
         # 1. Check Hash First (Fast)
         try:
-            resp = self.client.request(f"files/{file_hash}")
-            return self._parse_report(resp.data)
-        except VirustotalError as e:
-            if e.response.status_code == 404:
-                return self._upload_and_poll(content, filename)
+            with span("vt_lookup"):
+                data = await self._request("GET", f"files/{file_hash}")
+            return self._parse_report(data)
+        except VirusTotalError as e:
+            if e.status_code == 404:
+                return await self._upload_and_poll(content, filename)
+            print(f"VT Scan Error: {e}")
+            errors.inc(component="virustotal")
             return None
         except Exception as e:
             print(f"VT Scan Error: {e}")
+            errors.inc(component="virustotal")
             return None
 
-    def scan_url(self, url: str):
-        if not self.client:
+    async def lookup_hash(self, file_hash: str):
+        """Existing report for a hash; None if VirusTotal hasn't seen it."""
+        if not self.enabled:
+            return None
+
+        try:
+            data = await self._single_flight(("hash", file_hash), lambda: self._request("GET", f"files/{file_hash}"))
+            return self._parse_report(data)
+        except VirusTotalError as e:
+            if e.status_code != 404:
+                print(f"VT Lookup Error: {e}")
+            return None
+        except Exception as e:
+            print(f"VT Lookup Error: {e}")
+            return None
+
+    async def scan_url(self, url: str):
+        if not self.enabled:
             return None
 
         # Generate URL Identifier (Base64 without padding)
         url_id = base64.urlsafe_b64encode(url.encode()).decode().strip("=")
+        return await self._single_flight(("url", url_id), lambda: self._scan_url(url, url_id))
 
+    async def _scan_url(self, url: str, url_id: str):
         # 1. Check if URL is already analyzed
         try:
-            resp = self.client.request(f"urls/{url_id}")
-            return self._parse_report(resp.data)
-        except VirustotalError as e:
-            if e.response.status_code == 404:
-                return self._submit_url_and_poll(url)
+            data = await self._request("GET", f"urls/{url_id}")
+            return self._parse_report(data)
+        except VirusTotalError as e:
+            if e.status_code == 404:
+                return await self._submit_url_and_poll(url)
+            print(f"VT URL Scan Error: {e}")
+            errors.inc(component="virustotal")
             return None
         except Exception as e:
             print(f"VT URL Scan Error: {e}")
+            errors.inc(component="virustotal")
             return None
 
-    def _submit_url_and_poll(self, url: str):
+    async def _submit_url_and_poll(self, url: str):
         try:
             print(f"Scanning URL {url} on VirusTotal...")
-            resp = self.client.request("urls", data={"url": url}, method="POST")
-            
-            analysis_id = resp.data.get("id")
+            # The deadline covers the quota queue too, not just polling
+            deadline = asyncio.get_running_loop().time() + VT_POLL_DEADLINE
+            with span("vt_url_submit"):
+                data = await self._request("POST", "urls", deadline=deadline, data={"url": url})
+
+            analysis_id = data.get("id")
             if not analysis_id:
                 return None
-            
+
             print(f"Analysis ID: {analysis_id}. Waiting for results...")
-            return self._wait_for_analysis(analysis_id)
+            with span("vt_poll"):
+                return await self._wait_for_analysis(analysis_id, deadline)
         except Exception as e:
             print(f"VT URL Submit Error: {e}")
+            errors.inc(component="virustotal")
             return None
 
-    def _upload_and_poll(self, content: bytes, filename: str):
+    async def _upload_and_poll(self, content, filename: str):
         try:
             print(f"Uploading {filename} to VirusTotal...")
-            files = {"file": (filename, content)}
-            resp = self.client.request("files", files=files, method="POST")
-            
+            deadline = asyncio.get_running_loop().time() + VT_POLL_DEADLINE
+            headers, body = await asyncio.to_thread(_multipart, content, filename)
+            with span("vt_upload"):
+                data = await self._request("POST", "files", deadline=deadline, body=body, headers=headers)
+
             # The response contains an Analysis ID
-            analysis_id = resp.data.get("id")
+            analysis_id = data.get("id")
             if not analysis_id:
                 return None
-            
+
             print(f"Analysis ID: {analysis_id}. Waiting for results...")
-            return self._wait_for_analysis(analysis_id)
+            with span("vt_poll"):
+                return await self._wait_for_analysis(analysis_id, deadline)
         except Exception as e:
             print(f"VT Upload Error: {e}")
+            errors.inc(component="virustotal")
             return None
 
-    def _wait_for_analysis(self, analysis_id: str):
-        # Poll up to 60 seconds
-        for _ in range(30):
+    async def _wait_for_analysis(self, analysis_id: str, deadline: float):
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            # Jittered so uploads that started together don't poll in lockstep
+            delay = min(VT_POLL_MAX, VT_POLL_INITIAL * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if loop.time() + delay > deadline:
+                break
+            await asyncio.sleep(delay)
+            attempt += 1
             try:
-                resp = self.client.request(f"analyses/{analysis_id}")
-                status = resp.data.get("attributes", {}).get("status")
-                
+                data = await self._request("GET", f"analyses/{analysis_id}", priority=PRIORITY_BACKGROUND,
+                                           deadline=deadline)
+                status = data.get("attributes", {}).get("status")
+
                 if status == "completed":
-                    return self._parse_report(resp.data)
-                
-                time.sleep(2)
-            except Exception as e:
+                    return self._parse_report(data)
+            except VirusTotalError as e:
                 print(f"VT Polling Error: {e}")
-                # Don't break immediately on transient network errors, but stop if critical
-                if "429" in str(e): # Rate limit
-                    time.sleep(5)
-                elif "404" in str(e): # Analysis not found?
+                if e.status_code == 404 or loop.time() >= deadline: # Analysis not found / out of time
                     break
-        
+                # Rate limits and server errors already went through
+                # _request's retries; keep polling until the deadline
+
         return {
             "source": "VirusTotal",
             "risk_score": 50,
@@ -122,10 +457,10 @@ class VirusTotalService:
         try:
             if not data:
                 return None
-                
+
             attr = data.get("attributes", {})
             stats = attr.get("stats") or attr.get("last_analysis_stats", {})
-            
+
             if not stats:
                  return {
                     "source": "VirusTotal",
@@ -137,17 +472,17 @@ class VirusTotalService:
 
             malicious = stats.get("malicious", 0)
             suspicious = stats.get("suspicious", 0)
-            
+
             # Get threat names
             results = attr.get("results") or attr.get("last_analysis_results", {})
             threats = []
-            
+
             if results:
                 for engine, result in results.items():
                     if isinstance(result, dict) and result.get("category") == "malicious":
                         threat_name = result.get("result_name", "Unknown Threat")
                         threats.append(f"{engine}: {threat_name}")
-            
+
             return {
                 "source": "VirusTotal",
                 "risk_score": min((malicious + suspicious) * 10, 100),
@@ -0,0 +1,200 @@
+import os
+import re
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Window size in bytes; ~4 bytes per token, so 8000 bytes is the excerpt
+# size the single-call analysis always sent
+AI_WINDOW_BYTES = int(os.getenv("AI_WINDOW_BYTES", "8000"))
+# Tokens one file may spend on Gemini across all of its window calls
+AI_TOKEN_BUDGET = int(os.getenv("AI_TOKEN_BUDGET", "8000"))
+# Windows after the first are only sent when they look at least this suspicious
+AI_WINDOW_MIN_SCORE = float(os.getenv("AI_WINDOW_MIN_SCORE", "0.3"))
+PROMPT_TOKENS = 250
+BYTES_PER_TOKEN = 4
+# Windows per read; a multiple of the window size keeps windows aligned
+WINDOWS_PER_READ = 128
+
+# Cheap signals, matched on lowercased bytes. Strong indicators are rare in
+# legitimate code; weak ones are common alone and only count above the
+# file's own baseline.
+# Several small patterns rather than one alternation: each keeps a literal
+# or rare first character re can skip ahead to, which is ~3x faster
+STRONG = (
+    re.compile(rb"b64decode|frombase64string|base64_decode|fromcharcode|gzinflate|str_rot13|marshal\.loads|"
+               rb"/dev/tcp/|invoke-expression|downloadstring|downloadfile|virtualalloc|createremotethread"),
+    re.compile(rb"\b(?:eval|exec|assert)\s*\(\s*(?:atob|unescape|__import__|compile|marshal|zlib|bytes\.fromhex)"),
+    re.compile(rb"\|\s*(?:ba|z)?sh\b"),
+    re.compile(rb"\b(?:nc\s+-e|iex)\b"),
+    re.compile(rb"-e(?:nc|ncodedcommand)?\s+[a-z0-9+/]{20}"),
+    re.compile(rb"document\.write\s*\(\s*unescape"),
+)
+WEAK = re.compile(
+    rb"\b(?:eval|exec|popen|subprocess|os\.system|shell_exec|passthru|wget|curl|chmod|netcat|socket|"
+    rb"createobject|wscript|powershell|unescape|atob|__import__|pickle\.loads)\b"
+)
+STRONG_WEIGHT = 3
+HEX_ESCAPES = re.compile(rb"(?:\\x[0-9a-f]{2}){16,}")
+# Runs of base64/hex alphabet or of comma-separated numbers count as blobs
+B64_CHARS = np.zeros(256, dtype=bool)
+B64_CHARS[np.frombuffer(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=", dtype=np.uint8)] = True
+NUMLIST_CHARS = np.zeros(256, dtype=bool)
+NUMLIST_CHARS[np.frombuffer(b"0123456789, ", dtype=np.uint8)] = True
+MIN_B64_RUN = 120
+MIN_NUMLIST_RUN = 160
+
+
+def _runs(mask, min_length):
+    """(starts, ends) of True runs at least min_length long."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).view(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+    keep = ends - starts >= min_length
+    return starts[keep], ends[keep]
+
+
+class Window:
+    __slots__ = ("index", "offset", "length", "score", "signals", "text")
+
+    def __init__(self, index, offset, length, score, signals):
+        self.index = index
+        self.offset = offset
+        self.length = length
+        self.score = score
+        self.signals = signals
+        self.text = None
+
+    def describe(self):
+        return {"offset": self.offset, "length": self.length, "local_score": round(self.score, 3), **self.signals}
+
+
+class WindowService:
+    """
+    Splits a file into fixed windows and scores every one of them with
+    local signals (byte entropy, suspicious keyword density, share of
+    encoded blobs, signature hits), then picks what the token budget
+    allows: always the first window, for context, plus the most
+    suspicious of the rest.
+    """
+
+    def __init__(self, window_bytes: int = AI_WINDOW_BYTES, token_budget: int = AI_TOKEN_BUDGET,
+                 min_score: float = AI_WINDOW_MIN_SCORE):
+        self.window_bytes = window_bytes
+        self.token_budget = token_budget
+        self.min_score = min_score
+
+    @property
+    def max_windows(self):
+        per_call = self.window_bytes // BYTES_PER_TOKEN + PROMPT_TOKENS
+        return max(1, self.token_budget // per_call)
+
+    def score(self, file_obj, hint_offsets=()):
+        """Scores every window of the file; hint_offsets (e.g. signature matches) boost theirs."""
+        blocks = []
+        step = self.window_bytes * WINDOWS_PER_READ
+        while True:
+            data = file_obj.read(step)
+            if not data:
+                break
+            blocks.append(self._signals(data))
+        if not blocks:
+            return []
+        lengths, entropy, strong, weak, blob_share = (np.concatenate(column) for column in zip(*blocks))
+
+        # Relative to the file's typical window, so a script that shells
+        # out everywhere doesn't make every window look suspicious
+        kb = lengths / 1024
+        weak_excess = np.clip(weak / kb - np.median(weak / kb), 0, None)
+        blob_excess = np.clip(blob_share - np.median(blob_share), 0, None)
+        # Plain text and code sit around 4.5-5 bits/byte, base64 near 6
+        entropy_excess = np.clip(entropy - max(np.median(entropy), 5.0), 0, None)
+        # Encoded data on its own (images, hash lists) stays under the
+        # default AI_WINDOW_MIN_SCORE; with any indicator it doesn't
+        scores = (0.5 * np.clip(strong * STRONG_WEIGHT / 3, 0, 1)
+                  + 0.2 * np.clip(weak_excess / 2, 0, 1)
+                  + 0.15 * np.clip(blob_excess * 4, 0, 1)
+                  + 0.1 * np.clip(entropy_excess, 0, 1))
+        # Encoded data next to a decoder/executor is the classic dropper shape
+        scores[(strong > 0) & (blob_share > 0)] += 0.3
+
+        windows = [
+            Window(i, i * self.window_bytes, int(lengths[i]), float(scores[i]), {
+                "entropy": round(float(entropy[i]), 2),
+                "indicators": int(strong[i]),
+                "keywords": int(weak[i]),
+                "blob_share": round(float(blob_share[i]), 3)
+            })
+            for i in range(len(lengths))
+        ]
+        for offset in hint_offsets:
+            i = offset // self.window_bytes
+            if 0 <= i < len(windows):
+                windows[i].signals["signature_hit"] = True
+                windows[i].score += 1.0
+        return windows
+
+    def _signals(self, data):
+        """Per-window (length, entropy, strong hits, weak hits, blob share) for one block."""
+        size = self.window_bytes
+        n = -(-len(data) // size)
+        raw = np.frombuffer(data, dtype=np.uint8)
+        owner = np.repeat(np.arange(n, dtype=np.int32), size)[:len(raw)]
+
+        # Shannon entropy per window, all windows in one bincount
+        counts = np.bincount((owner << 8) | raw, minlength=n * 256).reshape(n, 256)
+        lengths = counts.sum(axis=1)
+        p = counts / lengths[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entropy = -np.nansum(p * np.log2(p), axis=1)
+
+        lowered = data.lower()
+        strong = np.bincount([m.start() // size for regex in STRONG for m in regex.finditer(lowered)], minlength=n)
+        weak = np.bincount([m.start() // size for m in WEAK.finditer(lowered)], minlength=n)
+
+        blob = np.zeros(len(raw), dtype=bool)
+        for mask, min_length in ((B64_CHARS[raw], MIN_B64_RUN), (NUMLIST_CHARS[raw], MIN_NUMLIST_RUN)):
+            for start, end in zip(*_runs(mask, min_length)):
+                blob[start:end] = True
+        for m in HEX_ESCAPES.finditer(lowered):
+            blob[m.start():m.end()] = True
+        blob_share = np.add.reduceat(blob, np.arange(0, len(raw), size)) / lengths
+        return lengths, entropy, strong, weak, blob_share
+
+    def select(self, windows):
+        """The first window plus the top suspicious ones the budget allows, in file order."""
+        if not windows:
+            return []
+        rest = sorted((w for w in windows[1:] if w.score >= self.min_score), key=lambda w: w.score, reverse=True)
+        return sorted([windows[0]] + rest[:self.max_windows - 1], key=lambda w: w.offset)
+
+    def prepare(self, file_obj, hint_offsets=()):
+        """
+        Scores the whole file and reads back the chosen windows' text.
+        Returns (selected windows, total window count); no windows are
+        selected when the file is empty or only whitespace. CPU-bound; run
+        in a worker thread.
+        """
+        file_obj.seek(0)
+        windows = self.score(file_obj, hint_offsets)
+        selected = self.select(windows)
+        for w in selected:
+            file_obj.seek(w.offset)
+            w.text = file_obj.read(w.length).decode("utf-8", "replace")
+        if selected and not any(w.text.strip() for w in selected) and self._blank(file_obj):
+            selected = []
+        file_obj.seek(0)
+        return selected, len(windows)
+
+    def _blank(self, file_obj):
+        """True if the file holds nothing but whitespace."""
+        file_obj.seek(0)
+        while True:
+            data = file_obj.read(self.window_bytes * WINDOWS_PER_READ)
+            if not data:
+                return True
+            if data.strip():
+                return False
+
+
+window_service = WindowService()
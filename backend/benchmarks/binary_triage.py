@@ -0,0 +1,181 @@
+"""
+Latency of the local binary triage. Builds synthetic PE32+ files (plain, a
+UPX-style packed one and an injector) padded to each size with data or a
+high-entropy overlay, then times TriageService.analyze on them, the way
+the upload path calls it (spooled file on disk, memory-mapped). Real files
+can be added with --files.
+
+    cd backend && python -m benchmarks.binary_triage --sizes 1m,10m,100m
+    cd backend && python -m benchmarks.binary_triage --files /bin/ls /usr/lib/x86_64-linux-gnu/libc.so.6
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.suite import parse_size
+
+FILE_ALIGN, SECTION_ALIGN = 0x200, 0x1000
+HEADERS = 0x400
+
+PLAIN_IMPORTS = {"KERNEL32.dll": ["CreateFileW", "ReadFile", "WriteFile", "CloseHandle", "GetLastError",
+                                  "HeapAlloc", "HeapFree", "GetProcessHeap", "ExitProcess", "GetCommandLineW"],
+                 "USER32.dll": ["MessageBoxW", "CreateWindowExW", "DispatchMessageW", "GetMessageW"]}
+INJECTOR_IMPORTS = {"KERNEL32.dll": ["OpenProcess", "VirtualAllocEx", "WriteProcessMemory", "CreateRemoteThread",
+                                     "CloseHandle", "ExitProcess"]}
+PACKED_IMPORTS = {"KERNEL32.dll": ["LoadLibraryA", "GetProcAddress", "VirtualProtect", "ExitProcess"]}
+
+
+def _align(value, to):
+    return -(-value // to) * to
+
+
+def _code(size):
+    # Instruction-like bytes: skewed distribution, ~6 bits/byte like real .text
+    import numpy as np
+    rng = np.random.default_rng(size)
+    weights = 1 / np.arange(1, 257) ** 0.9
+    return rng.choice(256, size=size, p=weights / weights.sum()).astype(np.uint8).tobytes()
+
+
+def _imports_blob(imports, base_rva):
+    """Import descriptors, lookup tables, hint/name entries and DLL names at base_rva."""
+    dlls = list(imports)
+    descriptors_size = 20 * (len(dlls) + 1)
+    tables = []
+    cursor = descriptors_size
+    for dll in dlls:
+        tables.append(cursor)
+        cursor += 8 * (len(imports[dll]) + 1)
+    names = bytearray()
+    name_rvas = {}
+    for dll in dlls:
+        for fn in imports[dll]:
+            name_rvas[fn] = base_rva + cursor + len(names)
+            names += struct.pack("<H", 0) + fn.encode() + b"\0"
+            if len(names) % 2:
+                names += b"\0"
+        name_rvas[dll] = base_rva + cursor + len(names)
+        names += dll.encode() + b"\0"
+    blob = bytearray(cursor)
+    for i, dll in enumerate(dlls):
+        table_rva = base_rva + tables[i]
+        struct.pack_into("<IIIII", blob, 20 * i, table_rva, 0, 0, name_rvas[dll], table_rva)
+        for j, fn in enumerate(imports[dll]):
+            struct.pack_into("<Q", blob, tables[i] + 8 * j, name_rvas[fn])
+    return bytes(blob + names), descriptors_size
+
+
+def build_pe(path, size, kind="plain", overlay=False):
+    """A minimal, well-formed PE32+ of about `size` bytes."""
+    imports = {"plain": PLAIN_IMPORTS, "injector": INJECTOR_IMPORTS, "packed": PACKED_IMPORTS}[kind]
+    if kind == "packed":
+        # UPX layout: empty executable UPX0 that the stub unpacks into, compressed UPX1
+        specs = [(b"UPX0", b"", 0xE0000080, 0x200000), (b"UPX1", os.urandom(256 * 1024), 0xE0000040, None)]
+    else:
+        specs = [(b".text", _code(256 * 1024), 0x60000020, None)]
+    rdata_index = len(specs)
+    specs.append((b".rdata", None, 0x40000040, None))
+    padding = max(0, size - HEADERS - 512 * 1024)
+    if overlay:
+        specs.append((b".data", b"\0" * 4096, 0xC0000040, None))
+    else:
+        specs.append((b".data", b"\0" * padding, 0xC0000040, None))
+
+    sections = []
+    va, offset = SECTION_ALIGN, HEADERS
+    for name, data, flags, vsize in specs:
+        if data is None:  # .rdata: imports, placed once its RVA is known
+            data, import_size = _imports_blob(imports, va)
+            import_rva = va
+        raw_size = _align(len(data), FILE_ALIGN)
+        sections.append((name, data, flags, vsize or max(len(data), 1), va, raw_size, offset if raw_size else 0))
+        va += _align(vsize or max(len(data), 1), SECTION_ALIGN)
+        offset += raw_size
+
+    entry = sections[rdata_index - 1][4] + 0x10
+    optional = bytearray(240)
+    struct.pack_into("<H", optional, 0, 0x20B)
+    struct.pack_into("<I", optional, 16, entry)
+    struct.pack_into("<Q", optional, 24, 0x140000000)
+    struct.pack_into("<II", optional, 32, SECTION_ALIGN, FILE_ALIGN)
+    struct.pack_into("<II", optional, 56, va, HEADERS)
+    struct.pack_into("<HH", optional, 68, 3, 0x8160)
+    struct.pack_into("<I", optional, 108, 16)
+    struct.pack_into("<II", optional, 112 + 8, import_rva, import_size)
+
+    header = bytearray(HEADERS)
+    header[:2] = b"MZ"
+    struct.pack_into("<I", header, 0x3C, 0x80)
+    header[0x80:0x84] = b"PE\0\0"
+    struct.pack_into("<HHIIIHH", header, 0x84, 0x8664, len(sections), int(time.time()), 0, 0, len(optional), 0x22)
+    header[0x98:0x98 + len(optional)] = optional
+    table = 0x98 + len(optional)
+    for i, (name, data, flags, vsize, sva, raw_size, raw_ptr) in enumerate(sections):
+        struct.pack_into("<8sIIIIIIHHI", header, table + 40 * i, name, vsize, sva, raw_size, raw_ptr, 0, 0, 0, 0, flags)
+
+    with open(path, "wb") as f:
+        f.write(header)
+        for _, data, _, _, _, raw_size, _ in sections:
+            f.write(data + b"\0" * (raw_size - len(data)))
+        if overlay:
+            remaining = size - f.tell()
+            while remaining > 0:
+                chunk = os.urandom(min(remaining, 8 * 1024 * 1024))
+                f.write(chunk)
+                remaining -= len(chunk)
+
+
+def time_triage(path, rounds):
+    from app.services.triage_service import triage_service
+    timings = []
+    result = None
+    for _ in range(rounds):
+        with open(path, "rb") as f:
+            t = time.perf_counter()
+            result = triage_service.analyze(f, os.path.getsize(path))
+            timings.append((time.perf_counter() - t) * 1000)
+    return {
+        "size_mb": round(os.path.getsize(path) / 1e6, 1),
+        "p50_ms": round(statistics.median(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "risk_score": result["risk_score"],
+        "format": result["technical_details"]["format"],
+        "threats": result["threats"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1m,10m,100m")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--files", nargs="*", default=[])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="triage_bench_")
+    results = {}
+    try:
+        for size in args.sizes.split(","):
+            for kind, overlay in (("plain", False), ("plain", True), ("packed", False), ("injector", False)):
+                name = f"{kind}{'+overlay' if overlay else ''}_{size}"
+                path = os.path.join(workdir, name + ".exe")
+                build_pe(path, parse_size(size), kind, overlay)
+                time_triage(path, 1)  # first run pays the page cache
+                results[name] = time_triage(path, args.rounds)
+                os.remove(path)
+        for path in args.files:
+            results[path] = time_triage(path, args.rounds)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Blocklist index size and lookup latency.
+
+Writes synthetic feeds (--domains random domains plus URL prefixes and
+IPs), builds the index, then times check_url for listed subdomains and
+unlisted URLs. Prints build time, index size, RSS and per-lookup
+microseconds as JSON.
+
+    cd backend && python -m benchmarks.blocklist_lookup --domains 2000000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.blocklist_service import BlocklistService
+
+TLDS = ["com", "net", "org", "ru", "xyz", "top", "info", "io"]
+
+
+def random_domain(rng):
+    return "".join(rng.choices("abcdefghijklmnopqrstuvwxyz0123456789", k=rng.randint(6, 16))) + "." + rng.choice(TLDS)
+
+
+def time_lookups(service, urls):
+    t = time.perf_counter()
+    hits = sum(1 for url in urls if service.check_url(url))
+    return hits, (time.perf_counter() - t) / len(urls) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domains", type=int, default=2_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    workdir = tempfile.mkdtemp(prefix="blocklist_bench_")
+    feed_dir = os.path.join(workdir, "feeds")
+    os.makedirs(feed_dir)
+    domains = [random_domain(rng) for _ in range(args.domains)]
+    with open(os.path.join(feed_dir, "domains.txt"), "w") as f:
+        f.write("\n".join(domains))
+    with open(os.path.join(feed_dir, "urls.txt"), "w") as f:
+        f.write("\n".join(f"http://{random_domain(rng)}/phish/{i}" for i in range(args.domains // 20)))
+    with open(os.path.join(feed_dir, "ips.txt"), "w") as f:
+        f.write("\n".join(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.domains // 20)))
+
+    rss_before = psutil.Process().memory_info().rss
+    t = time.perf_counter()
+    service = BlocklistService(feed_dir, os.path.join(workdir, "blocklist.idx"))
+    service.refresh()
+    build_seconds = time.perf_counter() - t
+
+    listed = [f"https://login.{rng.choice(domains)}/account?id=1" for _ in range(args.lookups)]
+    unlisted = [f"https://www.{random_domain(rng)}/a/b/c" for _ in range(args.lookups)]
+    listed_hits, listed_us = time_lookups(service, listed)
+    unlisted_hits, unlisted_us = time_lookups(service, unlisted)
+
+    print(json.dumps({
+        "entries": service.index.counts(),
+        "build_seconds": round(build_seconds, 2),
+        "index_mb": round(os.path.getsize(service.index_path) / 1e6, 1),
+        "rss_delta_mb": round((psutil.Process().memory_info().rss - rss_before) / 1e6, 1),
+        "listed": {"hits": listed_hits, "us_per_lookup": round(listed_us, 2)},
+        "unlisted": {"false_positives": unlisted_hits, "us_per_lookup": round(unlisted_us, 2)}
+    }, indent=2))
@@ -0,0 +1,152 @@
+"""
+Stand-in for the Gemini model and a load test of AIService against it.
+
+StandInModel mimics GenerativeModel.generate_content_async: it sleeps for a
+log-normal latency (optionally blocking the loop, like the old synchronous
+calls did) and returns a JSON verdict. The load test fires --calls
+concurrent analyze_text requests, a share of them repeating earlier
+snippets, while a ticker measures event loop lag.
+
+    cd backend && python -m benchmarks.gemini_standin --calls 200
+    cd backend && python -m benchmarks.gemini_standin --blocking   # old behaviour
+    cd backend && python -m benchmarks.gemini_standin --chat       # streamed chat TTFT
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StandInResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StandInStream:
+    """Async iterable of response chunks, like a streamed Gemini reply."""
+
+    def __init__(self, model, words, token_delay):
+        self.model = model
+        self.words = words
+        self.token_delay = token_delay
+
+    async def __aiter__(self):
+        try:
+            for i in range(0, len(self.words), 3):
+                yield StandInResponse(" ".join(self.words[i:i + 3]) + " ")
+                await asyncio.sleep(self.token_delay)
+        finally:
+            self.model.open_streams -= 1
+
+
+class StandInModel:
+    def __init__(self, median_latency=1.5, sigma=0.5, timeout_ratio=0.0, blocking=False, token_delay=0.05):
+        self.median_latency = median_latency
+        self.sigma = sigma
+        self.timeout_ratio = timeout_ratio
+        self.blocking = blocking
+        self.token_delay = token_delay
+        self.calls = 0
+        self.open_streams = 0
+
+    def _latency(self):
+        if random.random() < self.timeout_ratio:
+            return 3600.0  # never answers; the caller's deadline has to fire
+        return random.lognormvariate(0, self.sigma) * self.median_latency
+
+    async def generate_content_async(self, contents, stream=False):
+        self.calls += 1
+        latency = self._latency()
+        if self.blocking:
+            time.sleep(min(latency, 5))
+        else:
+            await asyncio.sleep(latency)
+        if stream:
+            self.open_streams += 1
+            return StandInStream(self, ["token"] * 60, self.token_delay)
+        score = random.randint(0, 100)
+        return StandInResponse(json.dumps({
+            "risk_score": score,
+            "summary": "Stand-in verdict",
+            "threats": ["Stand-in Threat"] if score > 50 else [],
+            "technical_details": {"vulnerabilities": [], "recommendation": "n/a"}
+        }))
+
+
+async def measure_lag(stop, interval=0.05):
+    lags = []
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - t - interval)
+    return lags
+
+
+async def chat_main(args):
+    from app.services.ai_service import ai_service
+    from app.services.chat_service import chat_service
+    model = StandInModel(args.latency, blocking=args.blocking)
+    ai_service.model = model
+    totals = []
+
+    async def one(i):
+        t = time.perf_counter()
+        async for event, data in chat_service.stream(f"question {i}", "", f"session-{i % 10}"):
+            pass
+        totals.append(time.perf_counter() - t)
+
+    await asyncio.gather(*(one(i) for i in range(args.calls)))
+    totals.sort()
+    return {**chat_service.stats(), "total_p50_ms": round(statistics.median(totals) * 1000, 1)}
+
+
+async def main(args):
+    from app.services.ai_service import ai_service
+    model = StandInModel(args.latency, timeout_ratio=args.timeout_ratio, blocking=args.blocking)
+    ai_service.model = model
+
+    distinct = max(1, int(args.calls * (1 - args.repeat_ratio)))
+    snippets = [f"snippet {i} " * 50 for i in range(distinct)]
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop))
+    latencies = []
+
+    async def one(i):
+        t = time.perf_counter()
+        await ai_service.analyze_text(snippets[i % distinct], f"file_{i}.txt")
+        latencies.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.calls)))
+    elapsed = time.perf_counter() - t
+    stop.set()
+    lags = await ticker
+    latencies.sort()
+    return {
+        "calls": args.calls,
+        "model_calls": model.calls,
+        "seconds": round(elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000, 1),
+        "max_loop_lag_ms": round(max(lags, default=0) * 1000, 1),
+        "cache_entries": len(ai_service.cache),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=1.0, help="median model latency in seconds")
+    parser.add_argument("--repeat-ratio", type=float, default=0.5, help="share of calls repeating a snippet")
+    parser.add_argument("--timeout-ratio", type=float, default=0.0, help="share of calls that never answer")
+    parser.add_argument("--blocking", action="store_true", help="block the loop like the old synchronous client")
+    parser.add_argument("--chat", action="store_true", help="measure streamed chat time-to-first-token")
+    args = parser.parse_args()
+    os.environ.setdefault("GEMINI_TIMEOUT", "5")
+    print(json.dumps(asyncio.run(chat_main(args) if args.chat else main(args)), indent=2))
@@ -0,0 +1,97 @@
+"""
+History API page latency against a large local SQLite table.
+
+Fills a SQLite analysis_results table (same schema and indexes as the app)
+with --rows synthetic verdicts, then times page fetches at the start,
+middle and end of the history, with and without filters, using the keyset
+cursor. An OFFSET query at the same depth is timed for comparison.
+
+    cd backend && python -m benchmarks.history_pagination --rows 10000000
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.storage_service import SQLiteBackend, COLUMNS, encode_cursor, decode_cursor
+
+SOURCES = ["VirusTotal", "Gemini AI", "CyberSpy Signatures", "CyberSpy Blocklist", "Gemini QR"]
+
+
+def fill(backend, rows, batch=100_000):
+    rng = random.Random(3)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    placeholders = ", ".join("?" * len(COLUMNS))
+    for offset in range(0, rows, batch):
+        chunk = []
+        for i in range(offset, min(rows, offset + batch)):
+            chunk.append((
+                str(uuid.UUID(int=rng.getrandbits(128))),
+                (start + timedelta(seconds=i * 3)).isoformat(),
+                f"sample_{i}.bin",
+                rng.randint(0, 100),
+                "bench",
+                "{}",
+                rng.choice(SOURCES),
+                hashlib.sha256(str(i).encode()).hexdigest()
+            ))
+        backend._db.executemany(f"INSERT INTO analysis_results ({', '.join(COLUMNS)}) VALUES ({placeholders})", chunk)
+        backend._db.commit()
+
+
+def timed(fn, repeat=20):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return result, round(best * 1000, 3)
+
+
+def cursor_at(backend, depth):
+    row = backend._db.execute(
+        "SELECT created_at, id FROM analysis_results ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?", (depth,)
+    ).fetchone()
+    return encode_cursor({"created_at": row[0], "id": row[1]})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--db", default=None, help="reuse an existing benchmark database")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="history_bench_"), "history.db")
+    backend = SQLiteBackend(path)
+    existing = backend._db.execute("SELECT COUNT(*) FROM analysis_results").fetchone()[0]
+    t = time.perf_counter()
+    if existing < args.rows:
+        fill(backend, args.rows - existing)
+    fill_seconds = time.perf_counter() - t
+    total = backend._db.execute("SELECT COUNT(*) FROM analysis_results").fetchone()[0]
+
+    report = {"rows": total, "fill_seconds": round(fill_seconds, 1), "page_ms": {}}
+    for label, depth in (("first", 0), ("middle", total // 2), ("last", total - args.page - 1)):
+        position = decode_cursor(cursor_at(backend, depth)) if depth else None
+        _, ms = timed(lambda: backend.query({}, position, args.page + 1))
+        _, offset_ms = timed(lambda: backend._db.execute(
+            "SELECT * FROM analysis_results ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?", (args.page, depth)
+        ).fetchall(), repeat=3)
+        _, source_ms = timed(lambda: backend.query({"source": "VirusTotal"}, position, args.page + 1))
+        _, score_ms = timed(lambda: backend.query({"min_score": 90}, position, args.page + 1))
+        report["page_ms"][label] = {"keyset": ms, "offset": offset_ms, "keyset_source": source_ms, "keyset_min_score": score_ms}
+
+    probe = hashlib.sha256(str(total // 3).encode()).hexdigest()
+    rows, ms = timed(lambda: backend.query({"content_hash": probe}, None, args.page + 1))
+    report["hash_lookup_ms"] = ms
+    print(json.dumps(report, indent=2))
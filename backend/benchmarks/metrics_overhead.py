@@ -0,0 +1,129 @@
+"""
+Cost of the metrics layer: the span/counter primitives and the request
+middleware on their own, and whole requests through the ASGI app in two
+subprocesses, one with METRICS_ENABLED=1 and one with METRICS_ENABLED=0.
+Whole-request timings drift by a percent or two between runs on a shared
+box; the middleware figure is the stable one to hold to the 1% budget.
+
+    cd backend && python -m benchmarks.metrics_overhead --requests 5000
+"""
+import os
+import sys
+import json
+import shutil
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def primitives(n=200_000):
+    from app.services.metrics_service import span, cache_events
+    t = time.perf_counter()
+    for _ in range(n):
+        with span("bench"):
+            pass
+    span_ns = (time.perf_counter() - t) / n * 1e9
+    t = time.perf_counter()
+    for _ in range(n):
+        cache_events.inc(cache="bench", result="hit")
+    counter_ns = (time.perf_counter() - t) / n * 1e9
+    return {"span_ns": round(span_ns), "counter_inc_ns": round(counter_ns)}
+
+
+def middleware(n=200_000):
+    """Added time per request: MetricsMiddleware around a bare ASGI app."""
+    from app.services.metrics_service import MetricsMiddleware
+
+    class Route:
+        path = path_format = "/bench"
+        path_regex = None
+
+    async def app(scope, receive, send):
+        scope["route"] = Route
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def run(handler):
+        scope = {"type": "http", "method": "GET", "path": "/bench", "query_string": b"", "headers": []}
+        t = time.perf_counter()
+        for _ in range(n):
+            await handler(dict(scope), receive, send)
+        return (time.perf_counter() - t) / n * 1e6
+
+    async def compare():
+        wrapped = MetricsMiddleware(app)
+        await run(wrapped)
+        return min([await run(wrapped) for _ in range(3)]) - min([await run(app) for _ in range(3)])
+
+    return asyncio.run(compare())
+
+
+async def requests(n):
+    import httpx
+    from app.main import app
+    transport = httpx.ASGITransport(app=app)
+    timings = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, call in (
+            ("health", lambda: client.get("/")),
+            ("url_blocklist", lambda: client.post("/api/analyze/url", json={"url": "http://bench.example/x"})),
+        ):
+            for _ in range(200):  # warm-up
+                await call()
+            t = time.perf_counter()
+            for _ in range(n):
+                await call()
+            timings[name] = (time.perf_counter() - t) / n * 1e6
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(requests(args.requests))))
+        return
+
+    results = {"primitives": primitives(), "request_us": {}}
+    middleware_us = middleware()
+    runs = {"on": [], "off": []}
+    workdir = tempfile.mkdtemp(prefix="metrics_bench_")
+    # Alternate so drift on a shared box hits both sides equally
+    for _ in range(args.rounds):
+        for mode, flag in (("on", "1"), ("off", "0")):
+            env = dict(os.environ, METRICS_ENABLED=flag, VERDICT_CACHE_PATH=os.path.join(workdir, "verdict_cache.db"),
+                       STORAGE_SQLITE_PATH=os.path.join(workdir, "results.db"), STORAGE_SPOOL_PATH=os.path.join(workdir, "spool.jsonl"))
+            out = subprocess.check_output(
+                [sys.executable, "-m", "benchmarks.metrics_overhead", "--child", "--requests", str(args.requests)],
+                cwd=BACKEND_DIR, env=env, stderr=subprocess.DEVNULL, text=True
+            )
+            runs[mode].append(json.loads(out.strip().splitlines()[-1]))
+    for name in runs["on"][0]:
+        on = statistics.median(r[name] for r in runs["on"])
+        off = statistics.median(r[name] for r in runs["off"])
+        results["request_us"][name] = {"metrics_on": round(on, 1), "metrics_off": round(off, 1),
+                                       "overhead_pct": round((on - off) / off * 100, 2)}
+    off = results["request_us"]["health"]["metrics_off"]
+    results["middleware"] = {"added_us": round(middleware_us, 2), "pct_of_request": round(middleware_us / off * 100, 2)}
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cold start: how long `import app.main` takes in a fresh interpreter, what
+the lazily loaded SDKs cost when they are first used, and the time from
+spawning uvicorn until "/" answers. "eager" pre-imports
+google.generativeai, supabase and scapy.all ahead of the app, which is
+what every start paid before they were loaded on first use.
+
+    cd backend && python -m benchmarks.startup --rounds 5
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import importlib
+import tempfile
+import subprocess
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+EAGER_IMPORTS = "import google.generativeai, supabase, scapy.all"
+
+
+def child(eager):
+    t = time.perf_counter()
+    if eager:
+        exec(EAGER_IMPORTS)
+    importlib.import_module("app.main")
+    result = {"import_s": time.perf_counter() - t}
+    from app.services.ai_service import ai_service
+    from app.services.storage_service import storage_service
+    from app.services.pcap_service import load_scapy
+    for name, load in (("gemini_s", ai_service.warm_up), ("storage_s", storage_service.warm_up), ("scapy_s", load_scapy)):
+        t = time.perf_counter()
+        load()
+        result[name] = time.perf_counter() - t
+    print(json.dumps(result))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def first_request(env, eager):
+    """Seconds from spawning uvicorn until GET / returns 200."""
+    import httpx
+    port = free_port()
+    code = (EAGER_IMPORTS + "; " if eager else "") + \
+        f"import uvicorn; uvicorn.run('app.main:app', port={port}, log_level='warning')"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--child", choices=("lazy", "eager"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child == "eager")
+        return
+
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    # A dummy key so the Gemini client is actually built (no request is made)
+    env = dict(os.environ, GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "startup-bench"),
+               VERDICT_CACHE_PATH=os.path.join(workdir, "verdict_cache.db"),
+               STORAGE_SQLITE_PATH=os.path.join(workdir, "results.db"),
+               STORAGE_SPOOL_PATH=os.path.join(workdir, "spool.jsonl"))
+    runs = {"lazy": [], "eager": []}
+    try:
+        # Alternate so drift on a shared box hits both sides equally
+        for _ in range(args.rounds):
+            for mode in runs:
+                out = subprocess.check_output(
+                    [sys.executable, "-m", "benchmarks.startup", "--child", mode],
+                    cwd=BACKEND_DIR, env=env, stderr=subprocess.DEVNULL, text=True
+                )
+                result = json.loads(out.strip().splitlines()[-1])
+                result["first_request_s"] = first_request(env, mode == "eager")
+                runs[mode].append(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {}
+    for mode, results in runs.items():
+        report[mode] = {key: round(statistics.median(r[key] for r in results), 3) for key in results[0]}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
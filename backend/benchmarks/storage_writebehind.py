@@ -0,0 +1,95 @@
+"""
+Write-behind storage against a local SQLite stand-in with injected
+round-trip latency and an outage window.
+
+Saves --records results from concurrent "requests", takes the backend
+down for part of the run, and checks that every record ends up in the
+table after the spool is replayed. Prints per-save latency (what a request
+now waits for) next to the simulated database round trip, plus the
+storage counters.
+
+    cd backend && python -m benchmarks.storage_writebehind --records 5000
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StandInBackend:
+    """SQLiteBackend with a per-call delay and a switch to simulate an outage."""
+
+    def __init__(self, inner, latency):
+        self.inner = inner
+        self.latency = latency
+        self.name = "sqlite-standin"
+        self.down = False
+        self.calls = 0
+
+    def insert_many(self, records):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.down:
+            raise ConnectionError("stand-in backend is down")
+        self.inner.insert_many(records)
+
+
+async def main(args):
+    from app.services import storage_service as storage
+    workdir = tempfile.mkdtemp(prefix="storage_bench_")
+    db_path = os.path.join(workdir, "results.db")
+
+    service = storage.StorageService()
+    service.backend = backend = StandInBackend(storage.SQLiteBackend(db_path), args.latency)
+    service.spool_path = os.path.join(workdir, "spool.jsonl")
+    storage.STORAGE_RETRY_INTERVAL = 0.2
+
+    save_latencies = []
+
+    async def request(i):
+        t = time.perf_counter()
+        await service.save_analysis({"filename": f"sample_{i}", "risk_score": i % 100, "summary": "bench", "source": "Bench"})
+        save_latencies.append(time.perf_counter() - t)
+
+    third = args.records // 3
+    t = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(third)))
+    backend.down = True
+    await asyncio.gather(*(request(i) for i in range(third, 2 * third)))
+    await service.flush()
+    spooled_during_outage = service.counters["spooled"]
+    backend.down = False
+    await asyncio.sleep(0.3)
+    await asyncio.gather(*(request(i) for i in range(2 * third, args.records)))
+    await service.flush()
+    elapsed = time.perf_counter() - t
+    await service.close()
+
+    rows = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM analysis_results").fetchone()[0]
+    save_latencies.sort()
+    return {
+        "records": args.records,
+        "rows_in_table": rows,
+        "seconds": round(elapsed, 2),
+        "save_p50_us": round(statistics.median(save_latencies) * 1e6, 1),
+        "save_p99_us": round(save_latencies[int(len(save_latencies) * 0.99) - 1] * 1e6, 1),
+        "db_round_trip_ms": args.latency * 1000,
+        "backend_calls": backend.calls,
+        "spooled_during_outage": spooled_during_outage,
+        "counters": service.counters,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated insert round trip in seconds")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args)), indent=2))
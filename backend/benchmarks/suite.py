@@ -0,0 +1,355 @@
+"""
+End-to-end benchmark suite with local stand-ins for every remote service.
+
+Runs the API in a uvicorn subprocess where Gemini is replaced by
+StandInModel and Supabase by a SQLite backend with injected round-trip
+latency; VirusTotal is the HTTP stand-in from vt_standin.py. Then drives
+the file, URL, QR and PCAP endpoints with corpora of increasing size, plus
+websocket fan-out, and prints one JSON document with p50/p99 latency,
+throughput, errors and the server's peak RSS / CPU per scenario.
+
+    cd backend && python -m benchmarks.suite --out results.json
+    cd backend && python -m benchmarks.suite --only file,pcap --compare results.json
+
+--compare exits with status 1 when a scenario's p99 or throughput got
+worse than the baseline by more than --tolerance (default 20%).
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import socket
+import struct
+import asyncio
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import httpx
+import psutil
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SCENARIOS = ("file", "url", "qr", "pcap", "ws")
+SIZES = {"k": 1024, "m": 1024 * 1024}
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    return int(float(text[:-1]) * SIZES[text[-1]]) if text[-1] in SIZES else int(text)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else None
+
+
+# --- Server side
+
+def serve(args):
+    """Runs the app with the Gemini and storage stand-ins installed."""
+    from benchmarks.gemini_standin import StandInModel
+    from benchmarks.storage_writebehind import StandInBackend
+    from app.main import app
+    from app.services.ai_service import ai_service
+    from app.services.storage_service import storage_service, SQLiteBackend
+    import uvicorn
+
+    ai_service.model = StandInModel(median_latency=args.gemini_latency, sigma=0.3)
+    storage_service.backend = StandInBackend(SQLiteBackend(os.path.join(args.workdir, "results.db")), args.db_latency)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096)
+
+
+def start_server(args, port, vt_url):
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACKEND_DIR,
+        VIRUSTOTAL_API_URL=vt_url,
+        VIRUSTOTAL_API_KEY="standin",
+        VIRUSTOTAL_QUOTA_PER_MINUTE="600000",
+        VIRUSTOTAL_POLL_INITIAL="0.2",
+        VERDICT_CACHE_PATH=os.path.join(args.workdir, "verdict_cache.db"),
+        STORAGE_SPOOL_PATH=os.path.join(args.workdir, "spool.jsonl"),
+        BLOCKLIST_INDEX_PATH=os.path.join(args.workdir, "blocklist.idx"),
+        GEMINI_API_KEY="",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.suite", "--serve", "--port", str(port), "--workdir", args.workdir,
+         "--gemini-latency", str(args.gemini_latency), "--db-latency", str(args.db_latency)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+    for _ in range(600):
+        if server.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("API server did not start")
+
+
+# --- Corpora
+
+def text_corpus(size, seed):
+    line = f"def handler_{seed}(request):\n    return process(request.body, key='{seed:08x}')\n"
+    return (line * (size // len(line) + 1))[:size].encode()
+
+
+def binary_corpus(size, seed):
+    return seed.to_bytes(8, "little") + os.urandom(max(0, size - 8))
+
+
+def png_bytes(width=64, height=64, seed=0):
+    """Small valid grayscale PNG, without needing Pillow."""
+    rows = b"".join(b"\0" + bytes((x * 7 + y * 13 + seed) % 256 for x in range(width)) for y in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+
+# --- Client side
+
+class ServerMonitor:
+    """Samples the server's RSS while a scenario runs."""
+
+    def __init__(self, pid):
+        self.proc = psutil.Process(pid)
+        self.peak_rss = 0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, self.proc.memory_info().rss)
+            await asyncio.sleep(0.05)
+
+    def start(self):
+        self.peak_rss = self.proc.memory_info().rss
+        self.cpu = sum(self.proc.cpu_times()[:2])
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+        return {
+            "server_peak_rss_mb": round(self.peak_rss / 1e6, 1),
+            "server_cpu_s": round(sum(self.proc.cpu_times()[:2]) - self.cpu, 2)
+        }
+
+
+async def drive(client, monitor, requests, concurrency, payload_bytes=0):
+    """Runs request coroutine factories with bounded concurrency."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def one(make):
+        async with semaphore:
+            t = time.perf_counter()
+            try:
+                response = await make(client)
+                if response.status_code != 200:
+                    errors.append(f"HTTP {response.status_code}")
+                else:
+                    latencies.append(time.perf_counter() - t)
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(make) for make in requests))
+    elapsed = time.perf_counter() - started
+    result = {
+        "requests": len(requests),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "elapsed_s": round(elapsed, 2),
+        **monitor.stop()
+    }
+    if payload_bytes:
+        result["throughput_mb_s"] = round(payload_bytes / elapsed / 1e6, 1)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def count_for(size, requests, budget=256 * 1024 * 1024):
+    # Fewer requests for big payloads so each size moves a similar volume
+    return max(4, min(requests, budget // size))
+
+
+async def run_file(client, monitor, args, results):
+    for size in map(parse_size, args.sizes.split(",")):
+        n = count_for(size, args.requests)
+        for kind, corpus in (("text", text_corpus), ("binary", binary_corpus)):
+            payloads = [corpus(size, seed) for seed in range(n)]
+
+            def upload(content, i):
+                name = f"sample_{i}.{'py' if kind == 'text' else 'bin'}"
+                return lambda c: c.post("/api/analyze/file", files={"file": (name, content)})
+
+            results[f"file_{kind}_{size}"] = await drive(
+                client, monitor, [upload(p, i) for i, p in enumerate(payloads)], args.concurrency, size * n)
+            # Same bytes again: verdict cache
+            results[f"file_{kind}_{size}_cached"] = await drive(
+                client, monitor, [upload(p, i) for i, p in enumerate(payloads)], args.concurrency, size * n)
+
+
+async def run_url(client, monitor, args, results):
+    urls = [f"http://host{i}.bench.example/path/{i}" for i in range(args.requests)]
+    results["url"] = await drive(
+        client, monitor, [lambda c, u=u: c.post("/api/analyze/url", json={"url": u}) for u in urls], args.concurrency)
+
+
+async def run_qr(client, monitor, args, results):
+    contents = [f"https://pay.example/{i}?amount={i * 3}" for i in range(args.requests)]
+    results["qr_text"] = await drive(
+        client, monitor, [lambda c, t=t: c.post("/api/analyze/qr-text", json={"content": t}) for t in contents], args.concurrency)
+    images = [png_bytes(seed=i) for i in range(args.requests)]
+    results["qr_image"] = await drive(
+        client, monitor, [lambda c, p=p: c.post("/api/analyze/qr", files={"file": ("qr.png", p, "image/png")}) for p in images],
+        args.concurrency)
+
+
+async def run_pcap(client, monitor, args, results):
+    from benchmarks.capture_replay import write_pcap
+    for packets in map(int, args.pcap_packets.split(",")):
+        path = os.path.join(args.workdir, f"bench_{packets}.pcap")
+        write_pcap(path, packets, 20000)
+        with open(path, "rb") as f:
+            data = f.read()
+        n = count_for(len(data), args.pcap_requests)
+        results[f"pcap_{packets}"] = await drive(
+            client, monitor, [lambda c: c.post("/api/analyze/pcap", files={"file": ("bench.pcap", data)})] * n,
+            max(1, min(args.concurrency, 4)), len(data) * n)
+        os.remove(path)
+
+
+async def run_ws(client, monitor, args, results):
+    from benchmarks.ws_fanout import client as ws_client
+    url = str(client.base_url).replace("http://", "ws://") + "/api/dashboard/ws/stream"
+    stats = {"connected": 0, "errors": 0, "frames": [], "bytes": 0, "last_error": None}
+    monitor.start()
+    await asyncio.gather(*(ws_client(url, args.ws_duration, stats) for _ in range(args.ws_clients)))
+    frames = sorted(stats["frames"])
+    results["ws_fanout"] = {
+        "clients": args.ws_clients,
+        "errors": stats["errors"],
+        "frames_total": sum(frames),
+        "frames_per_client_min": frames[0] if frames else 0,
+        "throughput_fps": round(sum(frames) / args.ws_duration, 1),
+        **monitor.stop()
+    }
+
+
+RUNNERS = {"file": run_file, "url": run_url, "qr": run_qr, "pcap": run_pcap, "ws": run_ws}
+
+
+async def run(args, port, server):
+    results = {}
+    monitor = ServerMonitor(server.pid)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits) as client:
+        for name in args.only.split(","):
+            print(f"running {name} ...", file=sys.stderr)
+            await RUNNERS[name](client, monitor, args, results)
+    return results
+
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Scenarios whose p99 or throughput regressed beyond the tolerance."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if current.get("p99_ms") and before.get("p99_ms") and current["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append({"scenario": name, "metric": "p99_ms", "before": before["p99_ms"], "after": current["p99_ms"]})
+        for metric in ("throughput_rps", "throughput_mb_s", "throughput_fps"):
+            if current.get(metric) is not None and before.get(metric) and current[metric] < before[metric] * (1 - tolerance):
+                regressions.append({"scenario": name, "metric": metric, "before": before[metric], "after": current[metric]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(SCENARIOS), help="comma-separated scenarios")
+    parser.add_argument("--requests", type=int, default=100, help="requests per small-payload scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sizes", default="1k,64k,1m,16m", help="upload corpus sizes")
+    parser.add_argument("--pcap-packets", default="1000,10000,100000")
+    parser.add_argument("--pcap-requests", type=int, default=20)
+    parser.add_argument("--ws-clients", type=int, default=500)
+    parser.add_argument("--ws-duration", type=float, default=10)
+    parser.add_argument("--vt-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--db-latency", type=float, default=0.02)
+    parser.add_argument("--out")
+    parser.add_argument("--compare")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    from benchmarks.vt_throughput import start_standin
+    args.workdir = tempfile.mkdtemp(prefix="cyberspy_bench_")
+    vt_port, port = free_port(), free_port()
+    start_standin(vt_port, args.vt_latency, 0.3, 100000)
+    server = start_server(args, port, f"http://127.0.0.1:{vt_port}/api/v3")
+    try:
+        scenarios = asyncio.run(run(args, port, server))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "version": git_version(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "standins": {"vt_latency": args.vt_latency, "gemini_latency": args.gemini_latency, "db_latency": args.db_latency}
+        },
+        "scenarios": scenarios
+    }
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(scenarios, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
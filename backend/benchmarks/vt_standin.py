@@ -0,0 +1,100 @@
+"""
+Local stand-in for the VirusTotal v3 API, for load testing without a key
+or quota. Unknown hashes/URLs return 404, submissions complete after
+--analysis-seconds, and requests above --rate per second get a 429 with a
+Retry-After header.
+
+    python benchmarks/vt_standin.py --port 8765
+    VIRUSTOTAL_API_URL=http://127.0.0.1:8765/api/v3 VIRUSTOTAL_API_KEY=test ...
+"""
+import time
+import uuid
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency=0.05, analysis_seconds=3.0, rate=50.0, malicious_ratio=0.2):
+    app = FastAPI()
+    known = {}     # sha256 / url id -> stats
+    analyses = {}  # analysis id -> (ready_at, object key)
+    bucket = {"tokens": rate, "updated": time.monotonic()}
+    app.state.counters = counters = {"requests": 0, "throttled": 0, "not_found": 0}
+
+    def verdict():
+        malicious = random.randint(1, 30) if random.random() < malicious_ratio else 0
+        return {"malicious": malicious, "suspicious": 0, "undetected": 70 - malicious, "harmless": 0}
+
+    def report(stats):
+        return {"data": {"attributes": {"last_analysis_stats": stats, "last_analysis_results": {}}}}
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        counters["requests"] += 1
+        now = time.monotonic()
+        bucket["tokens"] = min(rate, bucket["tokens"] + (now - bucket["updated"]) * rate)
+        bucket["updated"] = now
+        if bucket["tokens"] < 1:
+            counters["throttled"] += 1
+            return JSONResponse({"error": {"code": "QuotaExceededError"}}, status_code=429, headers={"Retry-After": "1"})
+        bucket["tokens"] -= 1
+        await asyncio.sleep(random.expovariate(1 / latency) if latency else 0)
+        return await call_next(request)
+
+    def lookup(key):
+        if key not in known:
+            counters["not_found"] += 1
+            return JSONResponse({"error": {"code": "NotFoundError"}}, status_code=404)
+        return report(known[key])
+
+    def submit(key):
+        analysis_id = uuid.uuid4().hex
+        analyses[analysis_id] = (time.monotonic() + analysis_seconds, key)
+        return {"data": {"type": "analysis", "id": analysis_id}}
+
+    @app.get("/api/v3/files/{sha256}")
+    async def get_file(sha256: str):
+        return lookup(sha256)
+
+    @app.post("/api/v3/files")
+    async def post_file(file: UploadFile = File(...)):
+        return submit(hashlib.sha256(await file.read()).hexdigest())
+
+    @app.get("/api/v3/urls/{url_id}")
+    async def get_url(url_id: str):
+        return lookup(url_id)
+
+    @app.post("/api/v3/urls")
+    async def post_url(url: str = Form(...)):
+        return submit(base64.urlsafe_b64encode(url.encode()).decode().strip("="))
+
+    @app.get("/api/v3/analyses/{analysis_id}")
+    async def get_analysis(analysis_id: str):
+        if analysis_id not in analyses:
+            return JSONResponse({"error": {"code": "NotFoundError"}}, status_code=404)
+        ready_at, key = analyses[analysis_id]
+        if time.monotonic() < ready_at:
+            return {"data": {"attributes": {"status": "queued"}}}
+        stats = known.setdefault(key, verdict())
+        return {"data": {"attributes": {"status": "completed", "stats": stats, "results": {}}}}
+
+    @app.get("/counters")
+    async def get_counters():
+        return counters
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response latency in seconds")
+    parser.add_argument("--analysis-seconds", type=float, default=3.0)
+    parser.add_argument("--rate", type=float, default=50.0, help="requests per second before 429s")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.analysis_seconds, args.rate), host="127.0.0.1", port=args.port, log_level="warning")
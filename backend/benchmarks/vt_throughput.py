@@ -0,0 +1,94 @@
+"""
+Throughput of VirusTotalService against the local stand-in server.
+
+Starts benchmarks/vt_standin.py in-process, fires --files concurrent
+scan_file calls for fresh content (upload + poll), then scans the same
+content again (hash lookups), then --duplicates concurrent scans of one
+new sample (which should coalesce into a single upload). Prints throughput,
+latency percentiles, server request counts and how many 429s the client
+absorbed.
+
+    cd backend && python -m benchmarks.vt_throughput --files 200
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def start_standin(port, latency, analysis_seconds, rate):
+    from benchmarks.vt_standin import create_app
+    app = create_app(latency, analysis_seconds, rate)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return app, server
+
+
+async def run_pass(vt, payloads):
+    latencies = []
+
+    async def one(i, content):
+        t = time.perf_counter()
+        result = await vt.scan_file(content, f"sample_{i}.bin")
+        latencies.append(time.perf_counter() - t)
+        return result
+
+    t = time.perf_counter()
+    results = await asyncio.gather(*(one(i, c) for i, c in enumerate(payloads)))
+    elapsed = time.perf_counter() - t
+    latencies.sort()
+    return {
+        "calls": len(payloads),
+        "seconds": round(elapsed, 2),
+        "per_second": round(len(payloads) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        "failed": sum(1 for r in results if not r or r["threats"] == ["Timeout/Error"]),
+    }
+
+
+async def main(args, standin):
+    from app.services.virustotal_service import VirusTotalService
+    vt = VirusTotalService()
+    payloads = [os.urandom(256) for _ in range(args.files)]
+    report = {
+        "upload_and_poll": await run_pass(vt, payloads),
+        "hash_lookup": await run_pass(vt, payloads),
+    }
+    before = standin.state.counters["requests"]
+    report["duplicates"] = await run_pass(vt, [os.urandom(256)] * args.duplicates)
+    report["duplicates"]["server_requests"] = standin.state.counters["requests"] - before
+    report["client"] = vt.status()
+    await vt.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--analysis-seconds", type=float, default=3.0)
+    parser.add_argument("--duplicates", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=200.0, help="stand-in requests per second before 429s")
+    parser.add_argument("--quota", type=float, default=None, help="client quota per minute (default: the stand-in rate)")
+    args = parser.parse_args()
+
+    standin, _ = start_standin(args.port, args.latency, args.analysis_seconds, args.rate)
+    os.environ["VIRUSTOTAL_API_URL"] = f"http://127.0.0.1:{args.port}/api/v3"
+    os.environ["VIRUSTOTAL_API_KEY"] = "standin-key"
+    os.environ.setdefault("VIRUSTOTAL_POLL_DEADLINE", "120")
+    os.environ["VIRUSTOTAL_QUOTA_PER_MINUTE"] = str(args.quota if args.quota is not None else args.rate * 60)
+
+    report = asyncio.run(main(args, standin))
+    report["server"] = dict(standin.state.counters)
+    print(json.dumps(report, indent=2))
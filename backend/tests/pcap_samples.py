@@ -0,0 +1,34 @@
+"""Sample packets and captures shared by the PCAP tests."""
+from scapy.all import Ether, IP, IPv6, IPv6ExtHdrHopByHop, TCP, UDP, DNS, DNSQR, ARP, Dot1Q, GRE, Raw, \
+    wrpcap, wrpcapng
+
+
+def eth(**fields):
+    # Explicit addresses: a bare Ether() makes Scapy resolve the MAC on the network
+    return Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02", **fields)
+
+
+def sample_packets():
+    """One of each shape the raw-header decoder has to handle or hand to Scapy."""
+    packets = [
+        eth() / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=1234, dport=80, flags="S"),
+        eth() / IP(src="10.0.0.2", dst="10.0.0.1") / TCP(sport=80, dport=1234, flags="SA") / Raw(b"x" * 300),
+        eth() / IP(src="10.0.0.1", dst="8.8.8.8") / UDP(sport=5353, dport=53) / DNS(qd=DNSQR(qname="example.com")),
+        eth() / IPv6(src="fe80::1", dst="fe80::2") / TCP(sport=40000, dport=443, flags="PA"),
+        eth() / Dot1Q(vlan=7) / IP(src="10.1.0.1", dst="10.1.0.2") / UDP(sport=1000, dport=2000),
+        eth() / IP(src="192.0.2.1", dst="192.0.2.2") / GRE() / IP(src="172.16.0.1", dst="172.16.0.2") / TCP(dport=22),
+        eth() / IPv6(src="fe80::1", dst="ff02::1") / IPv6ExtHdrHopByHop() / UDP(sport=1, dport=2),
+        eth() / IP(src="10.0.0.3", dst="10.0.0.4", frag=10, proto=6) / Raw(b"fragment"),
+        eth() / ARP(pdst="10.0.0.9"),
+        eth(type=0x88CC) / Raw(b"\0" * 40),
+    ]
+    for i, p in enumerate(packets):
+        p.time = 1700000000 + i * 0.25
+    return packets
+
+
+def write_capture(tmp_path, kind):
+    """The sample packets, three times over, as a pcap or pcapng file."""
+    path = str(tmp_path / f"sample.{kind}")
+    (wrpcap if kind == "pcap" else wrpcapng)(path, sample_packets() * 3)
+    return path
@@ -0,0 +1,205 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.ai_service import AIService, GEMINI_CONCURRENCY
+from app.services.window_service import Window
+
+
+class FakeModel:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def generate_content_async(self, contents, stream=False):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return SimpleNamespace(text=f"reply to {contents}")
+
+
+def test_concurrency_limit_across_event_loops():
+    service = AIService()
+    service.model = FakeModel()
+
+    async def burst():
+        return await asyncio.gather(*(service._generate(f"q{i}") for i in range(GEMINI_CONCURRENCY * 2)))
+
+    # The limiter is contended in both runs; one made at import would be
+    # bound to the first loop and fail in the second
+    for _ in range(2):
+        assert len(asyncio.run(burst())) == GEMINI_CONCURRENCY * 2
+    assert service.model.peak == GEMINI_CONCURRENCY
+
+
+class Upstream:
+    """
+    Stands in for the gRPC response stream under the SDK's real
+    AsyncGenerateContentResponse. A read that is cancelled is what makes
+    grpc.aio cancel the call, so that's what gets recorded.
+    """
+
+    def __init__(self, chunks, stall=False, drip=False):
+        self.chunks = chunks
+        self.stall = stall
+        self.drip = drip
+        self.cancelled = False
+
+    async def __aiter__(self):
+        from google.generativeai import protos
+        try:
+            for text in self.chunks:
+                yield protos.GenerateContentResponse(candidates=[
+                    protos.Candidate(content=protos.Content(role="model", parts=[protos.Part(text=text)]))
+                ])
+            while self.drip:
+                await asyncio.sleep(0.01)
+                yield protos.GenerateContentResponse(candidates=[
+                    protos.Candidate(content=protos.Content(role="model", parts=[protos.Part(text=".")]))
+                ])
+            if self.stall:
+                await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class StreamModel:
+    def __init__(self, upstream):
+        self.upstream = upstream
+
+    async def generate_content_async(self, contents, stream=False):
+        from google.generativeai.types.generation_types import AsyncGenerateContentResponse
+        return await AsyncGenerateContentResponse.from_aiterator(self.upstream)
+
+
+def stream_service(upstream):
+    pytest.importorskip("google.generativeai")
+    service = AIService()
+    service.model = StreamModel(upstream)
+    return service
+
+
+def test_stream_yields_chunks():
+    service = stream_service(Upstream(["a", "b", "c"]))
+
+    async def run():
+        return [text async for text in service.chat_stream("hi")]
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+
+
+def test_closing_stream_cancels_upstream_call():
+    upstream = Upstream(["a", "b", "c"], stall=True)
+    service = stream_service(upstream)
+
+    async def run():
+        stream = service.chat_stream("hi")
+        assert await anext(stream) == "a"
+        await asyncio.sleep(0.01)  # the reader is now waiting on the stalled call
+        await stream.aclose()
+        return service._get_semaphore()._value
+
+    assert asyncio.run(run()) == GEMINI_CONCURRENCY
+    assert upstream.cancelled
+
+
+def test_stalled_stream_times_out_and_frees_slot(monkeypatch):
+    monkeypatch.setattr("app.services.ai_service.GEMINI_TIMEOUT", 0.05)
+    # The SDK reads one chunk ahead, so "b" is held back while the call stalls
+    upstream = Upstream(["a", "b"], stall=True)
+    service = stream_service(upstream)
+
+    async def run():
+        received = []
+        try:
+            async for text in service.chat_stream("hi"):
+                received.append(text)
+        except asyncio.TimeoutError:
+            return received, service._get_semaphore()._value
+        raise AssertionError("stream did not time out")
+
+    assert asyncio.run(run()) == (["a"], GEMINI_CONCURRENCY)
+    assert upstream.cancelled
+
+
+def test_stream_total_deadline(monkeypatch):
+    monkeypatch.setattr("app.services.ai_service.GEMINI_STREAM_TIMEOUT", 0.05)
+    upstream = Upstream([], drip=True)
+    service = stream_service(upstream)
+
+    async def run():
+        try:
+            async for _ in service.chat_stream("hi"):
+                pass
+        except asyncio.TimeoutError:
+            return True
+
+    assert asyncio.run(run())
+    assert upstream.cancelled
+
+
+def test_stream_error_is_raised():
+    class Broken(Upstream):
+        async def __aiter__(self):
+            async for chunk in super().__aiter__():
+                yield chunk
+            raise RuntimeError("upstream failed")
+
+    service = stream_service(Broken(["a"]))
+
+    async def run():
+        received = []
+        try:
+            async for text in service.chat_stream("hi"):
+                received.append(text)
+        except RuntimeError as e:
+            return received, str(e)
+
+    assert asyncio.run(run()) == (["a"], "upstream failed")
+
+
+def test_window_verdicts_are_merged():
+    verdicts = {
+        "head": {"risk_score": 10, "summary": "Config loader.", "threats": ["Shell Use"],
+                 "technical_details": {"vulnerabilities": ["eval"], "recommendation": "Review."}},
+        "payload": {"risk_score": 80, "summary": "Encoded dropper.", "threats": ["Dropper", "Shell Use"],
+                    "technical_details": {"vulnerabilities": ["base64 exec"], "recommendation": "Quarantine."}},
+        "silent": AIService._fallback_verdict(),
+    }
+    service = AIService()
+    service.model = object()
+
+    async def analyze_text(text, filename, location=""):
+        return verdicts[text]
+
+    service.analyze_text = analyze_text
+    windows = []
+    for i, text in enumerate(verdicts):
+        window = Window(i, i * 8000, 8000, 0.5, {})
+        window.text = text
+        windows.append(window)
+
+    merged = asyncio.run(service.analyze_windows(windows, 40, "a.js"))
+    # The riskiest answered window sets the verdict; the unanswered one adds nothing
+    assert merged["risk_score"] == 80
+    assert merged["summary"].startswith("Encoded dropper.") and "byte 8000" in merged["summary"]
+    assert merged["threats"] == ["Shell Use", "Dropper"]
+    assert merged["technical_details"]["vulnerabilities"] == ["eval", "base64 exec"]
+    assert merged["technical_details"]["recommendation"] == "Quarantine."
+    assert merged["technical_details"]["windows_total"] == 40
+    assert [w["risk_score"] for w in merged["technical_details"]["windows"]] == [10, 80, 65]
+
+
+def test_no_answered_window_is_the_fallback():
+    service = AIService()
+    service.model = object()
+
+    async def analyze_text(text, filename, location=""):
+        return AIService._fallback_verdict()
+
+    service.analyze_text = analyze_text
+    windows = [Window(i, i * 8000, 8000, 0.5, {}) for i in range(2)]
+    assert service.is_fallback(asyncio.run(service.analyze_windows(windows, 10, "a.js")))
@@ -0,0 +1,30 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.storage_service import storage_service
+from app.services.cache_service import verdict_cache
+
+
+def test_batch_url_and_hash_verdicts_are_saved():
+    known = "e3" * 32
+    verdict_cache.set(known, {"source": "Gemini AI", "risk_score": 40, "filename": "x"})
+    with TestClient(app) as client:
+        before = storage_service.counters["queued"]
+        response = client.post("/api/analyze/batch", json={
+            "urls": ["http://example.test/a", "http://evil.example.test/b"],
+            "hashes": ["ab" * 32, known]
+        })
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert events[-1] == {"event": "done", "count": 4, "failed": 0}
+        # The cached hash was stored when it was first analysed
+        assert storage_service.counters["queued"] - before == 3
+
+        client.post("/api/analyze/url", json={"url": "http://example.test/c"})
+        assert storage_service.counters["queued"] - before == 4
+        client.portal.call(storage_service.flush)
+
+    page = storage_service.query_analyses({"filename": "http://evil.example.test/b"})
+    assert [row["source"] for row in page["items"]] == ["CyberSpy Heuristics (Mock)"]
+    assert storage_service.query_analyses({"content_hash": "ab" * 32})["items"][0]["source"] == "VirusTotal (Unknown)"
@@ -0,0 +1,117 @@
+import os
+import time
+
+from app.services.blocklist_service import BlocklistService, build_index, classify
+
+
+def write_feed(directory, name, lines):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def test_classify_cidr():
+    assert classify("10.0.0.0/8") == ("cidr", "10.0.0.0/8")
+    assert classify("192.168.1.7/24") == ("cidr", "192.168.1.0/24")
+    assert classify("203.0.113.9/32") == ("ip", "203.0.113.9")
+    assert classify("2001:db8::/32") == ("cidr", "2001:db8::/32")
+    assert classify("bad.example/login")[0] == "url"
+
+
+def test_cidr_lookup(tmp_path):
+    feeds = tmp_path / "feeds"
+    write_feed(feeds, "drop.txt", ["10.0.0.0/8", "198.51.100.0/24", "2001:db8::/32", "evil.example"])
+    service = BlocklistService(str(feeds), str(tmp_path / "blocklist.idx"))
+    service.refresh()
+
+    assert service.check_url("http://10.20.30.40/x") == {"match": "10.0.0.0/8", "kind": "cidr", "feed": "drop.txt"}
+    assert service.check_url("http://198.51.100.77/")["match"] == "198.51.100.0/24"
+    assert service.check_url("http://[2001:db8::1]/")["match"] == "2001:db8::/32"
+    assert service.check_url("http://198.51.101.1/") is None
+    assert service.check_url("http://11.0.0.1/") is None
+    # Not indexed as a URL prefix either
+    assert service.index.counts()["url"] == 0
+
+
+def test_nothing_built_at_construction(tmp_path):
+    feeds = tmp_path / "feeds"
+    write_feed(feeds, "domains.txt", ["evil.example"])
+    index_path = tmp_path / "blocklist.idx"
+    service = BlocklistService(str(feeds), str(index_path))
+    assert not index_path.exists() and not service.loaded
+
+    service.warm_up()
+    assert service.check_url("https://a.evil.example/")["match"] == "evil.example"
+
+
+def test_existing_index_with_empty_feed_dir(tmp_path):
+    feeds = tmp_path / "feeds"
+    index_path = str(tmp_path / "blocklist.idx")
+    build_index([write_feed(tmp_path / "old", "domains.txt", ["evil.example"])], index_path)
+    os.makedirs(feeds)
+
+    service = BlocklistService(str(feeds), index_path)
+    service.refresh()
+    assert service.loaded
+    assert service.check_url("http://evil.example/")["feed"] == "domains.txt"
+
+
+def test_first_lookup_maps_existing_index(tmp_path):
+    feeds = tmp_path / "feeds"
+    index_path = str(tmp_path / "blocklist.idx")
+    build_index([write_feed(feeds, "domains.txt", ["evil.example"])], index_path)
+
+    service = BlocklistService(str(feeds), index_path)
+    assert service.check_url("http://evil.example/")["feed"] == "domains.txt"
+    # Background check of the feeds finishes without rebuilding
+    deadline = time.monotonic() + 5
+    while service._lock.locked() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service.loaded
+
+
+def test_old_format_index_is_rebuilt(tmp_path):
+    feeds = tmp_path / "feeds"
+    write_feed(feeds, "drop.txt", ["10.0.0.0/8"])
+    index_path = tmp_path / "blocklist.idx"
+    index_path.write_bytes(b"CSBLIDX1" + b"\0" * 64)
+    os.utime(index_path, (time.time() + 60, time.time() + 60))
+
+    service = BlocklistService(str(feeds), str(index_path))
+    service.refresh()
+    assert service.check_url("http://10.1.2.3/")["kind"] == "cidr"
+
+
+def test_malformed_feed_line_is_skipped(tmp_path):
+    feeds = tmp_path / "feeds"
+    write_feed(feeds, "mixed.txt", ["evil.example", "http://[broken/x", "bad.example/login"])
+    service = BlocklistService(str(feeds), str(tmp_path / "blocklist.idx"))
+    service.refresh()
+
+    assert service.loaded
+    assert service.status()["invalid_lines"] == 1
+    assert service.check_url("http://evil.example/")["kind"] == "domain"
+    assert service.check_url("http://bad.example/login")["kind"] == "url"
+
+
+def test_malformed_url_is_not_a_match(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services import blocklist_service as module
+
+    feeds = tmp_path / "feeds"
+    write_feed(feeds, "domains.txt", ["evil.example"])
+    service = BlocklistService(str(feeds), str(tmp_path / "blocklist.idx"))
+    service.refresh()
+    assert service.check_url("http://[bad/") is None
+
+    # The request falls through to VirusTotal/heuristics instead of a 500
+    monkeypatch.setattr(module.blocklist_service, "index", service.index)
+    monkeypatch.setattr(module.blocklist_service, "_mapped", True)
+    monkeypatch.setattr(module.blocklist_service, "_checked", float("inf"))
+    with TestClient(app) as client:
+        response = client.post("/api/analyze/url", json={"url": "http://[bad/"})
+    assert response.status_code == 200
+    assert response.json()["risk_score"] == 0
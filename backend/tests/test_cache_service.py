@@ -0,0 +1,79 @@
+import time
+import threading
+
+from app.services.cache_service import TTLCache, VerdictCache
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(4)
+    cache.set("a", 1, ttl=0.05)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def _cache(tmp_path, monkeypatch, **env):
+    monkeypatch.setenv("VERDICT_CACHE_PATH", str(tmp_path / "verdicts.db"))
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return VerdictCache()
+
+
+def test_every_local_source_has_its_own_ttl(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, monkeypatch, VERDICT_TTL_CYBERSPY_TRIAGE="120")
+    assert cache.ttl_for("CyberSpy Signatures") == 24 * 3600
+    assert cache.ttl_for("CyberSpy Triage") == 120
+    assert cache.ttl_for("Something Else") == cache.default_ttl
+
+
+def test_disk_tier_survives_restart_and_honours_ttl(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, monkeypatch, VERDICT_TTL_VIRUSTOTAL__CLEAN="1")
+    cache.set("a" * 64, {"source": "Gemini AI", "risk_score": 10})
+    cache.set("b" * 64, {"source": "VirusTotal (Clean)", "risk_score": 0})
+
+    restarted = VerdictCache()
+    assert restarted.get("a" * 64) == ({"source": "Gemini AI", "risk_score": 10}, "disk")
+    assert restarted.get("a" * 64)[1] == "memory"
+    time.sleep(1.05)
+    assert restarted.get("b" * 64) is None
+    assert restarted.stats()["hits"] == {"memory": 1, "disk": 1}
+    assert restarted.stats()["misses"] == 1
+
+
+def test_disk_tier_trims_least_recently_used(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, monkeypatch)
+    cache.max_bytes = 1000
+    for i in range(20):
+        cache.set(f"{i:064x}", {"source": "Gemini AI", "summary": "x" * 80})
+    assert cache.stats()["disk_bytes"] <= 1000
+    cache.memory = type(cache.memory)(1024)
+    assert cache.get(f"{19:064x}") is not None
+    assert cache.get(f"{0:064x}") is None
+
+
+def test_counters_are_exact_under_threads(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, monkeypatch)
+    cache.set("c" * 64, {"source": "Gemini AI"})
+
+    def worker():
+        for _ in range(2000):
+            cache.get("c" * 64)
+            cache.get("d" * 64)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = cache.stats()
+    assert stats["hits"]["memory"] == 16000 and stats["misses"] == 16000
@@ -0,0 +1,39 @@
+import struct
+import time
+
+from app.services.capture_service import CaptureEngine
+
+PCAP_HEADER = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+
+
+def wait_stopped(engine, timeout=5):
+    deadline = time.monotonic() + timeout
+    while engine.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return not engine.running
+
+
+def test_empty_capture_stops_with_error(tmp_path):
+    path = tmp_path / "empty.pcap"
+    path.write_bytes(PCAP_HEADER)
+    engine = CaptureEngine(f"pcap:{path}", "max")
+    engine.start(lambda summary: None)
+    try:
+        assert wait_stopped(engine)
+    finally:
+        engine.stop()
+    assert "no packets" in engine.error
+
+
+def test_replay_loops_over_a_capture_with_packets(tmp_path):
+    frame = bytes(60)
+    path = tmp_path / "one.pcap"
+    path.write_bytes(PCAP_HEADER + struct.pack("<IIII", 1, 0, len(frame), len(frame)) + frame)
+    engine = CaptureEngine(f"pcap:{path}", "max")
+    engine.start(lambda summary: None)
+    try:
+        time.sleep(0.2)
+        assert engine.running and engine.error is None
+        assert engine.counters["captured"] > 1
+    finally:
+        engine.stop()
@@ -0,0 +1,63 @@
+import asyncio
+
+from app.services.ai_service import ai_service, CHAT_OFFLINE_REPLY
+from app.services.chat_service import ChatService, ChatSession
+
+
+def test_failed_replies_stay_out_of_history(monkeypatch):
+    replies = iter([CHAT_OFFLINE_REPLY, "Error: AI Core did not answer in time.", "Port 445 is SMB."])
+
+    async def chat(message, context="", history=None):
+        return next(replies)
+
+    monkeypatch.setattr(ai_service, "chat", chat)
+    service = ChatService()
+
+    async def run():
+        session_id, _ = await service.reply("what is 445?", "")
+        await service.reply("what is 445?", "", session_id)
+        await service.reply("what is 445?", "", session_id)
+        return service.session(session_id)[1].history()
+
+    assert asyncio.run(run()) == [
+        {"role": "user", "parts": ["what is 445?"]},
+        {"role": "model", "parts": ["Port 445 is SMB."]},
+    ]
+
+
+def test_offline_stream_stays_out_of_history(monkeypatch):
+    async def chat_stream(message, context="", history=None):
+        yield CHAT_OFFLINE_REPLY
+
+    monkeypatch.setattr(ai_service, "chat_stream", chat_stream)
+    service = ChatService()
+
+    async def run():
+        events = [event async for event in service.stream("hi", "")]
+        return events[-1], service.session(events[-1][1]["session_id"])[1].history()
+
+    (event, _), history = asyncio.run(run())
+    assert event == "done" and history == []
+
+
+def test_trimmed_history_starts_with_user_turn(monkeypatch):
+    monkeypatch.setattr("app.services.chat_service.CHAT_HISTORY_TOKENS", 100)
+    session = ChatSession()
+    session.add("short question", "short answer")
+    # Trimming single turns would drop just "short question" here and leave
+    # the history starting with a model turn
+    session.add("why?", "x" * 360)
+
+    assert session.history() == [
+        {"role": "user", "parts": ["why?"]},
+        {"role": "model", "parts": ["x" * 360]},
+    ]
+
+
+def test_exchange_over_budget_on_its_own_is_dropped(monkeypatch):
+    monkeypatch.setattr("app.services.chat_service.CHAT_HISTORY_TOKENS", 10)
+    session = ChatSession()
+    session.add("hi", "z" * 400)
+    assert session.history() == []
+    session.add("hi", "hello")
+    assert [turn["role"] for turn in session.history()] == ["user", "model"]
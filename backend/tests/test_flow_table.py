@@ -0,0 +1,47 @@
+import ipaddress
+import numpy as np
+
+from app.services.flow_table import FlowTable, TCP_SYN, TCP_ACK, SCAN_MIN_TARGETS
+from app.services.pcap_decoder import PACKET_DTYPE
+
+
+def _addr(ip):
+    return ipaddress.IPv6Address("::ffff:" + ip).packed
+
+
+def packets(rows, start=0):
+    """rows: (src, dst, sport, dport, proto, tcp_flags)"""
+    pkts = np.zeros(len(rows), dtype=PACKET_DTYPE)
+    for i, (src, dst, sport, dport, proto, flags) in enumerate(rows):
+        pkts[i] = (float(start + i), 60, 60, 1, 0x0800, 4, proto, _addr(src), _addr(dst), sport, dport, flags, 0, 0)
+    return pkts
+
+
+def test_syn_scan_is_detected():
+    table = FlowTable()
+    table.add_packets(packets([("10.0.0.5", "10.0.0.9", 40000, port, 6, TCP_SYN) for port in range(1, 201)]))
+    detections = table.detect()
+    assert [d["type"] for d in detections] == ["Port Scan"]
+    assert detections[0]["targets"] == 200
+
+
+def test_udp_lookups_do_not_make_half_open_connects_a_scan():
+    rows = [("10.0.0.5", f"10.0.{i // 250}.{i % 250 + 1}", 50000 + i, 53, 17, 0) for i in range(SCAN_MIN_TARGETS * 4)]
+    rows += [("10.0.0.5", "10.0.0.9", 40000 + i, 443, 6, TCP_SYN) for i in range(3)]
+    table = FlowTable()
+    table.add_packets(packets(rows))
+    assert table.detect() == []
+    host = table.hosts()[0]
+    assert host["dst_targets"] > SCAN_MIN_TARGETS and host["syn_without_ack_ratio"] == 1.0
+
+
+def test_merge_matches_single_table():
+    rows = [("10.0.0.%d" % (i % 7 + 1), "10.0.1.1", 1000 + i, 80, 6, TCP_SYN if i % 2 else TCP_SYN | TCP_ACK)
+            for i in range(100)]
+    whole = FlowTable()
+    whole.add_packets(packets(rows))
+    left, right = FlowTable(), FlowTable()
+    left.add_packets(packets(rows[:50]))
+    right.add_packets(packets(rows[50:], start=50))
+    left.merge(right)
+    assert whole.hosts() == left.hosts()
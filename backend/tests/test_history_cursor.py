@@ -0,0 +1,82 @@
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.storage_service import (
+    SQLiteBackend, StorageService, SupabaseBackend, decode_cursor, encode_cursor
+)
+
+
+def make_cursor(created_at, row_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode()
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = StorageService()
+    service.backend = SQLiteBackend(str(tmp_path / "history.db"))
+    return service
+
+
+def test_keyset_round_trip(service):
+    records = []
+    for i in range(7):
+        record = StorageService._record({"filename": f"f{i}", "source": "test"})
+        # Several rows share a timestamp: the id breaks the tie
+        record["created_at"] = f"2024-05-0{1 + i // 3}T12:00:00+00:00"
+        records.append(record)
+    service.backend.insert_many(records)
+
+    seen, cursor = [], None
+    while True:
+        page = service.query_analyses({"source": "test"}, cursor, limit=2)
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        assert decode_cursor(cursor) == (page["items"][-1]["created_at"], page["items"][-1]["id"])
+
+    expected = sorted(records, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    assert [r["id"] for r in seen] == [r["id"] for r in expected]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    make_cursor("2024-05-01T12:00:00+00:00,id.gt.0)", "1"),
+    make_cursor("2024-05-01T12:00:00+00:00", "1),or(id.gt.0"),
+    make_cursor("yesterday", "1"),
+    make_cursor("2024-05-01T12:00:00+00:00", "²"),
+])
+def test_bad_cursor_rejected(service, cursor):
+    with pytest.raises(ValueError):
+        service.query_analyses({}, cursor)
+
+
+def test_bad_cursor_is_400():
+    with TestClient(app) as client:
+        response = client.get("/api/history/", params={"cursor": make_cursor("x", "y")})
+    assert response.status_code == 400
+
+
+def test_supabase_cursor_values_are_quoted():
+    calls = []
+
+    class Query:
+        def __getattr__(self, name):
+            def method(*args, **kwargs):
+                calls.append((name, args))
+                return self
+            return method
+
+        def execute(self):
+            return type("Result", (), {"data": []})()
+
+    client = type("Client", (), {"table": lambda self, name: Query()})()
+    row = {"created_at": "2024-05-01T12:00:00+00:00", "id": "0b7f0a4e-8a38-4f0c-9d6e-3b1b1f7b8c11"}
+    SupabaseBackend(client).query({}, decode_cursor(encode_cursor(row)), 10)
+    [expression] = [args[0] for name, args in calls if name == "or_"]
+    assert expression == ('created_at.lt."2024-05-01T12:00:00+00:00",'
+                          'and(created_at.eq."2024-05-01T12:00:00+00:00",id.lt."0b7f0a4e-8a38-4f0c-9d6e-3b1b1f7b8c11")')
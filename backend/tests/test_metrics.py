@@ -0,0 +1,37 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.stream_hub import StreamHub
+
+TOTALS = (
+    "cyberspy_ws_events_published_total", "cyberspy_ws_events_dropped_total", "cyberspy_virustotal_coalesced_total",
+    "cyberspy_storage_records_total", "cyberspy_chat_streams_total", "cyberspy_capture_packets_total",
+)
+
+
+def test_service_totals_are_counters():
+    with TestClient(app) as client:
+        client.get("/")
+        text = client.get("/metrics").text
+    for name in TOTALS:
+        assert f"# TYPE {name} counter" in text
+    assert 'cyberspy_storage_records_total{event="queued"}' in text
+    assert "# TYPE cyberspy_storage_pending gauge" in text
+    assert 'cyberspy_http_request_seconds_count{method="GET",route="/",status="200"}' in text
+
+
+def test_dropped_total_survives_disconnect():
+    async def run():
+        hub = StreamHub(queue_size=2)
+        sub = hub.subscribe()
+        hub._producer.cancel()
+        for i in range(5):
+            hub.publish({"i": i})
+        before = hub.dropped_total()
+        hub.unsubscribe(sub)
+        hub.unsubscribe(sub)
+        return before, hub.dropped_total()
+
+    assert asyncio.run(run()) == (3, 3)
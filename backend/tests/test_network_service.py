@@ -0,0 +1,143 @@
+from app.services.network_service import (
+    diff_networks, parse_iw_scan, parse_netsh, parse_nmcli, parse_proc_wireless, read_sys_interfaces, summarize
+)
+
+NETSH = """
+Interface name : Wi-Fi
+There are 3 networks currently visible.
+
+SSID 1 : HomeNet
+    Network type            : Infrastructure
+    Authentication          : WPA2-Personal
+    Encryption              : CCMP
+    BSSID 1                 : 00:11:22:AA:BB:01
+         Signal             : 88%
+         Radio type         : 802.11ac
+         Channel            : 36
+    BSSID 2                 : 00:11:22:AA:BB:02
+         Signal             : 41%
+         Radio type         : 802.11n
+         Channel            : 6
+
+SSID 2 : Cafe Guest
+    Network type            : Infrastructure
+    Authentication          : Open
+    Encryption              : None
+    BSSID 1                 : 66:77:88:99:AA:BB
+         Signal             : 60%
+
+SSID 3 :
+    Network type            : Infrastructure
+    Authentication          : WPA3-Personal
+    Encryption              : CCMP
+    BSSID 1                 : 10:20:30:40:50:60
+         Signal             : 15%
+"""
+
+NMCLI = "\n".join([
+    r"HomeNet:00\:11\:22\:AA\:BB\:01:88:WPA2",
+    r"Cafe Guest:66\:77\:88\:99\:AA\:BB:60:",
+    r"Lab\:5G:DE\:AD\:BE\:EF\:00\:01:47:WPA1 WPA2",
+    r"Old:12\:34\:56\:78\:9A\:BC:--:WEP",
+    "garbage line",
+])
+
+IW = """BSS 00:11:22:aa:bb:01(on wlan0) -- associated
+	TSF: 1234 usec (0d, 00:00:00)
+	freq: 5180
+	signal: -55.00 dBm
+	last seen: 20 ms ago
+	capability: ESS Privacy ShortSlotTime (0x0411)
+	SSID: HomeNet
+	RSN:	 * Version: 1
+		 * Group cipher: CCMP
+BSS 66:77:88:99:aa:bb(on wlan0)
+	signal: -70.00 dBm
+	capability: ESS ShortSlotTime (0x0401)
+	SSID: Cafe Guest
+BSS 12:34:56:78:9a:bc(on wlan0)
+	signal: -120.00 dBm
+	capability: ESS Privacy (0x0011)
+	SSID: Old
+BSS de:ad:be:ef:00:01(on wlan0)
+	signal: -60.00 dBm
+	capability: ESS Privacy (0x0011)
+	SSID: Legacy
+	WPA:	 * Version: 1
+"""
+
+PROC_WIRELESS = """Inter-| sta-|   Quality        |   Discarded packets               | Missed | WE
+ face | tus | link level noise |  nwid  crypt   frag  retry   misc | beacon | 22
+ wlan0: 0000   56.  -54.  -256        0      0      0      0      0        0
+"""
+
+
+def test_parse_netsh():
+    networks = parse_netsh(NETSH)
+    assert [(n["ssid"], n["bssid"], n["signal"], n["security"]) for n in networks] == [
+        ("HomeNet", "00:11:22:aa:bb:01", 88, "WPA2-PERSONAL"),
+        ("HomeNet", "00:11:22:aa:bb:02", 41, "WPA2-PERSONAL"),
+        ("Cafe Guest", "66:77:88:99:aa:bb", 60, "OPEN"),
+        ("", "10:20:30:40:50:60", 15, "WPA3-PERSONAL"),
+    ]
+
+
+def test_parse_nmcli():
+    networks = parse_nmcli(NMCLI)
+    assert [(n["ssid"], n["bssid"], n["signal"], n["security"]) for n in networks] == [
+        ("HomeNet", "00:11:22:aa:bb:01", 88, "WPA2"),
+        ("Cafe Guest", "66:77:88:99:aa:bb", 60, "OPEN"),
+        ("Lab:5G", "de:ad:be:ef:00:01", 47, "WPA1/WPA2"),
+        ("Old", "12:34:56:78:9a:bc", None, "WEP"),
+    ]
+
+
+def test_parse_iw_scan():
+    networks = parse_iw_scan(IW)
+    assert [(n["ssid"], n["bssid"], n["signal"], n["security"]) for n in networks] == [
+        ("HomeNet", "00:11:22:aa:bb:01", 90, "WPA2"),
+        ("Cafe Guest", "66:77:88:99:aa:bb", 60, "OPEN"),
+        ("Old", "12:34:56:78:9a:bc", 0, "WEP"),
+        ("Legacy", "de:ad:be:ef:00:01", 80, "WPA"),
+    ]
+
+
+def test_parsers_agree_on_summary():
+    # The same air seen through each tool gives the same dashboard rows
+    for networks in (parse_netsh(NETSH), parse_nmcli(NMCLI), parse_iw_scan(IW)):
+        rows = {r["ssid"]: r for r in summarize(networks)}
+        assert rows["HomeNet"]["status"] == "Trusted"
+        assert rows["Cafe Guest"]["status"] == "Danger"
+        assert "" not in rows
+
+
+def test_summarize_keeps_strongest_bssid():
+    rows = summarize(parse_netsh(NETSH))
+    assert rows[0] == {"ssid": "HomeNet", "security": "WPA2-PERSONAL", "signal": 88, "status": "Trusted"}
+    assert [r["ssid"] for r in rows] == ["HomeNet", "Cafe Guest"]
+
+
+def test_diff_networks():
+    before = summarize(parse_netsh(NETSH))
+    after = [dict(r) for r in before if r["ssid"] != "Cafe Guest"]
+    after[0]["signal"] -= 5
+    after.append({"ssid": "New", "security": "OPEN", "signal": 30, "status": "Danger"})
+    assert diff_networks(before, after) == {"added": ["New"], "removed": ["Cafe Guest"], "changed": []}
+
+    after[0]["signal"] -= 10
+    assert [c["ssid"] for c in diff_networks(before, after)["changed"]] == ["HomeNet"]
+
+
+def test_parse_proc_wireless():
+    assert parse_proc_wireless(PROC_WIRELESS) == {"wlan0": 80}
+
+
+def test_read_sys_interfaces(tmp_path):
+    (tmp_path / "wlan0" / "wireless").mkdir(parents=True)
+    (tmp_path / "wlan0" / "operstate").write_text("up\n")
+    (tmp_path / "eth0").mkdir()
+    assert read_sys_interfaces(str(tmp_path)) == {
+        "wlan0": {"wireless": True, "operstate": "up"},
+        "eth0": {"wireless": False, "operstate": "unknown"},
+    }
+    assert read_sys_interfaces(str(tmp_path / "missing")) == {}
@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip("scapy.all")
+from scapy.all import TCP, UDP, DNS, rdpcap
+
+from app.services.pcap_reader import iter_records
+from app.services.pcap_service import PCAPStats
+from pcap_samples import write_capture
+
+
+def scapy_protocols(packets):
+    counts = {"TCP": 0, "UDP": 0, "DNS": 0, "HTTP": 0, "Other": 0}
+    for p in packets:
+        if p.haslayer(TCP):
+            counts["TCP"] += 1
+        elif p.haslayer(UDP):
+            counts["UDP"] += 1
+        elif p.haslayer(DNS):
+            counts["DNS"] += 1
+        else:
+            counts["Other"] += 1
+    return counts
+
+
+@pytest.fixture(params=["pcap", "pcapng"])
+def capture(request, tmp_path):
+    return write_capture(tmp_path, request.param)
+
+
+def test_protocol_counts_match_scapy(capture):
+    stats = PCAPStats()
+    with open(capture, "rb") as f:
+        stats.add_records(list(iter_records(f)))
+    assert stats.protocols == scapy_protocols(rdpcap(capture))
+    assert stats.dissected > 0  # tunnel, extension header and fragment went to Scapy
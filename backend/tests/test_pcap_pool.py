@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+pytest.importorskip("scapy.all")
+from scapy.all import IP, UDP, Raw, wrpcap, wrpcapng
+
+from app.services.pcap_reader import PcapFormatError, iter_records, split_ranges, read_range
+from pcap_samples import eth, sample_packets
+
+
+@pytest.mark.parametrize("writer", [wrpcap, wrpcapng])
+def test_split_ranges_resync_on_record_boundaries(tmp_path, writer):
+    rng = random.Random(7)
+    packets = []
+    for i in range(4000):
+        # Random payloads, so a cut point can land inside data that looks like headers
+        p = eth() / IP(src="10.0.0.1", dst=f"10.0.{i % 200}.1") / UDP(sport=1000 + i % 50, dport=53) \
+            / Raw(rng.randbytes(rng.randint(0, 600)))
+        p.time = 1700000000 + i * 0.001
+        packets.append(p)
+    path = str(tmp_path / "big.cap")
+    writer(path, packets)
+
+    with open(path, "rb") as f:
+        expected = list(iter_records(f))
+    prefix, ranges = split_ranges(path, 5)
+    assert len(ranges) == 5
+    assert ranges[0][0] == len(prefix) and ranges[-1][1] == len(open(path, "rb").read())
+    parsed = [record for start, end in ranges for batch in read_range(path, prefix, start, end) for record in batch]
+    assert parsed == expected
+
+
+def test_read_range_rejects_a_misaligned_cut(tmp_path):
+    path = str(tmp_path / "small.pcap")
+    wrpcap(path, sample_packets() * 20)
+    prefix, ranges = split_ranges(path, 2)
+    start, end = ranges[1]
+    with pytest.raises(PcapFormatError):
+        for _ in read_range(path, prefix, start + 3, end):
+            pass
+
+
+def test_shutdown_stops_the_worker_pool():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.pcap_service import pcap_service
+
+    with TestClient(app):
+        pool = pcap_service._get_pool()
+        assert pool.submit(sum, [1, 2]).result(60) == 3
+    assert pcap_service._pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(sum, [1])
@@ -0,0 +1,59 @@
+import io
+import random
+
+import pytest
+
+pytest.importorskip("scapy.all")
+from scapy.all import rdpcap, wrpcap
+
+from app.services.pcap_reader import PcapStreamReader, PcapFormatError, iter_records
+from pcap_samples import sample_packets, write_capture
+
+
+@pytest.fixture(params=["pcap", "pcapng"])
+def capture(request, tmp_path):
+    return write_capture(tmp_path, request.param)
+
+
+def test_reader_matches_rdpcap(capture):
+    expected = rdpcap(capture)
+    with open(capture, "rb") as f:
+        records = list(iter_records(f))
+    assert len(records) == len(expected)
+    for (ts, linktype, data, wirelen), p in zip(records, expected):
+        assert data == bytes(p)
+        assert ts == pytest.approx(float(p.time), abs=1e-6)
+        assert wirelen == len(p)
+
+
+def test_reader_is_independent_of_chunking(capture):
+    with open(capture, "rb") as f:
+        blob = f.read()
+    whole = list(iter_records(io.BytesIO(blob)))
+    reader = PcapStreamReader()
+    pieces = []
+    rng = random.Random(1)
+    pos = 0
+    while pos < len(blob):
+        step = rng.randint(1, 97)
+        pieces += reader.feed(blob[pos:pos + step])
+        pos += step
+    reader.close()
+    assert pieces == whole and not reader.truncated
+
+
+def test_truncated_capture_keeps_complete_records(tmp_path):
+    path = str(tmp_path / "cut.pcap")
+    wrpcap(path, sample_packets())
+    with open(path, "rb") as f:
+        blob = f.read()
+    reader = PcapStreamReader()
+    records = reader.feed(blob[:-10])
+    reader.close()
+    assert reader.truncated and len(records) == len(sample_packets()) - 1
+
+
+def test_not_a_capture():
+    reader = PcapStreamReader()
+    with pytest.raises(PcapFormatError):
+        reader.feed(b"hello world, this is not a capture file at all")
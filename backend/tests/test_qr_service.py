@@ -0,0 +1,63 @@
+import io
+import hashlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.qr_service import QR_PHASH_DISTANCE, DecodedImage, PerceptualCache, QRService, difference_hash
+
+cv2 = pytest.importorskip("cv2")
+
+
+def qr_image(text, side=400):
+    code = cv2.resize(cv2.QRCodeEncoder.create().encode(text), (side, side), interpolation=cv2.INTER_NEAREST)
+    return np.pad(code, 40, constant_values=255)
+
+
+def encode(gray, fmt="PNG"):
+    out = io.BytesIO()
+    Image.fromarray(gray).save(out, fmt)
+    return out.getvalue()
+
+
+def as_decoded(gray, data):
+    return DecodedImage([], None, difference_hash(gray), data, "image/png", hashlib.sha256(data).hexdigest())
+
+
+def test_distinct_codes_do_not_match():
+    hashes = np.array([difference_hash(qr_image(f"https://site{i}.example/login?id={i * 7919}")) for i in range(60)])
+    distances = np.unpackbits(hashes[:, None, :] ^ hashes[None, :, :], axis=2).sum(axis=2)
+    np.fill_diagonal(distances, 256)
+    assert distances.min() > QR_PHASH_DISTANCE
+
+
+def test_only_the_same_file_gets_the_verdict_as_its_own():
+    service = QRService()
+    gray = qr_image("https://site0.example/login")
+    original = as_decoded(gray, encode(gray))
+    verdict = {"decoded_content": "https://site0.example/login", "risk_score": 80, "summary": "Phishing page."}
+    service.remember(original, verdict)
+
+    assert service.cached_verdict(as_decoded(gray, encode(gray))) == {**verdict, "cached": True}
+
+    # Same pixels, another file: a hit, but not presented as this file's own verdict
+    near = service.cached_verdict(as_decoded(gray, encode(gray, "BMP")))
+    assert near["near_duplicate"] is True
+    assert near["near_duplicate_of"] == original.sha256
+    assert near["summary"].endswith("Phishing page.")
+
+    other = qr_image("https://site1.example/pay")
+    assert service.cached_verdict(as_decoded(other, encode(other))) is None
+
+
+def test_exact_match_preferred_over_look_alike():
+    cache = PerceptualCache(capacity=4, max_distance=8)
+    digest = difference_hash(qr_image("https://site0.example/"))
+    look_alike = digest.copy()
+    look_alike[0] ^= 1
+    cache.set(look_alike, "look-alike", sha256="b" * 64)
+    cache.set(digest, "same file", sha256="a" * 64)
+    cache.set(digest, "newer look-alike", sha256="c" * 64)
+    assert cache.get(digest, "a" * 64) == ("same file", "a" * 64)
+    assert cache.get(digest)[0] in ("same file", "newer look-alike")
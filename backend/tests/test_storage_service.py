@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from app.services import storage_service as storage
+from app.services.storage_service import StorageService
+
+
+class FlakyBackend:
+    name = "fake"
+
+    def __init__(self):
+        self.down = True
+        self.rows = {}
+
+    def insert_many(self, records):
+        if self.down:
+            raise ConnectionError("backend unavailable")
+        for record in records:
+            self.rows[record["id"]] = record
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_FLUSH_INTERVAL", 0.01)
+    monkeypatch.setattr(storage, "STORAGE_RETRY_INTERVAL", 0.05)
+    service = StorageService()
+    service.spool_path = str(tmp_path / "spool.jsonl")
+    service.backend = FlakyBackend()
+    return service
+
+
+def test_failed_batch_is_spooled_then_replayed_by_timer(service):
+    async def run():
+        ids = [await service.save_analysis({"filename": f"f{i}"}) for i in range(3)]
+        assert await service.flush(timeout=2)
+        assert service.counters["spooled"] == 3 and not service.backend.rows
+
+        # No new records arrive; the idle writer retries the spool on its own
+        service.backend.down = False
+        for _ in range(100):
+            if service.backend.rows:
+                break
+            await asyncio.sleep(0.02)
+        await service.close()
+        return ids
+
+    ids = asyncio.run(run())
+    assert sorted(service.backend.rows) == sorted(ids)
+    assert service.counters["replayed"] == 3
+
+
+def test_spool_from_previous_run_is_replayed_on_start(service):
+    service._spool([storage.StorageService._record({"filename": "left over"})])
+    service.backend.down = False
+
+    async def run():
+        service.start()
+        for _ in range(100):
+            if service.backend.rows:
+                break
+            await asyncio.sleep(0.02)
+        await service.close()
+
+    asyncio.run(run())
+    assert [r["filename"] for r in service.backend.rows.values()] == ["left over"]
+
+
+def test_dead_writer_is_restarted(service, monkeypatch):
+    service.backend.down = False
+    original = service._run_writer
+    starts = []
+
+    async def crash_once():
+        starts.append(1)
+        if len(starts) == 1:
+            raise RuntimeError("writer bug")
+        await original()
+
+    monkeypatch.setattr(service, "_run_writer", crash_once)
+
+    async def run():
+        await service.save_analysis({"filename": "a"})
+        assert await service.flush(timeout=2)
+        await service.close()
+
+    asyncio.run(run())
+    assert len(starts) == 2 and len(service.backend.rows) == 1
+
+
+def test_flush_and_close_are_bounded(service, monkeypatch):
+    async def stuck(batch):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(service, "_write", stuck)
+
+    async def run():
+        await service.save_analysis({"filename": "a"})
+        await service.save_analysis({"filename": "b"})
+        await asyncio.sleep(0.05)
+        await service.save_analysis({"filename": "c"})
+        assert not await service.flush(timeout=0.1)
+        await asyncio.wait_for(service.close(), 15)
+
+    monkeypatch.setattr(storage, "STORAGE_FLUSH_TIMEOUT", 0.1)
+    asyncio.run(run())
+    # The batch stuck in the writer is lost; what was still queued is spooled
+    assert service.counters["spooled"] == 1
@@ -0,0 +1,98 @@
+import io
+import struct
+
+import pytest
+
+from app.services.triage_service import triage_service
+from benchmarks.binary_triage import build_pe
+
+
+def triage(data):
+    return triage_service.analyze(io.BytesIO(data), len(data))
+
+
+def indicator_ids(verdict):
+    return {i["id"] for i in verdict["technical_details"]["indicators"]}
+
+
+@pytest.fixture(scope="module")
+def pe_files(tmp_path_factory):
+    files = {}
+    for kind in ("plain", "injector", "packed"):
+        path = tmp_path_factory.mktemp("pe") / f"{kind}.exe"
+        build_pe(str(path), 600 * 1024, kind)
+        files[kind] = path.read_bytes()
+    return files
+
+
+def elf64(phoff=64, phnum=1, shoff=0, shnum=0, flags=5):
+    header = bytearray(b"\x7fELF\x02\x01\x01" + b"\0" * 9)
+    header += struct.pack("<HHIQQQIHHHHHH", 2, 62, 1, 0x401000, phoff, shoff, 0, 64, 56, phnum, 64, shnum, 0)
+    program = struct.pack("<IIQQQQQQ", 1, flags, 0, 0x400000, 0x400000, 4096, 4096, 4096)
+    return bytes(header + program + b"\x90" * 4096)
+
+
+def test_pe_parsing(pe_files):
+    plain = triage(pe_files["plain"])
+    details = plain["technical_details"]
+    assert details["format"] == "PE32+ executable" and details["arch"] == "x86-64"
+    assert [s["name"] for s in details["sections"]] == [".text", ".rdata", ".data"]
+    assert "KERNEL32.dll" in details["imports"]["libraries"] and details["imports"]["count"] == 14
+    assert plain["risk_score"] == 0
+
+    assert "process-injection" in indicator_ids(triage(pe_files["injector"]))
+    packed = indicator_ids(triage(pe_files["packed"]))
+    assert {"packer", "unpacking-stub", "dynamic-imports"} <= packed
+
+
+def test_elf_parsing():
+    verdict = triage(elf64())
+    assert verdict["technical_details"]["format"] == "ELF64 executable"
+    assert verdict["technical_details"]["arch"] == "x86-64"
+    assert indicator_ids(verdict) == {"no-section-headers"}
+    assert "wx-segment" in indicator_ids(triage(elf64(flags=7)))
+
+
+@pytest.mark.parametrize("data", [
+    elf64(phoff=2 ** 63 + 5),            # would overflow struct's offset
+    elf64(phoff=2 ** 64 - 8),            # wraps to a negative offset
+    elf64(shoff=2 ** 62, shnum=3),
+    elf64()[:70],                        # program header cut off
+], ids=["phoff-overflow", "phoff-negative", "shoff-past-end", "truncated"])
+def test_malformed_elf(data):
+    assert "malformed-headers" in indicator_ids(triage(data))
+
+
+def test_malformed_pe(pe_files):
+    plain = bytearray(pe_files["plain"])
+    truncated = bytes(plain[:0x1A0])
+    # Import directory pointing far past the end of the file
+    opt = 0x80 + 24
+    bad_imports = bytearray(plain)
+    struct.pack_into("<I", bad_imports, opt + 112 + 8, 0xFFFFFF00)
+    # First section's raw data pointer past the end: only the entropy is skipped
+    bad_section = bytearray(plain)
+    struct.pack_into("<I", bad_section, opt + 240 + 20, 0xFFFFF000)
+
+    assert "malformed-headers" in indicator_ids(triage(truncated))
+    assert "malformed-headers" in indicator_ids(triage(bytes(bad_imports)))
+    assert triage(bytes(bad_section))["technical_details"]["format"] == "PE32+ executable"
+
+
+def test_ordinal_only_thunks_are_capped(pe_files, monkeypatch):
+    monkeypatch.setattr("app.services.triage_service.MAX_SYMBOLS", 1000)
+    data = bytearray(pe_files["plain"])
+    opt = 0x80 + 24
+    import_rva, _ = struct.unpack_from("<II", data, opt + 112 + 8)
+    _, _, data_va, data_size, data_ptr = struct.unpack_from("<8sIIII", data, opt + 240 + 40 * 2)
+    assert data_size > 1000 * 8 and data_ptr + data_size == len(data)
+    # .data becomes one unterminated table of ordinal imports running to the
+    # end of the file; the first import descriptor points at it
+    struct.pack_into("<" + "Q" * (data_size // 8), data, data_ptr, *[(1 << 63) | 7] * (data_size // 8))
+    _, _, rdata_va, _, rdata_ptr = struct.unpack_from("<8sIIII", data, opt + 240 + 40)
+    struct.pack_into("<I", data, import_rva - rdata_va + rdata_ptr, data_va)
+
+    verdict = triage(bytes(data))
+    # Stopped at the cap rather than walking off the end of the file
+    assert "malformed-headers" not in indicator_ids(verdict)
+    assert verdict["technical_details"]["imports"]["count"] == 0
